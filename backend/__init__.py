@@ -3,15 +3,23 @@ Smart Product Recommendation Backend Package
 """
 
 from .api import create_app
-from .agent import SmartProductAgent
 from .config import config
 from .models import (
     RecommendationRequest,
     RecommendationResponse,
-    HealthResponse,
-    ProductRecommendationState
+    HealthResponse
 )
 
+def __getattr__(name):
+    # Agent ve LangGraph state'i google-genai/langgraph import ettiği için ilk erişimde yüklenir
+    if name == "SmartProductAgent":
+        from .agent import SmartProductAgent
+        return SmartProductAgent
+    if name == "ProductRecommendationState":
+        from .state import ProductRecommendationState
+        return ProductRecommendationState
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 __version__ = "1.0.0"
 __author__ = "Smart Product Recommendation Team"
 
@@ -1,12 +1,52 @@
+import asyncio
+import functools
+import hashlib
+import json
 import time
-from typing import Dict
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
 
-from google.genai import Client
+from google.genai import Client, types
 from langgraph.graph import StateGraph, START, END
+from langgraph.types import StreamWriter
 from langchain_core.messages import HumanMessage, AIMessage
 
-from models import ProductRecommendationState
+from models import IntentAnalysis, RefinementCheck, StructuredRecommendation
+from state import ProductRecommendationState, merge_sections
 from config import config
+from cache import PersistentTTLCache, ResponseStore, StaleWhileRevalidateCache, TTLCache
+from catalog import ProductCatalog
+from client_pool import GeminiClientPool
+from compaction import compact_prompt_context, count_tokens
+from hedging import RequestHedger
+from routing import ModelRouter
+from sessions import SessionStore
+from startup import startup_phase
+from concurrency import (
+    DeadlineExceeded,
+    SingleFlight,
+    iterate_with_budget,
+    remaining_budget,
+    request_deadline,
+    run_with_budget,
+    without_deadline
+)
+from intent_classifier import CategoryClassifier
+from scheduler import GeminiScheduler, PRIORITY_BACKGROUND, call_priority
+from metrics import (
+    DEADLINE_EXCEEDED,
+    GEMINI_CALL_DURATION,
+    GEMINI_CALL_ERRORS,
+    GEMINI_CALLS_CANCELLED,
+    GEMINI_TOKENS,
+    NODE_CANCELLED,
+    NODE_DURATION,
+    NODE_FALLBACKS,
+    NODE_REUSED,
+    PROMPT_CONTEXT_TOKENS,
+    metrics,
+    record_timing,
+    timed
+)
 from utils import (
     TextProcessor, 
     URLGenerator, 
@@ -16,50 +56,548 @@ from utils import (
 
 
 class SmartProductAgent:
-    def __init__(self):
-        config.validate_config()
+    def __init__(self, client: Optional[Client] = None):
+        pool_settings = {
+            "model_rpm": config.GEMINI_MODEL_RPM,
+            "default_rpm": config.GEMINI_DEFAULT_RPM,
+            "burst_seconds": config.GEMINI_RATE_BURST_SECONDS,
+            "cooldown_seconds": config.GEMINI_KEY_COOLDOWN_SECONDS,
+            "max_cooldown_seconds": config.GEMINI_KEY_MAX_COOLDOWN_SECONDS,
+            "error_decay": config.GEMINI_KEY_ERROR_DECAY
+        }
+        if client is None:
+            config.validate_config()
+            with startup_phase("init.client"):
+                self.clients = GeminiClientPool.from_keys(
+                    config.GEMINI_API_KEYS,
+                    max_connections=config.GEMINI_MAX_CONNECTIONS_PER_KEY,
+                    max_keepalive_connections=config.GEMINI_MAX_KEEPALIVE_PER_KEY,
+                    **pool_settings
+                )
+        else:
+            self.clients = GeminiClientPool([("key-0", client)], **pool_settings)
         
-        self.client = Client(api_key=config.GEMINI_API_KEY)
-        self.graph = self._build_graph()
+        with startup_phase("init.graph"):
+            self.graph = self._build_graph()
+        self.session_graph = None
         self.ecommerce_sites = config.ECOMMERCE_SITES
+        self.result_cache = TTLCache(
+            max_entries=config.RESULT_CACHE_MAX_ENTRIES,
+            max_bytes=config.RESULT_CACHE_MAX_BYTES,
+            ttl_seconds=config.RESULT_CACHE_TTL_SECONDS
+        )
+        with startup_phase("init.guide_store"):
+            self.guide_store = PersistentTTLCache(
+                max_entries=config.GUIDE_STORE_MAX_ENTRIES,
+                max_bytes=config.GUIDE_STORE_MAX_BYTES,
+                ttl_seconds=config.GUIDE_STORE_TTL_SECONDS,
+                path=config.GUIDE_STORE_PATH,
+                snapshot_seconds=config.GUIDE_STORE_SNAPSHOT_SECONDS
+            )
+        with startup_phase("init.catalog"):
+            self.catalog = ProductCatalog(
+                path=config.CATALOG_PATH,
+                max_products=config.CATALOG_MAX_PRODUCTS,
+                min_similarity=config.CATALOG_MIN_SIMILARITY,
+                snapshot_seconds=config.CATALOG_SNAPSHOT_SECONDS
+            )
+        self.search_cache = StaleWhileRevalidateCache(
+            max_entries=config.SEARCH_CACHE_MAX_ENTRIES,
+            max_bytes=config.SEARCH_CACHE_MAX_BYTES,
+            fresh_seconds=config.SEARCH_CACHE_FRESH_SECONDS,
+            stale_seconds=config.SEARCH_CACHE_STALE_SECONDS
+        )
+        self.response_store = ResponseStore(
+            path=config.LLM_STORE_PATH,
+            max_bytes=config.LLM_STORE_MAX_BYTES,
+            ttl_seconds=config.LLM_STORE_TTL_SECONDS,
+            default_ttl_seconds=config.LLM_STORE_DEFAULT_TTL_SECONDS,
+            mode=config.LLM_STORE_MODE
+        )
+        self.model_call_flight = SingleFlight(isolated=True)
+        self.scheduler = GeminiScheduler(
+            model_rpm={model: rpm * len(self.clients) for model, rpm in config.GEMINI_MODEL_RPM.items()},
+            default_rpm=config.GEMINI_DEFAULT_RPM * len(self.clients),
+            burst_seconds=config.GEMINI_RATE_BURST_SECONDS,
+            max_queue=config.GEMINI_MAX_QUEUE,
+            max_retries=config.GEMINI_MAX_RETRIES,
+            backoff_base=config.GEMINI_BACKOFF_BASE_SECONDS,
+            backoff_max=config.GEMINI_BACKOFF_MAX_SECONDS
+        )
+        self.hedger = RequestHedger(
+            pct=config.HEDGE_PERCENTILE,
+            min_samples=config.HEDGE_MIN_SAMPLES,
+            window_size=config.HEDGE_WINDOW_SIZE,
+            max_hedge_ratio=config.HEDGE_MAX_RATIO,
+            min_delay=config.HEDGE_MIN_DELAY_SECONDS
+        )
+        self.router = ModelRouter(
+            self.scheduler,
+            policy=config.MODEL_ROUTING_POLICY,
+            latency_window_seconds=config.MODEL_LATENCY_WINDOW_SECONDS,
+            min_samples=config.MODEL_LATENCY_MIN_SAMPLES,
+            enabled=config.MODEL_ROUTING_ENABLED
+        )
+        self.sessions = SessionStore(
+            backend=config.SESSION_STORE,
+            path=config.SESSION_DB_PATH,
+            ttl_seconds=config.SESSION_TTL_SECONDS,
+            max_sessions=config.SESSION_MAX_COUNT
+        )
+        with startup_phase("init.intent_classifier"):
+            self.intent_classifier = CategoryClassifier(
+                config.CATEGORY_LEXICON_PATH,
+                min_confidence=config.LOCAL_INTENT_MIN_CONFIDENCE
+            )
+        metrics.register_collector(self._collect_metrics)
     
-    def _build_graph(self) -> StateGraph:
-        """LangGraph workflow'u"""
+    def _collect_metrics(self):
+        """Önbellek, scheduler ve sınıflandırıcı istatistiklerini metrik örneklerine çevir"""
+        for name, cache in (("result", self.result_cache), ("guide", self.guide_store)):
+            stats = cache.stats()
+            yield "cache_hits_total", "counter", "Cache hits", {"cache": name}, stats["hits"]
+            yield "cache_misses_total", "counter", "Cache misses", {"cache": name}, stats["misses"]
+            yield "cache_evictions_total", "counter", "Cache evictions", {"cache": name}, stats["evictions"]
+            yield "cache_entries", "gauge", "Cache entries", {"cache": name}, stats["entries"]
+            yield "cache_bytes", "gauge", "Approximate cache size in bytes", {"cache": name}, stats["bytes"]
+        
+        catalog = self.catalog.stats()
+        yield "catalog_products", "gauge", "Canonical products in the catalog", {}, catalog["products"]
+        for result in ("exact", "fuzzy"):
+            yield "catalog_lookups_total", "counter", "Catalog name lookups by match type", {"result": result}, catalog[f"{result}_hits"]
+        yield "catalog_lookups_total", "counter", "Catalog name lookups by match type", {"result": "miss"}, catalog["misses"]
+        
+        search = self.search_cache.stats()
+        yield "cache_hits_total", "counter", "Cache hits", {"cache": "search"}, search["fresh_hits"] + search["stale_hits"]
+        yield "cache_misses_total", "counter", "Cache misses", {"cache": "search"}, search["misses"]
+        yield "cache_evictions_total", "counter", "Cache evictions", {"cache": "search"}, search["evictions"]
+        yield "cache_entries", "gauge", "Cache entries", {"cache": "search"}, search["entries"]
+        yield "cache_bytes", "gauge", "Approximate cache size in bytes", {"cache": "search"}, search["bytes"]
+        yield "search_cache_stale_hits_total", "counter", "Stale search results served while refreshing", {}, search["stale_hits"]
+        yield "search_cache_refresh_failures_total", "counter", "Failed background search refreshes", {}, search["refresh_failures"]
+        
+        store = self.response_store.stats()
+        if self.response_store.enabled:
+            yield "cache_hits_total", "counter", "Cache hits", {"cache": "llm_store"}, store["hits"]
+            yield "cache_misses_total", "counter", "Cache misses", {"cache": "llm_store"}, store["misses"]
+            yield "cache_evictions_total", "counter", "Cache evictions", {"cache": "llm_store"}, store["evictions"]
+            yield "cache_entries", "gauge", "Cache entries", {"cache": "llm_store"}, store.get("entries", 0)
+            yield "cache_bytes", "gauge", "Approximate cache size in bytes", {"cache": "llm_store"}, store.get("bytes", 0)
+        
+        pool = self.clients.stats()
+        yield "gemini_keys_available", "gauge", "API keys currently in rotation", {}, pool["available"]
+        yield "gemini_key_pool_exhausted_total", "counter", "Calls made while every API key was cooling down", {}, pool["exhausted"]
+        for label, key in pool["clients"].items():
+            yield "gemini_key_in_flight", "gauge", "In-flight Gemini calls per API key", {"key": label}, key["in_flight"]
+            yield "gemini_key_requests_total", "counter", "Gemini calls per API key", {"key": label}, key["requests"]
+            yield "gemini_key_errors_total", "counter", "Failed Gemini calls per API key", {"key": label}, key["errors"]
+            yield "gemini_key_rate_limited_total", "counter", "429 responses per API key", {"key": label}, key["rate_limited"]
+            yield "gemini_key_error_rate", "gauge", "Decayed error rate per API key", {"key": label}, key["error_rate"]
+            yield "gemini_key_cooldown_seconds", "gauge", "Seconds until the API key is back in rotation", {"key": label}, key["cooldown_seconds"]
+            for model, headroom in key["headroom"].items():
+                yield "gemini_key_quota_headroom", "gauge", "Estimated share of the key's per-model quota left", {"key": label, "model": model}, headroom
+        
+        flight = self.model_call_flight.stats()
+        yield "single_flight_coalesced_total", "counter", "Calls coalesced onto an in-flight duplicate", {"scope": "model_calls"}, flight["coalesced"]
+        yield "single_flight_abandoned_total", "counter", "Shared tasks cancelled after every waiter went away", {"scope": "model_calls"}, flight["abandoned"]
+        
+        scheduler = self.scheduler.stats()
+        yield "gemini_scheduler_retries_total", "counter", "Retried Gemini calls", {}, scheduler["retries"]
+        yield "gemini_scheduler_rejected_total", "counter", "Gemini calls rejected because the queue was full", {}, scheduler["rejected"]
+        for model, lane in scheduler["models"].items():
+            yield "gemini_scheduler_queue_depth", "gauge", "Gemini calls waiting for a rate limit token", {"model": model}, lane["queue_depth"]
+            yield "gemini_scheduler_avg_wait_seconds", "gauge", "Average rate limit wait", {"model": model}, lane["avg_wait_seconds"]
+            yield "gemini_scheduler_max_wait_seconds", "gauge", "Maximum rate limit wait", {"model": model}, lane["max_wait_seconds"]
+        
+        for (model, call_name), hedge in self.hedger.stats().items():
+            labels = {"model": model, "call": call_name}
+            yield "gemini_hedged_requests_total", "counter", "Duplicate requests sent for slow idempotent calls", labels, hedge["hedged"]
+            yield "gemini_hedge_wins_total", "counter", "Hedged calls answered by the duplicate", labels, hedge["hedge_wins"]
+            yield "gemini_hedge_rate_limited_total", "counter", "Hedges skipped because the hedge budget was spent", labels, hedge["rate_limited"]
+            if hedge["threshold_seconds"] is not None:
+                yield "gemini_hedge_threshold_seconds", "gauge", "Current adaptive hedge delay", labels, hedge["threshold_seconds"]
+        
+        for (call_name, model, reason), count in self.router.decisions.items():
+            yield "gemini_model_route_total", "counter", "Model routing decisions by reason", {"call": call_name, "model": model, "reason": reason}, count
+        
+        sessions = self.sessions.stats()
+        yield "sessions_active", "gauge", "Conversation sessions kept in the checkpointer", {}, sessions["active"]
+        yield "session_turns_total", "counter", "Conversation turns run with a session id", {}, sessions["turns"]
+        yield "session_evictions_total", "counter", "Idle sessions deleted from the checkpointer", {}, sessions["evictions"]
+        
+        classifier = self.intent_classifier.stats()
+        yield "intent_classifier_lookups_total", "counter", "Local intent classifier lookups", {}, classifier["lookups"]
+        yield "intent_classifier_hits_total", "counter", "Local intent classifications above the confidence threshold", {}, classifier["hits"]
+    
+    def _build_graph(self, checkpointer=None) -> StateGraph:
+        """LangGraph workflow'u
+
+        Rehber ve ürün araması yalnızca niyet analizinin çıktısına bağlı olduğu
+        için paralel çalışır; ikisi de bitince bağlam sıkıştırılıp final
+        öneride birleşir.
+        Checkpointer verilirse state oturum (thread) bazında turlar arasında saklanır.
+        """
         workflow = StateGraph(ProductRecommendationState)
         
-        workflow.add_node("analyze_intent", self._analyze_intent_node)
-        workflow.add_node("generate_buying_guide", self._generate_buying_guide_node)
-        workflow.add_node("search_products", self._search_products_node)
-        workflow.add_node("generate_recommendation", self._generate_recommendation_node)
-        workflow.add_node("search_ecommerce_links", self._search_ecommerce_links_node)
+        nodes = {
+            "analyze_intent": self._analyze_intent_node,
+            "generate_buying_guide": self._generate_buying_guide_node,
+            "search_products": self._search_products_node,
+            "compact_context": self._compact_context_node,
+            "generate_recommendation": self._generate_recommendation_node,
+            "search_ecommerce_links": self._search_ecommerce_links_node,
+        }
+        for name, node in nodes.items():
+            workflow.add_node(name, self._instrument_node(name, node))
         
         workflow.add_edge(START, "analyze_intent")
         workflow.add_edge("analyze_intent", "generate_buying_guide")
-        workflow.add_edge("generate_buying_guide", "search_products")
-        workflow.add_edge("search_products", "generate_recommendation")
+        workflow.add_edge("analyze_intent", "search_products")
+        workflow.add_edge(["generate_buying_guide", "search_products"], "compact_context")
+        workflow.add_edge("compact_context", "generate_recommendation")
         workflow.add_edge("generate_recommendation", "search_ecommerce_links")
         workflow.add_edge("search_ecommerce_links", END)
         
-        return workflow.compile()
+        return workflow.compile(checkpointer=checkpointer)
+    
+    async def _get_session_graph(self):
+        """Oturumlu istekler için checkpointer'lı graph'ı ilk kullanımda derle"""
+        if self.session_graph is None:
+            checkpointer = await self.sessions.checkpointer()
+            if self.session_graph is None:
+                self.session_graph = self._build_graph(checkpointer)
+        return self.session_graph
+    
+    @staticmethod
+    def _instrument_node(name: str, node: Callable) -> Callable:
+        """Node süresini histogram ve istek bazlı zamanlamaya kaydet"""
+        @functools.wraps(node)
+        async def wrapper(state, **kwargs):
+            try:
+                with timed(NODE_DURATION, f"node.{name}", node=name):
+                    return await node(state, **kwargs)
+            except asyncio.CancelledError:
+                NODE_CANCELLED.inc(node=name)
+                raise
+        return wrapper
+    
+    @staticmethod
+    def _call_key(model: str, contents: str, config: Dict[str, Any]) -> str:
+        """Model, prompt ve üretim ayarlarından içerik adresli anahtar üret"""
+        payload = json.dumps(
+            {"model": model, "contents": contents, "config": config},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def _record_usage(model: str, call_name: str, response) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        GEMINI_TOKENS.inc(usage.prompt_token_count or 0, model=model, call=call_name, kind="prompt")
+        GEMINI_TOKENS.inc(usage.candidates_token_count or 0, model=model, call=call_name, kind="response")
+    
+    @staticmethod
+    def _call_budget(call_name: str) -> Dict[str, float]:
+        """Çağrının kalan istek süresinden alacağı pay ve başlatılabilmesi için gereken en kısa süre"""
+        return {
+            "share": config.DEADLINE_CALL_SHARES.get(call_name, 1.0),
+            "min_seconds": config.DEADLINE_MIN_CALL_SECONDS
+        }
+    
+    def _route(self, call_name: str) -> str:
+        """Çağrı için modeli yük, gecikme, kota ve kalan süreye göre seç"""
+        remaining = remaining_budget()
+        budget = None
+        if remaining is not None:
+            budget = remaining * config.DEADLINE_CALL_SHARES.get(call_name, 1.0)
+        return self.router.choose(call_name, budget)
+    
+    @staticmethod
+    def _is_memoizable(generation_config: Dict[str, Any]) -> bool:
+        """Yalnızca düşük sıcaklıklı (deterministiğe yakın) çağrılar yanıt deposunda tutulur"""
+        return generation_config.get("temperature", 1.0) <= config.LLM_STORE_MAX_TEMPERATURE
+    
+    @staticmethod
+    def _dump_response(response) -> Dict[str, Any]:
+        return response.model_dump(mode="json", exclude_none=True)
+    
+    @staticmethod
+    def _is_hedged(call_name: str) -> bool:
+        return config.HEDGING_ENABLED and call_name in config.HEDGE_CALLS
+    
+    async def _execute_model_call(self, call_name: str, model: str, contents: str, config: Dict[str, Any]):
+        def attempt():
+            return self.scheduler.run(
+                model,
+                lambda: self.clients.call(
+                    model,
+                    lambda client: client.aio.models.generate_content(
+                        model=model,
+                        contents=contents,
+                        config=config
+                    )
+                )
+            )
+        
+        start = time.perf_counter()
+        try:
+            with timed(GEMINI_CALL_DURATION, model=model, call=call_name):
+                if self._is_hedged(call_name):
+                    response = await self.hedger.run(
+                        (model, call_name),
+                        attempt,
+                        allow_hedge=lambda: self.scheduler.queue_depth(model) == 0
+                    )
+                else:
+                    response = await attempt()
+        except asyncio.CancelledError:
+            GEMINI_CALLS_CANCELLED.inc(model=model, call=call_name)
+            raise
+        except Exception:
+            GEMINI_CALL_ERRORS.inc(model=model, call=call_name)
+            raise
+        
+        self.router.observe(model, call_name, time.perf_counter() - start)
+        self._record_usage(model, call_name, response)
+        return response
+    
+    async def _memoized_call(self, key: str, call_name: str, model: str, contents: str, config: Dict[str, Any]):
+        """Yanıt deposunda kayıt varsa onu döndür, yoksa modeli çağırıp kaydet"""
+        memoizable = self._is_memoizable(config)
+        if memoizable:
+            stored = await self.response_store.get(key)
+            if stored is not None:
+                return types.GenerateContentResponse.model_validate(stored[0])
+        
+        response = await self._execute_model_call(call_name, model, contents, config)
+        
+        if memoizable:
+            await self.response_store.put(key, call_name, model, [self._dump_response(response)])
+        return response
+    
+    async def _call_model(self, call_name: str, model: str, contents: str, config: Dict[str, Any]):
+        """Gemini async client ile tek bir model çağrısı yap
+
+        Aynı anda gelen özdeş çağrılar (model + prompt + ayarlar) tek bir
+        istekte birleştirilir; deterministik çağrılar önce yanıt deposunda
+        aranır. Çağrı scheduler üzerinden hız sınırı ve yeniden deneme ile
+        yapılır. Bekleme, isteğin kalan süresinin çağrıya ayrılan payıyla
+        sınırlıdır.
+        """
+        start = time.perf_counter()
+        key = self._call_key(model, contents, config)
+        try:
+            return await run_with_budget(
+                lambda: self.model_call_flight.do(
+                    key,
+                    lambda: self._memoized_call(key, call_name, model, contents, config)
+                ),
+                **self._call_budget(call_name)
+            )
+        except DeadlineExceeded:
+            DEADLINE_EXCEEDED.inc(call=call_name)
+            raise
+        finally:
+            record_timing(f"gemini.{call_name}", time.perf_counter() - start)
+    
+    async def _stream_model(self, call_name: str, model: str, contents: str, config: Dict[str, Any]) -> AsyncIterator[str]:
+        """Gemini async client ile model çıktısını parça parça akıt
+
+        Süre bütçesi dolarsa o ana kadar üretilen parçalardan sonra
+        DeadlineExceeded fırlatılır. Yanıt deposunda kayıt varsa kayıtlı
+        parçalar akıtılır.
+        """
+        key = self._call_key(model, contents, config)
+        memoizable = self._is_memoizable(config)
+        if memoizable:
+            stored = await self.response_store.get(key)
+            if stored is not None:
+                for data in stored:
+                    text = types.GenerateContentResponse.model_validate(data).text
+                    if text:
+                        yield text
+                return
+        
+        stream = iterate_with_budget(
+            self.scheduler.stream(
+                model,
+                lambda: self.clients.stream(
+                    model,
+                    lambda client: client.aio.models.generate_content_stream(
+                        model=model,
+                        contents=contents,
+                        config=config
+                    )
+                )
+            ),
+            **self._call_budget(call_name)
+        )
+        
+        last_chunk = None
+        recorded = []
+        start = time.perf_counter()
+        try:
+            with timed(GEMINI_CALL_DURATION, f"gemini.{call_name}", model=model, call=call_name):
+                async for chunk in stream:
+                    last_chunk = chunk
+                    if memoizable:
+                        recorded.append(self._dump_response(chunk))
+                    if chunk.text:
+                        yield chunk.text
+        except DeadlineExceeded:
+            DEADLINE_EXCEEDED.inc(call=call_name)
+            raise
+        except asyncio.CancelledError:
+            GEMINI_CALLS_CANCELLED.inc(model=model, call=call_name)
+            raise
+        except Exception:
+            GEMINI_CALL_ERRORS.inc(model=model, call=call_name)
+            raise
+        
+        self.router.observe(model, call_name, time.perf_counter() - start)
+        if last_chunk is not None:
+            self._record_usage(model, call_name, last_chunk)
+        if recorded:
+            await self.response_store.put(key, call_name, model, recorded)
     
-    def _analyze_intent_node(self, state: ProductRecommendationState) -> ProductRecommendationState:
-        """NODE 1: Kullanıcı niyetini analiz et ve ürün kategorisini belirle"""
+    async def _analyze_intent_node(self, state: ProductRecommendationState) -> ProductRecommendationState:
+        """NODE 1: Kullanıcı niyetini analiz et ve ürün kategorisini belirle
+
+        Kategori yerel sözlükten yeterli güvenle çözülürse LLM çağrısı atlanır.
+        Oturumdaki takip mesajı aynı kategoride kalıyorsa niyet yeniden
+        analiz edilmez, mesaj daraltma isteği olarak eklenir.
+        """
         user_message = state["messages"][-1].content
         
+        if state.get("product_category"):
+            refinement = await self._refine_intent(state, user_message)
+            if refinement is not None:
+                return refinement
+        
+        result = await self._classify_intent(user_message)
+        if state.get("refinements"):
+            result["refinements"] = []
+        return result
+    
+    async def _refine_intent(self, state: ProductRecommendationState, user_message: str) -> Optional[ProductRecommendationState]:
+        """Takip mesajı önceki aramayı daraltıyorsa niyeti koruyup daraltma olarak ekle
+
+        Yerel sözlük (açıksa) mesajı güvenle bir kategoriye bağlarsa karar
+        ondan verilir; bağlayamazsa kısa bir LLM kontrolü mesajın daraltma mı
+        yeni bir ürün isteği mi olduğuna karar verir. Yeni ürün isteğinde
+        kontrolün bulduğu niyet döner; karar verilemezse None döner ve niyet
+        baştan analiz edilir.
+        """
+        if config.LOCAL_INTENT_CLASSIFIER:
+            local_result = self.intent_classifier.classify(user_message)
+            if local_result and local_result["confidence"] >= config.LOCAL_INTENT_MIN_CONFIDENCE:
+                if local_result["product_category"] != state["product_category"]:
+                    return None
+                return self._refinement(state, user_message)
+        
+        check = await self._check_refinement(state, user_message)
+        if check is None:
+            return None
+        if check.is_refinement:
+            return self._refinement(state, user_message)
+        
+        print(f"🆕 Yeni ürün isteği, kategori değişiyor: {check.product_category}")
+        return {
+            "product_category": check.product_category,
+            "user_intent": check.user_intent,
+            "refinements": []
+        }
+    
+    def _refinement(self, state: ProductRecommendationState, user_message: str) -> ProductRecommendationState:
+        print(f"🔁 Takip isteği, kategori korunuyor ({state['product_category']}): {user_message}")
+        NODE_REUSED.inc(node="analyze_intent")
+        return {"refinements": list(state.get("refinements") or []) + [user_message]}
+    
+    async def _check_refinement(self, state: ProductRecommendationState, user_message: str) -> Optional[RefinementCheck]:
+        """Takip mesajının önceki aramayı daraltıp daraltmadığını intent modeline sor"""
+        prompt = PromptTemplates.REFINEMENT_CHECK_TEMPLATE.format(
+            product_category=state["product_category"],
+            user_intent=self._effective_intent(state),
+            user_message=user_message
+        )
+        model_config = {"temperature": 0.1}
+        if config.STRUCTURED_OUTPUT:
+            model_config.update({
+                "response_mime_type": "application/json",
+                "response_schema": RefinementCheck
+            })
+        
+        try:
+            response = await self._call_model(
+                call_name="intent",
+                model=self._route("intent"),
+                contents=prompt,
+                config=model_config
+            )
+            if config.STRUCTURED_OUTPUT:
+                return RefinementCheck.model_validate_json(response.text)
+            result = TextProcessor.extract_json_from_text(response.text.strip())
+            return RefinementCheck.model_validate(result) if result else None
+        except Exception as e:
+            print(f"Takip isteği kontrolü başarısız: {e}")
+            return None
+    
+    @staticmethod
+    def _effective_intent(state: ProductRecommendationState) -> str:
+        """Kullanıcı niyeti ve oturumdaki takip istekleri"""
+        refinements = state.get("refinements") or []
+        if not refinements:
+            return state["user_intent"]
+        return f"{state['user_intent']} ({'; '.join(refinements)})"
+    
+    @staticmethod
+    def _refinement_note(state: ProductRecommendationState) -> str:
+        refinements = state.get("refinements") or []
+        if not refinements:
+            return ""
+        return PromptTemplates.REFINEMENT_TEMPLATE.format(
+            refinements="\n    ".join(f"- {refinement}" for refinement in refinements)
+        )
+    
+    async def _classify_intent(self, user_message: str) -> ProductRecommendationState:
         print(f"🎯 Kullanıcı niyeti analiz ediliyor: {user_message}")
         
+        if config.LOCAL_INTENT_CLASSIFIER:
+            local_result = self.intent_classifier.classify(user_message)
+            if local_result and local_result["confidence"] >= config.LOCAL_INTENT_MIN_CONFIDENCE:
+                print(f"📋 Ürün kategorisi (yerel): {local_result['product_category']}")
+                return {
+                    "product_category": local_result["product_category"],
+                    "user_intent": local_result["user_intent"]
+                }
+        
         prompt = PromptTemplates.INTENT_ANALYSIS_TEMPLATE.format(
             user_message=user_message
         )
         
+        model_config = {"temperature": 0.3}
+        if config.STRUCTURED_OUTPUT:
+            model_config.update({
+                "response_mime_type": "application/json",
+                "response_schema": IntentAnalysis
+            })
+        
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
+            response = await self._call_model(
+                call_name="intent",
+                model=self._route("intent"),
                 contents=prompt,
-                config={"temperature": 0.3}
+                config=model_config
             )
             
-            result = TextProcessor.extract_json_from_text(response.text.strip())
+            if config.STRUCTURED_OUTPUT:
+                result = IntentAnalysis.model_validate_json(response.text).model_dump()
+            else:
+                result = TextProcessor.extract_json_from_text(response.text.strip())
             
             if result:
                 print(f"📋 Ürün kategorisi: {result['product_category']}")
@@ -72,15 +610,36 @@ class SmartProductAgent:
             
         except Exception as e:
             print(f"Intent analizi başarısız: {e}")
+            NODE_FALLBACKS.inc(node="analyze_intent")
             return {
                 "product_category": "genel ürün",
-                "user_intent": user_message
+                "user_intent": user_message,
+                "degraded_sections": ["intent"]
             }
     
-    def _generate_buying_guide_node(self, state: ProductRecommendationState) -> ProductRecommendationState:
-        """NODE 2: Satın alma rehberi oluştur"""
+    async def _generate_buying_guide_node(self, state: ProductRecommendationState) -> ProductRecommendationState:
+        """NODE 2: Satın alma rehberi oluştur
+
+        Rehber kategoriye göre pek değişmediği için normalize edilmiş kategori
+        anahtarıyla saklanır; model yalnızca kayıt yoksa çağrılır. Oturumda
+        kategori değişmediyse önceki turun rehberi olduğu gibi kullanılır.
+        """
         product_category = state["product_category"]
         user_intent = state["user_intent"]
+        guide_key = TextProcessor.normalize_query(product_category)
+        
+        if state.get("buying_guide") and state.get("guide_category") == product_category:
+            print(f"📖 {product_category} için oturumdaki rehber kullanılıyor")
+            NODE_REUSED.inc(node="generate_buying_guide")
+            return {}
+        
+        stored_guide = self.guide_store.get(guide_key)
+        if stored_guide is not None:
+            print(f"📖 {product_category} için kayıtlı satın alma rehberi kullanılıyor")
+            return {
+                "buying_guide": stored_guide,
+                "guide_category": product_category
+            }
         
         print(f"📖 {product_category} için satın alma rehberi oluşturuluyor...")
         
@@ -90,8 +649,9 @@ class SmartProductAgent:
         )
         
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
+            response = await self._call_model(
+                call_name="buying_guide",
+                model=self._route("buying_guide"),
                 contents=prompt,
                 config={"temperature": 0.3}
             )
@@ -99,138 +659,348 @@ class SmartProductAgent:
             buying_guide = response.text.strip()
             print(f"✅ Satın alma rehberi hazır")
             
+            if buying_guide:
+                self.guide_store.set(guide_key, buying_guide)
+            
             return {
-                "buying_guide": buying_guide
+                "buying_guide": buying_guide,
+                "guide_category": product_category
             }
             
         except Exception as e:
             print(f"Rehber oluşturulamadı: {e}")
+            NODE_FALLBACKS.inc(node="generate_buying_guide")
             return {
-                "buying_guide": f"{product_category} için genel satın alma önerileri araştırılıyor..."
+                "buying_guide": f"{product_category} için genel satın alma önerileri araştırılıyor...",
+                "guide_category": "",
+                "degraded_sections": ["buying_guide"]
             }
     
-    def _search_products_node(self, state: ProductRecommendationState) -> ProductRecommendationState:
-        """NODE 3: Ürün arama ve analiz"""
-        product_category = state["product_category"]
-        user_intent = state["user_intent"]
-        
-        print(f"🔍 {product_category} ürünleri araştırılıyor...")
-        
+    async def _grounded_search(self, product_category: str, user_intent: str) -> Dict[str, Any]:
+        """Google Search destekli ürün araştırması; hata durumunda exception fırlatır"""
         search_prompt = PromptTemplates.PRODUCT_SEARCH_TEMPLATE.format(
             product_category=product_category,
             user_intent=user_intent
         )
         
+        response = await self._call_model(
+            call_name="product_search",
+            model=self._route("product_search"),
+            contents=search_prompt,
+            config={
+                "tools": [{"google_search": {}}],
+                "temperature": 0
+            }
+        )
+        
+        search_results = response.text
+        if not search_results:
+            raise ValueError("Arama sonucu boş döndü")
+        
+        sources = []
+        if (hasattr(response, 'candidates') and 
+            response.candidates and 
+            hasattr(response.candidates[0], 'grounding_metadata') and
+            response.candidates[0].grounding_metadata and
+            hasattr(response.candidates[0].grounding_metadata, 'grounding_chunks')):
+            
+            for chunk in response.candidates[0].grounding_metadata.grounding_chunks or []:
+                if hasattr(chunk, 'web') and chunk.web:
+                    source = {
+                        'title': chunk.web.title if hasattr(chunk.web, 'title') else 'Başlık Yok',
+                        'url': chunk.web.uri if hasattr(chunk.web, 'uri') else '',
+                    }
+                    sources.append(source)
+        
+        return {
+            "search_results": search_results,
+            "sources": sources
+        }
+    
+    async def _background_grounded_search(self, product_category: str, user_intent: str) -> Dict[str, Any]:
+        """Önbellek yenilemesi için düşük öncelikli grounded arama"""
+        with call_priority(PRIORITY_BACKGROUND), without_deadline():
+            return await self._grounded_search(product_category, user_intent)
+    
+    async def _search_products_node(self, state: ProductRecommendationState) -> ProductRecommendationState:
+        """NODE 3: Ürün arama ve analiz
+
+        Sonuçlar kategori/niyet kovası başına stale-while-revalidate önbellekte
+        tutulur; yalnızca soğuk kayıp grounded aramayı bekler. Oturumdaki
+        takip istekleri aramaya eklenir; anahtar önceki turla aynıysa önceki
+        sonuçlar kullanılır.
+        """
+        product_category = state["product_category"]
+        user_intent = self._effective_intent(state)
+        
+        cache_key = (
+            f"{TextProcessor.normalize_query(product_category)}"
+            f"|{TextProcessor.intent_bucket(user_intent)}"
+        )
+        if state.get("refinements"):
+            cache_key += f"|{TextProcessor.normalize_query(' '.join(state['refinements']))}"
+        
+        if state.get("search_results") and state.get("search_key") == cache_key:
+            print(f"🔍 {product_category} için oturumdaki arama sonuçları kullanılıyor")
+            NODE_REUSED.inc(node="search_products")
+            return {}
+        
+        print(f"🔍 {product_category} ürünleri araştırılıyor...")
+        
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=search_prompt,
-                config={
-                    "tools": [{"google_search": {}}],
-                    "temperature": 0
-                }
+            result = await self.search_cache.get_or_load(
+                cache_key,
+                lambda: self._grounded_search(product_category, user_intent),
+                refresh_loader=lambda: self._background_grounded_search(product_category, user_intent)
             )
             
-            search_results = response.text
-            
-            sources = []
-            if (hasattr(response, 'candidates') and 
-                response.candidates and 
-                hasattr(response.candidates[0], 'grounding_metadata') and
-                response.candidates[0].grounding_metadata and
-                hasattr(response.candidates[0].grounding_metadata, 'grounding_chunks')):
-                
-                for chunk in response.candidates[0].grounding_metadata.grounding_chunks:
-                    if hasattr(chunk, 'web') and chunk.web:
-                        source = {
-                            'title': chunk.web.title if hasattr(chunk.web, 'title') else 'Başlık Yok',
-                            'url': chunk.web.uri if hasattr(chunk.web, 'uri') else '',
-                        }
-                        sources.append(source)
-            
-            print(f"✅ Ürün araştırması tamamlandı - {len(sources)} kaynak")
+            print(f"✅ Ürün araştırması tamamlandı - {len(result['sources'])} kaynak")
             
             return {
-                "search_results": search_results,
-                "sources": sources
+                "search_results": result["search_results"],
+                "sources": list(result["sources"]),
+                "search_key": cache_key
             }
             
         except Exception as e:
             print(f"Ürün araması başarısız: {e}")
+            NODE_FALLBACKS.inc(node="search_products")
             return {
                 "search_results": f"{product_category} için ürün bilgileri bulunamadı.",
-                "sources": []
+                "sources": [],
+                "search_key": "",
+                "degraded_sections": ["search"]
             }
     
-    def _generate_recommendation_node(self, state: ProductRecommendationState) -> ProductRecommendationState:
-        """NODE 4: Final öneri oluştur ve ürün listesi çıkar"""
+    def _prompt_fields(self, state: ProductRecommendationState) -> Dict[str, Dict[str, Any]]:
+        """Çağrı başına prompt şablonu, sabit alanlar ve sıkıştırılacak bağlam alanları"""
+        product_category = state["product_category"]
+        recommendation_fields = {
+            "product_category": product_category,
+            "product_category_title": product_category.title()
+        }
+        recommendation_context = {
+            "buying_guide": state["buying_guide"],
+            "search_results": state["search_results"]
+        }
+        return {
+            "product_extraction": {
+                "template": PromptTemplates.PRODUCT_EXTRACTION_TEMPLATE,
+                "fields": {},
+                "context": {"search_results": state["search_results"]},
+                "suffix": ""
+            },
+            "final_recommendation": {
+                "template": PromptTemplates.FINAL_RECOMMENDATION_TEMPLATE,
+                "fields": recommendation_fields,
+                "context": recommendation_context,
+                "suffix": self._refinement_note(state)
+            },
+            "structured_recommendation": {
+                "template": PromptTemplates.STRUCTURED_RECOMMENDATION_TEMPLATE,
+                "fields": recommendation_fields,
+                "context": recommendation_context,
+                "suffix": self._refinement_note(state)
+            }
+        }
+    
+    async def _compact_context_node(self, state: ProductRecommendationState) -> ProductRecommendationState:
+        """NODE 4: Rehber ve arama sonuçlarını prompt başına token bütçesine sığdır
+
+        Yalnızca etkin akışın promptları sıkıştırılır (STRUCTURED_OUTPUT
+        açıksa yapılandırılmış çağrı, değilse ürün çıkarma ve final öneri).
+        Tekrarlanan ve kalıp paragraflar atılır; bütçe hâlâ aşılıyorsa fiyat,
+        puan ve ürün adı içeren cümleler korunur. Token sayısı yerel olarak
+        tahmin edilir.
+        """
+        if config.STRUCTURED_OUTPUT:
+            call_names = ("structured_recommendation",)
+        else:
+            call_names = ("product_extraction", "final_recommendation")
+        
+        prompt_context = {}
+        context_stats = {}
+        prompts = self._prompt_fields(state)
+        for call_name in call_names:
+            context, context_stats[call_name] = self._compact_prompt(call_name, prompts[call_name])
+            if context is not None:
+                prompt_context[call_name] = context
+        
+        call_name = call_names[-1]
+        print(
+            f"🗜️ Bağlam sıkıştırıldı ({call_name}): "
+            f"{context_stats[call_name]['before_tokens']} → {context_stats[call_name]['after_tokens']} token"
+        )
+        
+        return {"prompt_context": prompt_context, "context_stats": context_stats}
+    
+    def _compact_prompt(self, call_name: str, prompt: Dict[str, Any]) -> Tuple[Optional[Dict[str, str]], Dict[str, int]]:
+        """Bir promptun bağlamını bütçesine sığdır; sıkıştırma kapalıysa bağlam None döner"""
+        empty_context = {name: "" for name in prompt["context"]}
+        template_tokens = count_tokens(
+            prompt["template"].format(**prompt["fields"], **empty_context) + prompt["suffix"]
+        )
+        if config.CONTEXT_COMPACTION_ENABLED:
+            context, stats = compact_prompt_context(
+                prompt["context"],
+                template_tokens,
+                config.PROMPT_TOKEN_BUDGETS.get(call_name, float("inf")),
+                {"buying_guide": config.CONTEXT_GUIDE_MAX_SHARE}
+            )
+        else:
+            tokens = template_tokens + sum(count_tokens(text) for text in prompt["context"].values())
+            context, stats = None, {"before_tokens": tokens, "after_tokens": tokens}
+        PROMPT_CONTEXT_TOKENS.inc(stats["before_tokens"], call=call_name, stage="before")
+        PROMPT_CONTEXT_TOKENS.inc(stats["after_tokens"], call=call_name, stage="after")
+        return context, stats
+    
+    def _build_prompt(self, state: ProductRecommendationState, call_name: str) -> str:
+        """Sıkıştırılmış bağlamla prompt oluştur
+
+        Bağlam node'da sıkıştırılmadıysa (yapılandırılmış çağrıdan iki
+        çağrılı akışa düşüldüyse) burada sıkıştırılır.
+        """
+        prompt = self._prompt_fields(state)[call_name]
+        context = state.get("prompt_context", {}).get(call_name)
+        if context is None and config.CONTEXT_COMPACTION_ENABLED:
+            context = self._compact_prompt(call_name, prompt)[0]
+        context = context or prompt["context"]
+        return prompt["template"].format(**prompt["fields"], **context) + prompt["suffix"]
+    
+    async def _generate_structured_recommendation(self, state: ProductRecommendationState, writer: StreamWriter) -> Optional[ProductRecommendationState]:
+        """Öneri metni, ürün listesi ve en iyi değer seçimini tek JSON şemalı çağrıda üret
+
+        Çağrı ya da şema doğrulaması başarısız olursa None döner; node iki
+        çağrılı akışa geri düşer.
+        """
+        prompt = self._build_prompt(state, "structured_recommendation")
+        
+        try:
+            response = await self._call_model(
+                call_name="structured_recommendation",
+                model=self._route("structured_recommendation"),
+                contents=prompt,
+                config={
+                    "temperature": 0.2,
+                    "response_mime_type": "application/json",
+                    "response_schema": StructuredRecommendation
+                }
+            )
+            
+            structured = StructuredRecommendation.model_validate_json(response.text)
+            
+        except Exception as e:
+            print(f"Yapılandırılmış öneri başarısız, iki adımlı akışa geçiliyor: {e}")
+            NODE_FALLBACKS.inc(node="generate_recommendation")
+            return None
+        
+        details = {product.name.strip(): product.model_dump() for product in structured.products}
+        recommended_products = self.catalog.canonicalize(
+            [product.name.strip() for product in structured.products], state["product_category"], details
+        )
+        product_details = []
+        for name in recommended_products:
+            entry = self.catalog.lookup(name)
+            product_details.append({**(entry.details if entry else {}), "name": name})
+        writer({"token": structured.recommendation})
+        
+        print(f"📦 {len(recommended_products)} ürün tespit edildi")
+        print(f"🎉 Final öneri hazır!")
+        
+        return {
+            "final_recommendation": structured.recommendation,
+            "recommended_products": recommended_products,
+            "product_details": product_details,
+            "best_value": structured.best_value,
+            "messages": [AIMessage(content=structured.recommendation)]
+        }
+    
+    async def _generate_recommendation_node(self, state: ProductRecommendationState, writer: StreamWriter) -> ProductRecommendationState:
+        """NODE 5: Final öneri oluştur ve ürün listesi çıkar
+
+        Final metin stream edilir; her parça `custom` stream moduna token olarak yazılır.
+        STRUCTURED_OUTPUT açıksa tek yapılandırılmış çağrı denenir. State'te
+        yalnızca model metni tutulur; kaynak ve link bölümleri yanıt
+        oluşturulurken eklenir.
+        """
         product_category = state["product_category"]
         buying_guide = state["buying_guide"]
-        search_results = state["search_results"]
-        sources = state.get("sources", [])
         
         print(f"🎯 Final öneri hazırlanıyor...")
         
-        product_extraction_prompt = PromptTemplates.PRODUCT_EXTRACTION_TEMPLATE.format(
-            search_results=search_results
-        )
+        if config.STRUCTURED_OUTPUT:
+            structured = await self._generate_structured_recommendation(state, writer)
+            if structured is not None:
+                return structured
+        
+        degraded_sections = []
+        
+        product_extraction_prompt = self._build_prompt(state, "product_extraction")
         
         try:
-            product_response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
+            product_response = await self._call_model(
+                call_name="product_extraction",
+                model=self._route("product_extraction"),
                 contents=product_extraction_prompt,
                 config={"temperature": 0.1}
             )
             
-            recommended_products = TextProcessor.parse_product_list(product_response.text)
+            recommended_products = self.catalog.canonicalize(
+                TextProcessor.parse_product_list(product_response.text), product_category
+            )
             
             print(f"📦 {len(recommended_products)} ürün tespit edildi")
             
         except Exception as e:
             print(f"Ürün listesi çıkarma hatası: {e}")
+            NODE_FALLBACKS.inc(node="generate_recommendation")
             recommended_products = []
+            degraded_sections.append("product_list")
         
-        prompt = PromptTemplates.FINAL_RECOMMENDATION_TEMPLATE.format(
-            product_category=product_category,
-            product_category_title=product_category.title(),
-            buying_guide=buying_guide,
-            search_results=search_results
-        )
+        prompt = self._build_prompt(state, "final_recommendation")
         
+        chunks = []
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
+            async for token in self._stream_model(
+                call_name="final_recommendation",
+                model=self._route("final_recommendation"),
                 contents=prompt,
                 config={"temperature": 0.2}
-            )
-            
-            final_recommendation = response.text
+            ):
+                chunks.append(token)
+                writer({"token": token})
             
-            final_recommendation = ResponseFormatter.add_sources_to_text(
-                final_recommendation, sources
-            )
+            final_recommendation = "".join(chunks)
             
             print(f"🎉 Final öneri hazır!")
             
             return {
                 "final_recommendation": final_recommendation,
                 "recommended_products": recommended_products,
+                "degraded_sections": degraded_sections,
                 "messages": [AIMessage(content=final_recommendation)]
             }
             
         except Exception as e:
             print(f"Final öneri oluşturulamadı: {e}")
-            error_message = "Öneri oluşturulamadı."
+            NODE_FALLBACKS.inc(node="generate_recommendation")
+            
+            if "buying_guide" in state.get("degraded_sections", []):
+                buying_guide = ""
+            
+            final_recommendation = ResponseFormatter.build_partial_recommendation(
+                product_category, buying_guide, "".join(chunks)
+            )
             return {
-                "final_recommendation": error_message,
-                "recommended_products": [],
-                "messages": [AIMessage(content=error_message)]
+                "final_recommendation": final_recommendation,
+                "recommended_products": recommended_products,
+                "degraded_sections": degraded_sections + ["recommendation"],
+                "messages": [AIMessage(content=final_recommendation)]
             }
     
-    def _search_ecommerce_links_node(self, state: ProductRecommendationState) -> ProductRecommendationState:
-        """NODE 5: E-ticaret sitelerinde ürün linkleri ara"""
+    async def _search_ecommerce_links_node(self, state: ProductRecommendationState) -> ProductRecommendationState:
+        """NODE 6: E-ticaret sitelerinde ürün linkleri ara"""
         recommended_products = state.get("recommended_products", [])
-        final_recommendation = state.get("final_recommendation", "")
         
         print(f"🛒 E-ticaret linkleri aranıyor...")
         
@@ -248,28 +1018,13 @@ class SmartProductAgent:
             if product_links:
                 ecommerce_links[product] = product_links
                 print(f"      ✅ {len(product_links)} site linki oluşturuldu")
-            
-            time.sleep(0.1)
-        
-        final_recommendation = ResponseFormatter.add_ecommerce_links_to_text(
-            final_recommendation, ecommerce_links
-        )
         
         print(f"🎉 E-ticaret linkleri hazır! {len(ecommerce_links)} ürün için linkler oluşturuldu")
         
-        return {
-            "ecommerce_links": ecommerce_links,
-            "final_recommendation": final_recommendation,
-            "messages": [AIMessage(content=final_recommendation)]
-        }
+        return {"ecommerce_links": ecommerce_links}
     
-    def get_recommendation(self, user_input: str) -> Dict:
-        """Kullanıcı isteğine göre ürün önerisi al"""
-        print("\n" + "="*60)
-        print("🛒 Akıllı Ürün Öneri Ajanı Başlatılıyor...")
-        print("="*60)
-        
-        initial_state = {
+    def _initial_state(self, user_input: str) -> ProductRecommendationState:
+        return {
             "messages": [HumanMessage(content=user_input)],
             "user_intent": "",
             "product_category": "",
@@ -277,16 +1032,203 @@ class SmartProductAgent:
             "search_results": "",
             "final_recommendation": "",
             "recommended_products": [],
+            "product_details": [],
+            "best_value": "",
             "ecommerce_links": {},
-            "sources": []
+            "sources": [],
+            "degraded_sections": [],
+            "refinements": [],
+            "guide_category": "",
+            "search_key": "",
+            "prompt_context": {},
+            "context_stats": {}
         }
-        
-        result = self.graph.invoke(initial_state)
-        
+    
+    @staticmethod
+    def _turn_state(user_input: str) -> Dict[str, Any]:
+        """Oturumda yeni tur: yalnızca tura özgü alanlar sıfırlanır; rehber ve arama sonuçları korunur"""
+        return {
+            "messages": [HumanMessage(content=user_input)],
+            "final_recommendation": "",
+            "recommended_products": [],
+            "product_details": [],
+            "best_value": "",
+            "ecommerce_links": {},
+            "degraded_sections": None
+        }
+    
+    async def _session_input(self, graph, run_config: Dict[str, Any], user_input: str) -> Dict[str, Any]:
+        snapshot = await graph.aget_state(run_config)
+        if not snapshot.values:
+            return self._initial_state(user_input)
+        return self._turn_state(user_input)
+    
+    @staticmethod
+    def _to_response(state: ProductRecommendationState, session_id: Optional[str] = None) -> Dict:
         return {
-            "recommendation": result["final_recommendation"],
-            "product_category": result["product_category"],
-            "recommended_products": result["recommended_products"],
-            "ecommerce_links": result["ecommerce_links"],
-            "sources": result["sources"]
+            "narrative": state["final_recommendation"],
+            "product_category": state["product_category"],
+            "recommended_products": state["recommended_products"],
+            "ecommerce_links": state["ecommerce_links"],
+            "sources": state["sources"],
+            "product_details": state.get("product_details", []),
+            "best_value": state.get("best_value") or None,
+            "degraded_sections": list(state.get("degraded_sections", [])),
+            "session_id": session_id,
+            "prompt_tokens": {
+                call_name: {"before": stats["before_tokens"], "after": stats["after_tokens"]}
+                for call_name, stats in state.get("context_stats", {}).items()
+            }
         }
+    
+    def _get_cached_response(self, user_input: str) -> Optional[Dict]:
+        if not config.RESULT_CACHE_ENABLED:
+            return None
+        
+        cache_key = TextProcessor.normalize_query(user_input)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            print(f"⚡ Önbellekten yanıt: '{cache_key}'")
+            return dict(cached)
+        return None
+    
+    def _cache_response(self, user_input: str, response: Dict) -> None:
+        if not config.RESULT_CACHE_ENABLED:
+            return
+        
+        if not response["recommended_products"] or response["degraded_sections"]:
+            return
+        
+        self.result_cache.set(TextProcessor.normalize_query(user_input), response)
+    
+    async def aget_recommendation(
+        self,
+        user_input: str,
+        deadline_seconds: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> Dict:
+        """Kullanıcı isteğine göre ürün önerisi al (async)
+
+        `deadline_seconds` (varsayılan REQUEST_DEADLINE_SECONDS) dolduğunda
+        eldeki kısmi sonuç `degraded_sections` işaretiyle döner. `session_id`
+        verilirse istek o oturumun önceki turlarının state'i üzerinde çalışır.
+        """
+        with request_deadline(self._deadline_seconds(deadline_seconds)):
+            if session_id:
+                return await self._aget_session_recommendation(user_input, session_id)
+            return await self._aget_recommendation(user_input)
+    
+    @staticmethod
+    def _deadline_seconds(deadline_seconds: Optional[float]) -> float:
+        if deadline_seconds is None:
+            return config.REQUEST_DEADLINE_SECONDS
+        return min(deadline_seconds, config.REQUEST_DEADLINE_MAX_SECONDS)
+    
+    async def _aget_recommendation(self, user_input: str) -> Dict:
+        start = time.perf_counter()
+        cached = self._get_cached_response(user_input)
+        record_timing("result_cache", time.perf_counter() - start)
+        if cached is not None:
+            return cached
+        
+        print("\n" + "="*60)
+        print("🛒 Akıllı Ürün Öneri Ajanı Başlatılıyor...")
+        print("="*60)
+        
+        result = await self.graph.ainvoke(self._initial_state(user_input))
+        
+        response = self._to_response(result)
+        self._cache_response(user_input, response)
+        return response
+    
+    async def _aget_session_recommendation(self, user_input: str, session_id: str) -> Dict:
+        """Oturum turları sonuç önbelleğini kullanmaz; yanıt önceki turlara bağlıdır"""
+        print("\n" + "="*60)
+        print(f"🛒 Akıllı Ürün Öneri Ajanı Başlatılıyor (oturum: {session_id})...")
+        print("="*60)
+        
+        graph = await self._get_session_graph()
+        async with self.sessions.turn(session_id) as run_config:
+            graph_input = await self._session_input(graph, run_config, user_input)
+            result = await graph.ainvoke(graph_input, run_config)
+        
+        return self._to_response(result, session_id)
+    
+    async def astream_recommendation(
+        self,
+        user_input: str,
+        deadline_seconds: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Ürün önerisini ilerleme olaylarıyla akıt
+
+        Her node bittiğinde ("node", güncelleme), final metnin her parçası için
+        ("token", parça) ve en sonda ("done", yanıt) üretir.
+        """
+        with request_deadline(self._deadline_seconds(deadline_seconds)):
+            async for event in self._astream_recommendation(user_input, session_id):
+                yield event
+    
+    async def _astream_recommendation(self, user_input: str, session_id: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        if not session_id:
+            cached = self._get_cached_response(user_input)
+            if cached is not None:
+                yield "done", cached
+                return
+        
+        print("\n" + "="*60)
+        print("🛒 Akıllı Ürün Öneri Ajanı Başlatılıyor (stream)...")
+        print("="*60)
+        
+        if not session_id:
+            state = self._initial_state(user_input)
+            async for event in self._stream_graph(self.graph, state, None, state):
+                yield event
+            
+            response = self._to_response(state)
+            self._cache_response(user_input, response)
+            yield "done", response
+            return
+        
+        graph = await self._get_session_graph()
+        async with self.sessions.turn(session_id) as run_config:
+            graph_input = await self._session_input(graph, run_config, user_input)
+            async for event in self._stream_graph(graph, graph_input, run_config, dict(graph_input)):
+                yield event
+            state = (await graph.aget_state(run_config)).values
+        
+        yield "done", self._to_response(state, session_id)
+    
+    @staticmethod
+    async def _stream_graph(graph, graph_input: Dict[str, Any], run_config: Optional[Dict[str, Any]], state: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict]]:
+        """Graph'ı çalıştırıp node güncellemelerini `state` üzerine işle ve olay olarak üret
+
+        `degraded_sections` graph'taki gibi `merge_sections` ile birleştirilir;
+        paralel node'ların bozulmuş bölümleri birbirini ezmez.
+        """
+        async for mode, chunk in graph.astream(graph_input, run_config, stream_mode=["updates", "custom"]):
+            if mode == "custom":
+                yield "token", {"text": chunk["token"]}
+                continue
+            
+            for node_name, update in chunk.items():
+                update = {k: v for k, v in (update or {}).items() if k != "messages"}
+                state.update({k: v for k, v in update.items() if k != "degraded_sections"})
+                if "degraded_sections" in update:
+                    state["degraded_sections"] = merge_sections(
+                        state.get("degraded_sections") or [], update["degraded_sections"]
+                    )
+                yield "node", {"node": node_name, "data": {k: v for k, v in update.items() if k != "prompt_context"}}
+    
+    def get_recommendation(
+        self,
+        user_input: str,
+        deadline_seconds: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> Dict:
+        """Kullanıcı isteğine göre ürün önerisi al
+
+        Script ve konsol kullanımı için senkron sarmalayıcı; event loop
+        içinden `aget_recommendation` kullanılmalı.
+        """
+        return asyncio.run(self.aget_recommendation(user_input, deadline_seconds, session_id))
@@ -1,15 +1,41 @@
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from fastapi import FastAPI, HTTPException
+from typing import TYPE_CHECKING, Awaitable, Optional, TypeVar
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from models import RecommendationRequest, RecommendationResponse, HealthResponse
-from agent import SmartProductAgent
+from pydantic import BaseModel
+
+from models import (
+    HealthResponse,
+    JobStatusResponse,
+    JobSubmitResponse,
+    RecommendationRequest,
+    RecommendationResponse
+)
 from config import config
+from utils import ResponseFormatter, TextProcessor
+from compression import compress, etag_for, etag_matches, negotiate_encoding
+from concurrency import ClientDisconnected, SingleFlight, iterate_in_task, request_deadline
+from jobs import JOB_QUEUED, JOB_RUNNING, JobQueue, JobQueueFull
+from prewarm import Prewarmer, QueryLog
+from startup import mark_ready, startup_phase, startup_report
+from metrics import (
+    RECOMMENDATIONS_IN_FLIGHT,
+    RECOMMENDATIONS_TOTAL,
+    metrics,
+    request_timings,
+    summarize_timings
+)
+
+
+if TYPE_CHECKING:
+    from agent import SmartProductAgent
 
+T = TypeVar("T")
 
 class APIApp:
-    def __init__(self):
+    def __init__(self, agent: Optional["SmartProductAgent"] = None):
         self.app = FastAPI(
             title=config.APP_TITLE,
             description=config.APP_DESCRIPTION,
@@ -25,19 +51,243 @@ class APIApp:
         )
         
         self.agent = None
-        self.executor = ThreadPoolExecutor(max_workers=config.MAX_WORKERS)
+        self.startup_error: Optional[str] = None
+        self._provided_agent = agent
+        self._init_task: Optional[asyncio.Task] = None
+        self.semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_RECOMMENDATIONS)
+        self.recommend_flight = SingleFlight()
+        self.jobs = JobQueue(
+            self._run_job,
+            workers=config.JOB_WORKERS,
+            max_queue=config.JOB_QUEUE_MAX,
+            result_ttl_seconds=config.JOB_RESULT_TTL_SECONDS,
+            max_finished=config.JOB_MAX_RETAINED,
+            error_formatter=self._job_error
+        )
+        self.query_log = QueryLog(config.QUERY_LOG_PATH, max_entries=config.QUERY_LOG_MAX_ENTRIES)
+        self.prewarmer: Optional[Prewarmer] = None
+        metrics.register_collector(self._collect_metrics)
         
         self.app.add_event_handler("startup", self.startup_event)
+        self.app.add_event_handler("shutdown", self.shutdown_event)
         
         self._register_routes()
     
     async def startup_event(self):
+        """Agent arka planda kurulur; bu sürede / yanıt verir, /health hazır değil döner"""
+        if self._provided_agent is not None:
+            await self._on_agent_ready(self._provided_agent)
+            return
+        
+        self._init_task = asyncio.create_task(self._init_agent())
+    
+    async def _init_agent(self):
         try:
-            self.agent = SmartProductAgent()
+            agent = await asyncio.to_thread(self._create_agent)
             print("✅ Smart Product Agent başlatıldı")
         except Exception as e:
+            self.startup_error = str(e)
             print(f"❌ Agent başlatılamadı: {e}")
-            raise e
+            return
+        
+        await self._on_agent_ready(agent)
+    
+    @staticmethod
+    def _create_agent() -> "SmartProductAgent":
+        """Ağır kütüphaneleri import edip agent'ı kur; import ve kurulum süreleri ayrı ayrı ölçülür"""
+        with startup_phase("import.google_genai"):
+            import google.genai  # noqa: F401
+        with startup_phase("import.langgraph"):
+            import langgraph.graph  # noqa: F401
+        with startup_phase("import.langchain_core"):
+            import langchain_core.messages  # noqa: F401
+        with startup_phase("import.agent"):
+            from agent import SmartProductAgent
+        with startup_phase("init.agent"):
+            return SmartProductAgent()
+    
+    async def _on_agent_ready(self, agent: "SmartProductAgent"):
+        await self.jobs.start()
+        await agent.guide_store.start()
+        await agent.catalog.start()
+        
+        self.prewarmer = Prewarmer(
+            agent,
+            self.query_log,
+            top_n=config.PREWARM_TOP_N,
+            interval_seconds=config.PREWARM_INTERVAL_SECONDS,
+            rate_per_minute=config.PREWARM_RATE_PER_MINUTE,
+            startup_delay_seconds=config.PREWARM_STARTUP_DELAY_SECONDS,
+            flush_seconds=config.QUERY_LOG_FLUSH_SECONDS,
+            enabled=config.PREWARM_ENABLED
+        )
+        await self.prewarmer.start()
+        
+        self.agent = agent
+        mark_ready()
+        print(f"🚀 Hazır ({startup_report()['ready_after_seconds']}s)")
+    
+    async def shutdown_event(self):
+        if self._init_task is not None and not self._init_task.done():
+            self._init_task.cancel()
+        await self.jobs.stop()
+        if self.prewarmer is not None:
+            await self.prewarmer.stop()
+        if self.agent is not None:
+            await self.agent.guide_store.stop()
+            await self.agent.catalog.stop()
+    
+    @staticmethod
+    def _request_deadline(request: RecommendationRequest) -> float:
+        """İstek süresini yapılandırılmış üst sınıra kırp"""
+        return min(
+            request.deadline_seconds or config.REQUEST_DEADLINE_SECONDS,
+            config.REQUEST_DEADLINE_MAX_SECONDS
+        )
+    
+    @staticmethod
+    def _to_response_model(result: dict, timings: Optional[dict] = None, response_format: str = "markdown") -> RecommendationResponse:
+        """Agent sonucunu yanıt modeline çevir
+
+        `markdown` modunda kaynak ve e-ticaret bölümleri metne eklenir;
+        `compact` modunda metin yalnızca model çıktısıdır, bölümler ayrı
+        alanlarda döner.
+        """
+        if response_format == "compact":
+            recommendation = result["narrative"]
+        else:
+            recommendation = ResponseFormatter.build_markdown(
+                result["narrative"], result["sources"], result["ecommerce_links"]
+            )
+        
+        return RecommendationResponse(
+            recommendation=recommendation,
+            product_category=result["product_category"],
+            recommended_products=result["recommended_products"],
+            ecommerce_links=result["ecommerce_links"],
+            sources=result["sources"],
+            product_details=result["product_details"],
+            best_value=result["best_value"],
+            degraded_sections=result["degraded_sections"],
+            session_id=result.get("session_id"),
+            response_format=response_format,
+            timings=summarize_timings(timings) if timings is not None else None,
+            prompt_tokens=result.get("prompt_tokens") if timings is not None else None
+        )
+    
+    @staticmethod
+    async def _wait_for_disconnect(http_request: Request) -> None:
+        while True:
+            message = await http_request.receive()
+            if message["type"] == "http.disconnect":
+                return
+    
+    async def _until_disconnect(self, http_request: Request, work: Awaitable[T]) -> T:
+        """İşi çalıştır; istemci bağlantıyı keserse işi iptal edip ClientDisconnected fırlat"""
+        task = asyncio.ensure_future(work)
+        watcher = asyncio.ensure_future(self._wait_for_disconnect(http_request))
+        try:
+            await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+            if not task.done():
+                task.cancel()
+                await asyncio.wait({task})
+        
+        if task.cancelled():
+            raise ClientDisconnected("İstemci bağlantıyı kapattı")
+        return task.result()
+    
+    @staticmethod
+    def _encoded_response(
+        http_request: Request,
+        model: BaseModel,
+        exclude_none: bool = False,
+        conditional: bool = False
+    ) -> Response:
+        """JSON yanıtı yeterince büyükse br/gzip sıkıştır; conditional ise ETag ekle, If-None-Match eşleşirse 304 dön"""
+        body = model.model_dump_json(exclude_none=exclude_none).encode("utf-8")
+        headers = {"Vary": "Accept-Encoding"}
+        
+        if conditional:
+            etag = headers["ETag"] = etag_for(body)
+            if etag_matches(http_request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers=headers)
+        
+        if len(body) >= config.RESPONSE_COMPRESSION_MIN_BYTES:
+            encoding = negotiate_encoding(http_request.headers.get("accept-encoding"))
+            if encoding:
+                body = compress(
+                    body,
+                    encoding,
+                    gzip_level=config.RESPONSE_GZIP_LEVEL,
+                    brotli_quality=config.RESPONSE_BROTLI_QUALITY
+                )
+                headers["Content-Encoding"] = encoding
+        
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    def _record_query(self, request: RecommendationRequest, result: dict) -> None:
+        """Tam (bozulmamış) oturumsuz yanıtları ısıtma için sorgu günlüğüne yaz"""
+        if request.session_id or result["degraded_sections"]:
+            return
+        self.query_log.record(request.user_input, result["product_category"])
+    
+    async def _run_job(self, request: RecommendationRequest) -> dict:
+        """Kuyruktan alınan işi çalıştır; süre sınırı iş başladığında işlemeye başlar"""
+        deadline = self._request_deadline(request)
+        
+        RECOMMENDATIONS_IN_FLIGHT.inc(endpoint="jobs")
+        try:
+            with request_timings() as timings, request_deadline(deadline):
+                async with self.semaphore:
+                    result = await asyncio.wait_for(
+                        self.agent.aget_recommendation(request.user_input, deadline, request.session_id),
+                        deadline + config.REQUEST_DEADLINE_GRACE_SECONDS
+                    )
+            
+            outcome = "degraded" if result["degraded_sections"] else "success"
+            RECOMMENDATIONS_TOTAL.inc(endpoint="jobs", outcome=outcome)
+            self._record_query(request, result)
+            return self._to_response_model(
+                result, timings if request.include_timings else None, request.response_format
+            ).model_dump(exclude_none=request.response_format == "compact")
+            
+        except asyncio.TimeoutError:
+            print(f"⏱️ İş süre sınırını aştı ({deadline:.1f}s)")
+            RECOMMENDATIONS_TOTAL.inc(endpoint="jobs", outcome="timeout")
+            raise
+        except Exception as e:
+            print(f"❌ İş hatası: {e}")
+            RECOMMENDATIONS_TOTAL.inc(endpoint="jobs", outcome="error")
+            raise
+        finally:
+            RECOMMENDATIONS_IN_FLIGHT.dec(endpoint="jobs")
+    
+    @staticmethod
+    def _job_error(error: BaseException) -> str:
+        if isinstance(error, asyncio.TimeoutError):
+            return "Öneri süre sınırı içinde tamamlanamadı"
+        return f"Öneri oluşturulamadı: {str(error)}"
+    
+    def _collect_metrics(self):
+        jobs = self.jobs.stats()
+        yield "job_queue_depth", "gauge", "Recommendation jobs waiting for a worker", {}, jobs["queue_depth"]
+        yield "jobs_running", "gauge", "Recommendation jobs being processed", {}, jobs["running"]
+        yield "jobs_rejected_total", "counter", "Job submissions rejected because the queue was full", {}, jobs["rejected"]
+        for status in ("done", "failed", "expired"):
+            yield "jobs_total", "counter", "Recommendation jobs by final state", {"status": status}, jobs[status]
+        
+        flight = self.recommend_flight.stats()
+        yield "single_flight_coalesced_total", "counter", "Calls coalesced onto an in-flight duplicate", {"scope": "recommendations"}, flight["coalesced"]
+        yield "single_flight_abandoned_total", "counter", "Shared tasks cancelled after every waiter went away", {"scope": "recommendations"}, flight["abandoned"]
+        yield "agent_ready", "gauge", "Whether the agent is initialized", {}, int(self.agent is not None)
+        
+        report = startup_report()
+        for phase, seconds in report["phases"].items():
+            yield "startup_phase_seconds", "gauge", "Duration of each import / initialization phase at startup", {"phase": phase}, seconds
+        if report["ready_after_seconds"] is not None:
+            yield "startup_ready_seconds", "gauge", "Seconds from process start until the agent was ready", {}, report["ready_after_seconds"]
     
     def _register_routes(self):
         
@@ -51,43 +301,199 @@ class APIApp:
         @self.app.get("/health", response_model=HealthResponse)
         async def health_check():
             if self.agent is None:
+                if self.startup_error:
+                    raise HTTPException(status_code=503, detail=f"Agent başlatılamadı: {self.startup_error}")
                 raise HTTPException(status_code=503, detail="Agent henüz başlatılmadı")
             
             return HealthResponse(
                 status="healthy",
-                message="Tüm sistemler çalışıyor"
+                message="Tüm sistemler çalışıyor",
+                details={
+                    "startup": startup_report(),
+                    "result_cache": self.agent.result_cache.stats(),
+                    "guide_store": self.agent.guide_store.stats(),
+                    "catalog": self.agent.catalog.stats(),
+                    "search_cache": self.agent.search_cache.stats(),
+                    "llm_store": self.agent.response_store.stats(),
+                    "intent_classifier": self.agent.intent_classifier.stats(),
+                    "scheduler": self.agent.scheduler.stats(),
+                    "client_pool": self.agent.clients.stats(),
+                    "model_routing": self.agent.router.stats(),
+                    "sessions": self.agent.sessions.stats(),
+                    "jobs": self.jobs.stats(),
+                    "prewarm": self.prewarmer.stats() if self.prewarmer else {"query_log": self.query_log.stats()},
+                    "hedging": {
+                        f"{model}/{call_name}": stats
+                        for (model, call_name), stats in self.agent.hedger.stats().items()
+                    },
+                    "single_flight": {
+                        "recommendations": self.recommend_flight.stats(),
+                        "model_calls": self.agent.model_call_flight.stats()
+                    }
+                }
+            )
+        
+        @self.app.get("/metrics", response_class=PlainTextResponse)
+        async def prometheus_metrics():
+            return PlainTextResponse(
+                metrics.render(),
+                media_type="text/plain; version=0.0.4; charset=utf-8"
             )
         
         @self.app.post("/recommend", response_model=RecommendationResponse)
-        async def get_recommendation(request: RecommendationRequest):
+        async def get_recommendation(request: RecommendationRequest, http_request: Request):
             if self.agent is None:
                 raise HTTPException(status_code=503, detail="Agent henüz başlatılmadı")
             
             if not request.user_input.strip():
                 raise HTTPException(status_code=400, detail="Ürün isteği boş olamaz")
             
+            deadline = self._request_deadline(request)
+            
+            async def run_recommendation():
+                async with self.semaphore:
+                    return await self.agent.aget_recommendation(
+                        request.user_input, deadline, request.session_id
+                    )
+            
+            RECOMMENDATIONS_IN_FLIGHT.inc(endpoint="recommend")
             try:
+                with request_timings() as timings, request_deadline(deadline):
+                    if request.session_id or request.include_timings:
+                        work = run_recommendation()
+                    else:
+                        work = self.recommend_flight.do(
+                            f"{TextProcessor.normalize_query(request.user_input)}|{deadline:g}",
+                            run_recommendation
+                        )
+                    result = await asyncio.wait_for(
+                        self._until_disconnect(http_request, work),
+                        deadline + config.REQUEST_DEADLINE_GRACE_SECONDS
+                    )
                 
-                loop = asyncio.get_event_loop()
-                result = await loop.run_in_executor(
-                    self.executor, 
-                    self.agent.get_recommendation, 
-                    request.user_input
-                )
-                
-                return RecommendationResponse(
-                    recommendation=result["recommendation"],
-                    product_category=result["product_category"],
-                    recommended_products=result["recommended_products"],
-                    ecommerce_links=result["ecommerce_links"],
-                    sources=result["sources"]
+                outcome = "degraded" if result["degraded_sections"] else "success"
+                RECOMMENDATIONS_TOTAL.inc(endpoint="recommend", outcome=outcome)
+                self._record_query(request, result)
+                return self._encoded_response(
+                    http_request,
+                    self._to_response_model(
+                        result, timings if request.include_timings else None, request.response_format
+                    ),
+                    exclude_none=request.response_format == "compact"
                 )
                 
+            except ClientDisconnected:
+                print("🔌 İstemci bağlantıyı kapattı, öneri iptal edildi")
+                RECOMMENDATIONS_TOTAL.inc(endpoint="recommend", outcome="cancelled")
+                return Response(status_code=499)
+            except asyncio.TimeoutError:
+                print(f"⏱️ Öneri süre sınırını aştı ({deadline:.1f}s)")
+                RECOMMENDATIONS_TOTAL.inc(endpoint="recommend", outcome="timeout")
+                raise HTTPException(status_code=504, detail="Öneri süre sınırı içinde tamamlanamadı")
             except Exception as e:
                 print(f"❌ Öneri hatası: {e}")
+                RECOMMENDATIONS_TOTAL.inc(endpoint="recommend", outcome="error")
                 raise HTTPException(status_code=500, detail=f"Öneri oluşturulamadı: {str(e)}")
+            finally:
+                RECOMMENDATIONS_IN_FLIGHT.dec(endpoint="recommend")
+        
+        @self.app.post("/recommend/jobs", response_model=JobSubmitResponse, status_code=202)
+        async def submit_recommendation_job(request: RecommendationRequest, response: Response):
+            if self.agent is None:
+                raise HTTPException(status_code=503, detail="Agent henüz başlatılmadı")
+            
+            if not request.user_input.strip():
+                raise HTTPException(status_code=400, detail="Ürün isteği boş olamaz")
+            
+            try:
+                job = self.jobs.submit(request)
+            except JobQueueFull as e:
+                print(f"🚦 İş kuyruğu dolu, istek reddedildi (Retry-After: {e.retry_after}s)")
+                raise HTTPException(
+                    status_code=429,
+                    detail="Sunucu yoğun, lütfen daha sonra tekrar deneyin",
+                    headers={"Retry-After": str(e.retry_after)}
+                )
+            
+            status_url = f"/recommend/jobs/{job.id}"
+            response.headers["Location"] = status_url
+            return JobSubmitResponse(
+                job_id=job.id,
+                status=job.status,
+                status_url=status_url,
+                queue_position=self.jobs.position(job)
+            )
+        
+        @self.app.get("/recommend/jobs/{job_id}", response_model=JobStatusResponse)
+        async def get_recommendation_job(job_id: str, http_request: Request):
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise HTTPException(status_code=404, detail="İş bulunamadı veya süresi doldu")
+            
+            status = JobStatusResponse(
+                job_id=job.id,
+                status=job.status,
+                queue_position=self.jobs.position(job),
+                created_at=job.created_at,
+                started_at=job.started_at,
+                finished_at=job.finished_at,
+                result=job.result,
+                error=job.error
+            )
+            response = self._encoded_response(http_request, status, exclude_none=True, conditional=True)
+            if job.status in (JOB_QUEUED, JOB_RUNNING):
+                response.headers["Retry-After"] = "1"
+            return response
+        
+        @self.app.post("/recommend/stream")
+        async def stream_recommendation(request: RecommendationRequest):
+            if self.agent is None:
+                raise HTTPException(status_code=503, detail="Agent henüz başlatılmadı")
+            
+            if not request.user_input.strip():
+                raise HTTPException(status_code=400, detail="Ürün isteği boş olamaz")
+            
+            deadline = self._request_deadline(request)
+            
+            async def event_stream():
+                RECOMMENDATIONS_IN_FLIGHT.inc(endpoint="stream")
+                outcome = "success"
+                try:
+                    with request_deadline(deadline):
+                        async with self.semaphore:
+                            with request_timings() as timings:
+                                async for event, data in iterate_in_task(self.agent.astream_recommendation(
+                                    request.user_input, deadline, request.session_id
+                                )):
+                                    if event == "done":
+                                        if data["degraded_sections"]:
+                                            outcome = "degraded"
+                                        self._record_query(request, data)
+                                        data = self._to_response_model(
+                                            data, timings if request.include_timings else None, request.response_format
+                                        ).model_dump(exclude_none=request.response_format == "compact")
+                                    yield ResponseFormatter.format_sse_event(event, data)
+                    RECOMMENDATIONS_TOTAL.inc(endpoint="stream", outcome=outcome)
+                except asyncio.CancelledError:
+                    print("🔌 İstemci bağlantıyı kapattı, stream iptal edildi")
+                    RECOMMENDATIONS_TOTAL.inc(endpoint="stream", outcome="cancelled")
+                    raise
+                except Exception as e:
+                    print(f"❌ Stream öneri hatası: {e}")
+                    RECOMMENDATIONS_TOTAL.inc(endpoint="stream", outcome="error")
+                    yield ResponseFormatter.format_sse_event(
+                        "error", {"detail": f"Öneri oluşturulamadı: {str(e)}"}
+                    )
+                finally:
+                    RECOMMENDATIONS_IN_FLIGHT.dec(endpoint="stream")
+            
+            return StreamingResponse(
+                event_stream(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
 
 
-def create_app() -> FastAPI:
-    api_app = APIApp()
+def create_app(agent: Optional["SmartProductAgent"] = None) -> FastAPI:
+    api_app = APIApp(agent)
     return api_app.app
@@ -0,0 +1,276 @@
+"""
+Offline stand-in for `google.genai.Client` used by the benchmark suite.
+
+Responses are canned per `PromptTemplates` template and returned as real
+`types.GenerateContentResponse` objects (with usage and grounding metadata),
+so the agent exercises the same parsing code as in production. Latency is
+drawn from a per-template lognormal distribution, optionally with a share of
+3-5x outliers, and a configurable share of calls fail with retryable API
+errors.
+"""
+
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from google.genai import errors, types
+
+INTENT = "intent"
+REFINEMENT_CHECK = "refinement_check"
+BUYING_GUIDE = "buying_guide"
+PRODUCT_SEARCH = "product_search"
+PRODUCT_EXTRACTION = "product_extraction"
+FINAL_RECOMMENDATION = "final_recommendation"
+STRUCTURED_RECOMMENDATION = "structured_recommendation"
+
+# (median seconds, sigma) of the lognormal latency per template
+DEFAULT_LATENCY_PROFILE: Dict[str, Tuple[float, float]] = {
+    INTENT: (0.6, 0.35),
+    REFINEMENT_CHECK: (0.6, 0.35),
+    BUYING_GUIDE: (4.0, 0.4),
+    PRODUCT_SEARCH: (6.0, 0.5),
+    PRODUCT_EXTRACTION: (1.2, 0.35),
+    FINAL_RECOMMENDATION: (8.0, 0.45),
+    STRUCTURED_RECOMMENDATION: (8.5, 0.45),
+}
+
+_TEMPLATE_MARKERS = (
+    ("Kullanıcının mesajını analiz et", INTENT),
+    ("önceki aramayı daraltıyor mu", REFINEMENT_CHECK),
+    ("satın alma rehberi oluştur", BUYING_GUIDE),
+    ("güncel ürün önerilerini araştır", PRODUCT_SEARCH),
+    ("önerilen ürünlerin listesini çıkar", PRODUCT_EXTRACTION),
+    ("Kapsamlı bir ürün satın alma önerisi hazırla", FINAL_RECOMMENDATION),
+)
+
+_CATEGORY_PRODUCTS = {
+    "telefon": [("Samsung Galaxy A55", "bütçe dostu", "17.999 TL"), ("Google Pixel 8", "orta segment", "29.999 TL"), ("iPhone 15 Pro", "premium", "64.999 TL")],
+    "televizyon": [("TCL 55P755 4K", "bütçe dostu", "18.499 TL"), ("LG 55QNED80", "orta segment", "31.999 TL"), ("Samsung 55S90C OLED", "premium", "54.999 TL")],
+    "kulaklık": [("Soundcore Liberty 4 NC", "bütçe dostu", "2.899 TL"), ("Sony WF-1000XM5", "orta segment", "8.999 TL"), ("Apple AirPods Max", "premium", "21.999 TL")],
+}
+_DEFAULT_PRODUCTS = [("Xiaomi Temel Model", "bütçe dostu", "4.999 TL"), ("Philips Orta Seri", "orta segment", "9.499 TL"), ("Bosch Serie 8", "premium", "19.999 TL")]
+
+
+def classify_prompt(contents: str, config: Optional[Dict[str, Any]]) -> str:
+    if config and config.get("response_schema") is not None and "Kapsamlı bir ürün" in contents:
+        return STRUCTURED_RECOMMENDATION
+    for marker, template in _TEMPLATE_MARKERS:
+        if marker in contents:
+            return template
+    return FINAL_RECOMMENDATION
+
+
+def _category_from_prompt(contents: str) -> str:
+    for category in _CATEGORY_PRODUCTS:
+        if category in contents.lower():
+            return category
+    return "genel ürün"
+
+
+def _products(category: str):
+    return _CATEGORY_PRODUCTS.get(category, _DEFAULT_PRODUCTS)
+
+
+def _search_text(category: str) -> str:
+    paragraphs = []
+    for name, tier, price in _products(category):
+        paragraphs.append(
+            f"**{name}** ({tier}): Türkiye'de ortalama fiyatı {price} civarında. "
+            f"Kullanıcı puanı 4.{random.randint(2, 8)}/5. Teknik incelemelerde performansı, "
+            f"pil ömrü ve yapı kalitesi öne çıkıyor; bazı kullanıcılar fiyatın yüksek olduğunu belirtiyor."
+        )
+    paragraphs.append("Fiyatlar satıcıya ve kampanya dönemine göre değişebilir. Daha fazla bilgi için satıcı sitelerini ziyaret edin.")
+    return "\n\n".join(paragraphs)
+
+
+def _final_text(category: str) -> str:
+    products = _products(category)
+    lines = [f"# 🛍️ {category.title()} Satın Alma Rehberi", "", "## 📋 Dikkat Edilmesi Gerekenler",
+             "Bütçe, garanti ve kullanıcı yorumları önceliklendirilmeli.", "", "## 🏆 Önerilen Ürünler"]
+    for name, tier, price in products:
+        lines.append(f"- **{name}** ({tier}, ~{price}): dengeli özellikler, güçlü kullanıcı puanı.")
+    lines += ["", "## ⭐ En İyi Değer Seçimi", f"**{products[1][0]}** fiyat/performans dengesiyle öne çıkıyor.",
+              "", "## 💬 Kullanıcı Yorumları Özeti", "Kullanıcılar dayanıklılık ve satış sonrası desteği övüyor.",
+              "", "## 🎯 Final Tavsiye", f"Çoğu kullanıcı için {products[1][0]} doğru seçim olacaktır."]
+    return "\n".join(lines)
+
+
+def render_response_text(template: str, contents: str) -> str:
+    category = _category_from_prompt(contents)
+    if template == INTENT:
+        return json.dumps({"product_category": category, "user_intent": f"{category} satın almak istiyor"}, ensure_ascii=False)
+    if template == REFINEMENT_CHECK:
+        message = contents.split("yeni mesajı:", 1)[-1].split("\n", 1)[0]
+        new_category = _category_from_prompt(message)
+        narrows = any(cue in message.lower() for cue in ("daha", "olsun", "olanlar", "bütçe", "ucuz", "pahalı"))
+        is_refinement = new_category == category or (new_category == "genel ürün" and narrows)
+        return json.dumps({
+            "is_refinement": is_refinement,
+            "product_category": category if is_refinement else new_category,
+            "user_intent": message.strip().strip('"'),
+        }, ensure_ascii=False)
+    if template == BUYING_GUIDE:
+        return ("1. **Dikkat Edilmesi Gereken Ana Özellikler**\n- Performans\n- Enerji verimliliği\n- Garanti\n"
+                "2. **Yaygın Hatalar**\n- Sadece fiyata bakmak\n3. **Satın Alma İpuçları**\n- Kampanya dönemlerini takip edin")
+    if template == PRODUCT_SEARCH:
+        return _search_text(category)
+    if template == PRODUCT_EXTRACTION:
+        return "\n".join(name for name, _, _ in _products(category))
+    if template == STRUCTURED_RECOMMENDATION:
+        products = _products(category)
+        return json.dumps({
+            "recommendation": _final_text(category),
+            "products": [{"name": n, "budget_tier": t, "approximate_price": p} for n, t, p in products],
+            "best_value": products[1][0],
+        }, ensure_ascii=False)
+    return _final_text(category)
+
+
+def build_response(text: str, prompt: str, grounded: bool, include_usage: bool = True) -> types.GenerateContentResponse:
+    grounding = None
+    if grounded:
+        grounding = types.GroundingMetadata(grounding_chunks=[
+            types.GroundingChunk(web=types.GroundingChunkWeb(title=f"kaynak{i}.com.tr", uri=f"https://kaynak{i}.com.tr/inceleme"))
+            for i in range(1, 6)
+        ])
+    usage = None
+    if include_usage:
+        usage = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=max(1, len(prompt) // 4),
+            candidates_token_count=max(1, len(text) // 4),
+        )
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(
+            content=types.Content(role="model", parts=[types.Part(text=text)]),
+            grounding_metadata=grounding,
+        )],
+        usage_metadata=usage,
+    )
+
+
+class FakeGeminiBackend:
+    """Shared latency/error model and call accounting for the fake client"""
+
+    def __init__(
+        self,
+        latency_profile: Optional[Dict[str, Tuple[float, float]]] = None,
+        latency_scale: float = 1.0,
+        error_rate: float = 0.0,
+        tail_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.latency_profile = dict(DEFAULT_LATENCY_PROFILE, **(latency_profile or {}))
+        self.latency_scale = latency_scale
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.random = random.Random(seed)
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cancelled = 0
+
+    def sample_latency(self, template: str) -> float:
+        median, sigma = self.latency_profile.get(template, (1.0, 0.3))
+        latency = median * math.exp(self.random.gauss(0, sigma)) * self.latency_scale
+        if self.tail_rate and self.random.random() < self.tail_rate:
+            latency *= self.random.uniform(3, 5)
+        return latency
+
+    def maybe_fail(self, template: str) -> None:
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors[template] += 1
+            code = self.random.choice((429, 503))
+            raise errors.APIError(code, {"error": {"code": code, "message": "fake backend error", "status": "UNAVAILABLE"}})
+
+    def begin(self, template: str) -> None:
+        self.calls[template] += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def end(self) -> None:
+        self.in_flight -= 1
+
+    def cancel(self) -> None:
+        self.cancelled += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": dict(self.calls),
+            "errors": dict(self.errors),
+            "max_in_flight": self.max_in_flight,
+            "cancelled": self.cancelled,
+        }
+
+
+class _AsyncModels:
+    def __init__(self, backend: FakeGeminiBackend):
+        self.backend = backend
+
+    async def generate_content(self, *, model: str, contents: str, config: Optional[Dict[str, Any]] = None):
+        template = classify_prompt(contents, config)
+        self.backend.begin(template)
+        try:
+            await asyncio.sleep(self.backend.sample_latency(template))
+            self.backend.maybe_fail(template)
+            text = render_response_text(template, contents)
+            return build_response(text, contents, grounded=bool(config and config.get("tools")))
+        except asyncio.CancelledError:
+            self.backend.cancel()
+            raise
+        finally:
+            self.backend.end()
+
+    async def generate_content_stream(self, *, model: str, contents: str, config: Optional[Dict[str, Any]] = None) -> AsyncIterator[types.GenerateContentResponse]:
+        template = classify_prompt(contents, config)
+        backend = self.backend
+
+        async def stream():
+            backend.begin(template)
+            try:
+                total = backend.sample_latency(template)
+                await asyncio.sleep(total * 0.15)
+                backend.maybe_fail(template)
+                text = render_response_text(template, contents)
+                pieces = [text[i:i + 40] for i in range(0, len(text), 40)] or [""]
+                for index, piece in enumerate(pieces):
+                    await asyncio.sleep(total * 0.85 / len(pieces))
+                    yield build_response(piece, contents, grounded=False, include_usage=index == len(pieces) - 1)
+            finally:
+                backend.end()
+
+        return stream()
+
+
+class _SyncModels:
+    def __init__(self, backend: FakeGeminiBackend):
+        self.backend = backend
+
+    def generate_content(self, *, model: str, contents: str, config: Optional[Dict[str, Any]] = None):
+        template = classify_prompt(contents, config)
+        self.backend.begin(template)
+        try:
+            time.sleep(self.backend.sample_latency(template))
+            self.backend.maybe_fail(template)
+            text = render_response_text(template, contents)
+            return build_response(text, contents, grounded=bool(config and config.get("tools")))
+        finally:
+            self.backend.end()
+
+
+class _Aio:
+    def __init__(self, backend: FakeGeminiBackend):
+        self.models = _AsyncModels(backend)
+
+
+class FakeGeminiClient:
+    """Drop-in replacement for `google.genai.Client` with `models` and `aio.models`"""
+
+    def __init__(self, backend: Optional[FakeGeminiBackend] = None, **backend_kwargs):
+        self.backend = backend or FakeGeminiBackend(**backend_kwargs)
+        self.models = _SyncModels(self.backend)
+        self.aio = _Aio(self.backend)
@@ -0,0 +1,303 @@
+"""
+Offline benchmark for the recommendation pipeline
+
+Drives `SmartProductAgent` directly (agent mode) or the FastAPI `/recommend`
+route over an in-process ASGI transport (api mode) against the fake Gemini
+client, then reports throughput, latency percentiles and per-node/per-call
+breakdowns. Results are written as JSON so runs can be compared across
+commits.
+
+Usage (from backend/):
+    python -m bench.run --mode agent --requests 200 --concurrency 20
+    python -m bench.run --mode api --latency-scale 0.05 --compare bench/results/baseline.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bench.fake_gemini import FakeGeminiBackend, FakeGeminiClient
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+QUERIES = [
+    "Uygun fiyatlı bir telefon arıyorum",
+    "Oyun için iyi bir telefon önerir misin",
+    "Salon için 55 inç televizyon almak istiyorum",
+    "Bütçe dostu bir televizyon",
+    "Spor yaparken kullanacağım kablosuz kulaklık",
+    "Gürültü engellemeli premium kulaklık",
+    "Öğrenci için laptop lazım",
+    "Küçük mutfak için bulaşık makinesi",
+    "Robot süpürge önerisi",
+    "Kahve makinesi almak istiyorum",
+    "Yazılım geliştirme için monitör",
+    "Kamp için powerbank",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 4) if values else 0.0,
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(max(values), 4) if values else 0.0,
+    }
+
+
+def build_workload(requests: int, distinct: int, seed: int) -> List[str]:
+    """Zipf-skewed query mix so caches and coalescing see realistic repetition"""
+    rng = random.Random(seed)
+    pool = [QUERIES[i % len(QUERIES)] + ("" if i < len(QUERIES) else f" #{i}") for i in range(distinct)]
+    weights = [1.0 / (rank + 1) for rank in range(len(pool))]
+    return rng.choices(pool, weights=weights, k=requests)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def configure(args: argparse.Namespace, workdir: str) -> None:
+    from config import config
+
+    config.GUIDE_STORE_PATH = os.path.join(workdir, "guide_store.json")
+    config.CATALOG_PATH = os.path.join(workdir, "catalog.json")
+    config.LLM_STORE_PATH = args.llm_store_path or os.path.join(workdir, "llm_responses.sqlite3")
+    config.LLM_STORE_MODE = args.llm_store_mode
+    config.QUERY_LOG_PATH = os.path.join(workdir, "query_log.jsonl")
+    config.PREWARM_ENABLED = False
+    if args.no_cache:
+        config.LLM_STORE_MODE = "off"
+        config.RESULT_CACHE_ENABLED = False
+        config.GUIDE_STORE_TTL_SECONDS = 0
+        config.SEARCH_CACHE_FRESH_SECONDS = 0
+        config.SEARCH_CACHE_STALE_SECONDS = 0
+    if args.rpm:
+        config.GEMINI_MODEL_RPM = {model: args.rpm for model in config.GEMINI_MODEL_RPM}
+        config.GEMINI_DEFAULT_RPM = args.rpm
+    if args.structured:
+        config.STRUCTURED_OUTPUT = True
+    if args.no_local_intent:
+        config.LOCAL_INTENT_CLASSIFIER = False
+    if args.hedging:
+        config.HEDGING_ENABLED = True
+
+
+async def _run_workload(workload: List[str], concurrency: int, call) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(query: str) -> Dict[str, Any]:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                timings, degraded = await call(query)
+                return {"ok": True, "latency": time.perf_counter() - start, "timings": timings, "degraded": degraded}
+            except Exception as e:
+                return {"ok": False, "latency": time.perf_counter() - start, "error": f"{type(e).__name__}: {e}"}
+
+    return await asyncio.gather(*(one(query) for query in workload))
+
+
+async def run_agent_mode(agent, workload: List[str], concurrency: int, deadline: Optional[float]) -> List[Dict[str, Any]]:
+    from metrics import request_timings, summarize_timings
+
+    async def call(query: str):
+        with request_timings() as timings:
+            result = await agent.aget_recommendation(query, deadline)
+        return summarize_timings(timings), result["degraded_sections"]
+
+    return await _run_workload(workload, concurrency, call)
+
+
+async def run_api_mode(agent, workload: List[str], concurrency: int, deadline: Optional[float]) -> List[Dict[str, Any]]:
+    import httpx
+    from api import create_app
+
+    app = create_app(agent)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def call(query: str):
+                payload = {"user_input": query, "include_timings": True, "deadline_seconds": deadline}
+                response = await client.post("/recommend", json=payload)
+                response.raise_for_status()
+                body = response.json()
+                return body.get("timings") or {}, body["degraded_sections"]
+
+            return await _run_workload(workload, concurrency, call)
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    ok = [r for r in results if r["ok"]]
+    breakdown: Dict[str, List[float]] = {}
+    for result in ok:
+        for name, seconds in result["timings"].items():
+            breakdown.setdefault(name, []).append(seconds)
+
+    degraded: Dict[str, int] = {}
+    for result in ok:
+        for section in result["degraded"]:
+            degraded[section] = degraded.get(section, 0) + 1
+
+    errors: Dict[str, int] = {}
+    for result in results:
+        if not result["ok"]:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+
+    return {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "degraded": sum(1 for r in ok if r["degraded"]),
+        "degraded_sections": degraded,
+        "elapsed_seconds": round(elapsed, 4),
+        "throughput_rps": round(len(ok) / elapsed, 4) if elapsed else 0.0,
+        "latency": latency_summary([r["latency"] for r in ok]),
+        "breakdown": {name: latency_summary(values) for name, values in sorted(breakdown.items())},
+        "errors": errors,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    lines = [f"Karşılaştırma: {baseline.get('revision', '?')} -> {current['revision']}"]
+
+    def delta(label: str, new: float, old: float) -> str:
+        change = ((new - old) / old * 100.0) if old else 0.0
+        return f"  {label:<40} {old:>10.4f} -> {new:>10.4f} ({change:+.1f}%)"
+
+    lines.append(delta("throughput_rps", current["summary"]["throughput_rps"], baseline["summary"]["throughput_rps"]))
+    for key in ("p50", "p95", "p99"):
+        lines.append(delta(f"latency.{key}", current["summary"]["latency"][key], baseline["summary"]["latency"][key]))
+    for name, stats in current["summary"]["breakdown"].items():
+        old = baseline["summary"]["breakdown"].get(name)
+        if old:
+            lines.append(delta(f"{name}.p50", stats["p50"], old["p50"]))
+    return lines
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    summary = report["summary"]
+    latency = summary["latency"]
+    print(f"\n📊 {report['mode']} modu | {summary['requests']} istek | eşzamanlılık {report['params']['concurrency']}")
+    print(f"  başarılı: {summary['succeeded']}  kısmi: {summary['degraded']}  hatalı: {summary['failed']}  süre: {summary['elapsed_seconds']}s")
+    if summary["degraded_sections"]:
+        print(f"  kısmi bölümler: {summary['degraded_sections']}")
+    print(f"  throughput: {summary['throughput_rps']} istek/s")
+    print(f"  gecikme  p50={latency['p50']}s  p95={latency['p95']}s  p99={latency['p99']}s  max={latency['max']}s")
+    if summary["breakdown"]:
+        print("  adım bazında (istek başına toplam süre):")
+        for name, stats in summary["breakdown"].items():
+            print(f"    {name:<36} n={stats['count']:<5} p50={stats['p50']:<8} p95={stats['p95']:<8} p99={stats['p99']}")
+    print(f"  sahte Gemini çağrıları: {report['fake_backend']['calls']}")
+    if report["fake_backend"]["errors"]:
+        print(f"  enjekte edilen hatalar: {report['fake_backend']['errors']}")
+    for error, count in summary["errors"].items():
+        print(f"  ❌ {count}x {error}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline benchmark with a fake Gemini backend")
+    parser.add_argument("--mode", choices=("agent", "api"), default="agent")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--distinct-queries", type=int, default=len(QUERIES))
+    parser.add_argument("--latency-scale", type=float, default=0.05, help="Multiplier on the fake latency profile")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake calls failing with 429/503")
+    parser.add_argument("--deadline", type=float, help="Per-request deadline in seconds (default: REQUEST_DEADLINE_SECONDS)")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Share of fake calls that take 3-5x their sampled latency")
+    parser.add_argument("--hedging", action="store_true", help="Enable HEDGING_ENABLED")
+    parser.add_argument("--rpm", type=int, default=0, help="Override per-model RPM limits")
+    parser.add_argument("--no-cache", action="store_true", help="Disable result, guide and search caches")
+    parser.add_argument("--llm-store-mode", choices=("cache", "record", "replay", "off"), default="cache")
+    parser.add_argument("--llm-store-path", help="Response store to record into / replay from (default: temporary)")
+    parser.add_argument("--structured", action="store_true", help="Enable STRUCTURED_OUTPUT mode")
+    parser.add_argument("--no-local-intent", action="store_true", help="Always use the LLM for intent analysis")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Result JSON path (default: bench/results/<timestamp>_<rev>.json)")
+    parser.add_argument("--compare", help="Baseline result JSON to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Keep the agent's console output")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    workload = build_workload(args.requests, args.distinct_queries, args.seed)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure(args, workdir)
+        from agent import SmartProductAgent
+
+        backend = FakeGeminiBackend(
+            latency_scale=args.latency_scale,
+            error_rate=args.error_rate,
+            tail_rate=args.tail_rate,
+            seed=args.seed
+        )
+        agent = SmartProductAgent(client=FakeGeminiClient(backend))
+        runner = run_api_mode if args.mode == "api" else run_agent_mode
+
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        start = time.perf_counter()
+        with output:
+            results = asyncio.run(runner(agent, workload, args.concurrency, args.deadline))
+        elapsed = time.perf_counter() - start
+
+    revision = git_revision()
+    report = {
+        "revision": revision,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "mode": args.mode,
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "verbose")},
+        "summary": summarize(results, elapsed),
+        "fake_backend": backend.stats(),
+        "scheduler": agent.scheduler.stats(),
+        "model_routing": agent.router.stats(),
+        "hedging": {"/".join(key): stats for key, stats in agent.hedger.stats().items()},
+    }
+    print_report(report)
+
+    path = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}_{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 Sonuçlar kaydedildi: {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\n".join(compare(report, baseline)))
+
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
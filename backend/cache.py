@@ -0,0 +1,493 @@
+"""
+Caches used by the recommendation pipeline
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory footprint of a JSON-like value in bytes"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return len(repr(value).encode("utf-8"))
+
+
+class TTLCache:
+    """
+    LRU cache bounded by entry count and an approximate byte budget.
+    Entries expire after `ttl_seconds`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        sizer: Callable[[Any], int] = estimate_size
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizer = sizer
+
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] > time.time()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at, _ = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        size = self.sizer(value)
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (value, time.time() + ttl, size)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class PersistentTTLCache(TTLCache):
+    """
+    TTLCache that mirrors its entries to a JSON file so they survive restarts.
+    Keys must be strings. Persistence is skipped when `path` is None.
+
+    Inserts only mark the cache dirty; once started, a background task
+    writes a snapshot every `snapshot_seconds` (and on stop) in a worker
+    thread, so the event loop never blocks on the file.
+    """
+
+    def __init__(self, *args, path: Optional[str] = None, snapshot_seconds: float = 60.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.path = path
+        self.snapshot_seconds = snapshot_seconds
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+        if self.path:
+            self.load()
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Önbellek dosyası okunamadı ({self.path}): {e}")
+            return
+
+        now = time.time()
+        for key, value, expires_at in data.get("entries", []):
+            if expires_at > now:
+                self.set(key, value, ttl_seconds=expires_at - now, persist=False)
+
+    def _records(self) -> list:
+        return [[key, value, expires_at] for key, (value, expires_at, _) in self._entries.items()]
+
+    def _write(self, entries: list) -> bool:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            return True
+        except OSError as e:
+            print(f"⚠️ Önbellek dosyası yazılamadı ({self.path}): {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    def save(self) -> None:
+        """Write a snapshot synchronously (scripts and tests; the server uses `flush`)"""
+        if not self.path:
+            return
+        self._dirty = False
+        if not self._write(self._records()):
+            self._dirty = True
+
+    async def flush(self) -> None:
+        """Write a snapshot in a worker thread if anything changed since the last one"""
+        if not self.path or not self._dirty:
+            return
+        entries = self._records()
+        self._dirty = False
+        if not await asyncio.to_thread(self._write, entries):
+            self._dirty = True
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None, persist: bool = True) -> None:
+        super().set(key, value, ttl_seconds)
+        if persist and self.path:
+            self._dirty = True
+
+    async def start(self) -> None:
+        if self.path and self._task is None:
+            self._task = asyncio.create_task(self._snapshot_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _snapshot_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_seconds)
+            await self.flush()
+
+
+class StaleWhileRevalidateCache:
+    """
+    Async cache that serves fresh entries directly, serves stale entries
+    immediately while refreshing them in the background, and only blocks
+    callers on a cold miss.
+
+    An entry is fresh for `fresh_seconds` and may be served stale for another
+    `stale_seconds` after that. Loader exceptions are never cached.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, fresh_seconds: float, stale_seconds: float):
+        self.fresh_seconds = fresh_seconds
+        self._store = TTLCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            ttl_seconds=fresh_seconds + stale_seconds,
+            sizer=lambda entry: estimate_size(entry[0])
+        )
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        refresh_loader: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Any:
+        """Return the cached value; `refresh_loader` (default `loader`) is used for background refreshes"""
+        entry = self._store.get(key)
+        if entry is None:
+            self.misses += 1
+            value = await loader()
+            self._put(key, value)
+            return value
+
+        value, fresh_until = entry
+        if fresh_until > time.time():
+            self.fresh_hits += 1
+        else:
+            self.stale_hits += 1
+            self._schedule_refresh(key, refresh_loader or loader)
+        return value
+
+    def _put(self, key: Hashable, value: Any) -> None:
+        self._store.set(key, (value, time.time() + self.fresh_seconds))
+
+    def _schedule_refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._refreshing:
+            return
+
+        task = asyncio.create_task(self._refresh(key, loader))
+        self._refreshing[key] = task
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> None:
+        self.refreshes += 1
+        try:
+            self._put(key, await loader())
+        except Exception as e:
+            self.refresh_failures += 1
+            print(f"⚠️ Arka plan yenilemesi başarısız ({key}): {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        store_stats = self._store.stats()
+        return {
+            "entries": store_stats["entries"],
+            "bytes": store_stats["bytes"],
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "refreshing": len(self._refreshing),
+            "evictions": store_stats["evictions"],
+        }
+
+
+class ReplayMiss(LookupError):
+    """Raised in replay mode when a call has no recorded response"""
+
+
+class ResponseStore:
+    """
+    Content-addressed store for model responses in a SQLite database (WAL
+    mode), so several worker processes can share it concurrently.
+
+    Entries expire after a per-template TTL and the least recently used ones
+    are evicted once the store exceeds `max_bytes`. Entry and byte counts are
+    kept as running totals, resynced from the table at each eviction pass, so
+    `stats()` never touches the database (other workers' writes show up at
+    the next resync). Modes:
+      - cache:  read fresh entries, write new responses
+      - record: always call the model and overwrite entries
+      - replay: only read (ignoring expiry); misses raise ReplayMiss
+      - off:    disabled
+    """
+
+    MODES = ("cache", "record", "replay", "off")
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int,
+        ttl_seconds: Dict[str, float],
+        default_ttl_seconds: float,
+        mode: str = "cache",
+        evict_every: int = 20
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Geçersiz yanıt deposu modu: {mode}")
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = dict(ttl_seconds)
+        self.default_ttl_seconds = default_ttl_seconds
+        self.mode = mode
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._writes_since_evict = 0
+        self._size_lock = threading.Lock()
+        self._entries = 0
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+
+        if self.enabled:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    " key TEXT PRIMARY KEY, call_name TEXT NOT NULL, model TEXT NOT NULL,"
+                    " payload TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL,"
+                    " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+                self._recount(conn)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def readable(self) -> bool:
+        return self.mode in ("cache", "replay")
+
+    @property
+    def writable(self) -> bool:
+        return self.mode in ("cache", "record")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _recount(self, conn: sqlite3.Connection) -> int:
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        with self._size_lock:
+            self._entries, self._bytes = entries, size
+        return size
+
+    def _resize(self, entries: int, size: int) -> None:
+        with self._size_lock:
+            self._entries += entries
+            self._bytes += size
+
+    def _get(self, key: str) -> Optional[Any]:
+        conn = self._connection()
+        row = conn.execute("SELECT payload, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        payload, expires_at = row
+        if self.mode != "replay" and expires_at <= time.time():
+            return None
+        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(payload)
+
+    def _put(self, key: str, call_name: str, model: str, value: Any) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        ttl = self.ttl_seconds.get(call_name, self.default_ttl_seconds)
+        conn = self._connection()
+        previous = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses"
+            " (key, call_name, model, payload, size, created_at, expires_at, last_access)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, call_name, model, payload, size, now, now + ttl, now)
+        )
+        if previous is None:
+            self._resize(1, size)
+        else:
+            self._resize(0, size - previous[0])
+
+        self._writes_since_evict += 1
+        if self._writes_since_evict >= self.evict_every:
+            self._writes_since_evict = 0
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        if self.mode != "record":
+            self.evictions += conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),)).rowcount
+
+        total = self._recount(conn)
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        while total > target:
+            rows = conn.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT 100").fetchall()
+            if not rows:
+                break
+            conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key, _ in rows])
+            self.evictions += len(rows)
+            freed = sum(size for _, size in rows)
+            self._resize(-len(rows), -freed)
+            total -= freed
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Stored value for `key`; raises ReplayMiss in replay mode"""
+        if not self.readable:
+            return None
+        try:
+            value = await asyncio.to_thread(self._get, key)
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"⚠️ Yanıt deposu okunamadı: {e}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+            if self.mode == "replay":
+                raise ReplayMiss(f"Kayıtlı yanıt yok: {key}")
+            return None
+
+        self.hits += 1
+        return value
+
+    async def put(self, key: str, call_name: str, model: str, value: Any) -> None:
+        if not self.writable:
+            return
+        try:
+            await asyncio.to_thread(self._put, key, call_name, model, value)
+            self.writes += 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"⚠️ Yanıt deposuna yazılamadı: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        result = {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "max_bytes": self.max_bytes,
+        }
+        if self.enabled:
+            result.update({"entries": self._entries, "bytes": self._bytes})
+        return result
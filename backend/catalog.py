@@ -0,0 +1,441 @@
+"""
+In-memory product catalog: canonical product names built from every
+extraction, with fuzzy lookup to merge naming variants ("iPhone 15 Pro
+256GB" / "Apple iPhone 15 Pro 256 GB Siyah"), per-product metadata, and
+periodic JSON snapshots on disk
+"""
+
+import asyncio
+import heapq
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from array import array
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from utils import TextProcessor
+
+NOISE_TOKENS = frozenset({
+    "siyah", "beyaz", "gri", "gümüş", "mavi", "kırmızı", "yeşil", "pembe", "mor", "altın", "lacivert",
+    "black", "white", "gray", "grey", "silver", "blue", "red", "green", "pink", "purple", "gold",
+    "midnight", "starlight", "titanium", "renk", "rengi", "yeni", "new", "orijinal", "ithalatçı", "garantili",
+})
+VARIANT_TOKENS = frozenset({
+    "pro", "max", "plus", "ultra", "mini", "lite", "air", "fe", "se", "neo", "prime", "note", "edge", "fold", "flip",
+})
+BRAND_PARENTS = {
+    "soundcore": "anker", "redmi": "xiaomi", "poco": "xiaomi", "beats": "apple", "rog": "asus", "legion": "lenovo",
+    "omen": "hp", "alienware": "dell",
+}
+BRAND_TOKENS = frozenset({
+    "apple", "samsung", "xiaomi", "sony", "lg", "philips", "bosch", "siemens", "lenovo", "asus", "acer", "hp", "dell",
+    "msi", "huawei", "oppo", "realme", "honor", "google", "arçelik", "beko", "vestel", "dyson", "tefal", "arzum",
+    "karcher", "jbl", "anker", "logitech", "tcl", "casper", "monster", "fakir", "braun", "nintendo",
+}).union(BRAND_PARENTS)
+DESCRIPTOR_TOKENS = frozenset({
+    "kablosuz", "bluetooth", "kulaklık", "kulak", "içi", "üstü", "akıllı", "telefon", "cep", "saat", "televizyon",
+    "tv", "led", "laptop", "dizüstü", "bilgisayar", "tablet", "oyuncu", "gaming", "robot", "süpürge", "makinesi",
+    "wireless", "smart", "true",
+})
+_CAPACITY = re.compile(r"\b(\d+)\s?(gb|tb|mb)\b")
+_PLUS = re.compile(r"(?<=\w)\+")
+_HYPHENATED = re.compile(r"(?<=\w)[-_/](?=\w)")
+
+
+def _tokens(name: str) -> List[str]:
+    folded = _PLUS.sub(" plus", TextProcessor.turkish_casefold(name))
+    folded = _HYPHENATED.sub("", _CAPACITY.sub(r" \1\2 ", folded))
+    return [token for token in re.findall(r"\w+", folded) if token not in NOISE_TOKENS]
+
+
+def product_key(name: str) -> str:
+    """Normalized catalog key: casefolded tokens without colors and filler words ("256 GB" -> "256gb", "S8+" -> "s8 plus")"""
+    return " ".join(_tokens(name))
+
+
+def _signature(tokens: Iterable[str]) -> str:
+    """Model numbers, capacities and variant words; names that differ here are different products"""
+    return " ".join(sorted({t for t in tokens if t in VARIANT_TOKENS or any(c.isdigit() for c in t)}))
+
+
+def _brands(tokens: Iterable[str]) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """Brands named in the tokens with sub-brands resolved to their parent ("soundcore" -> "anker"), and the sub-brands"""
+    named = BRAND_TOKENS.intersection(tokens)
+    return frozenset(BRAND_PARENTS.get(t, t) for t in named), frozenset(named.intersection(BRAND_PARENTS))
+
+
+def _core(tokens: Iterable[str]) -> List[str]:
+    """Tokens that identify the product; brands and descriptor words may be missing from a variant"""
+    return [t for t in tokens if t not in BRAND_TOKENS and t not in DESCRIPTOR_TOKENS]
+
+
+def _dice(left: Set[str], right: Set[str]) -> float:
+    if not left or not right:
+        return 0.0
+    return 2 * len(left & right) / (len(left) + len(right))
+
+
+def _one_edit_apart(left: str, right: str) -> bool:
+    if abs(len(left) - len(right)) > 1:
+        return False
+    if len(left) > len(right):
+        left, right = right, left
+    for i, (a, b) in enumerate(zip(left, right)):
+        if a != b:
+            return left[i + 1:] == right[i + 1:] or left[i:] == right[i + 1:]
+    return True
+
+
+def _trigrams(key: str) -> Set[str]:
+    grams = set()
+    for token in key.split():
+        padded = f"${token}$"
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class CatalogProduct:
+    """A canonical product and everything learned about it"""
+
+    __slots__ = ("name", "key", "signature", "core", "brands", "sub_brands", "category", "aliases", "details", "seen", "last_seen")
+
+    def __init__(self, name: str, key: str, category: str = ""):
+        self.name = name
+        self.key = key
+        self.signature = _signature(key.split())
+        self.core = _core(key.split())
+        self.brands, self.sub_brands = _brands(key.split())
+        self.category = category
+        self.aliases: Dict[str, int] = {name: 0}
+        self.details: Dict[str, Any] = {}
+        self.seen = 0
+        self.last_seen = 0.0
+
+    def to_record(self) -> List[Any]:
+        return [self.name, self.category, dict(self.aliases), dict(self.details), self.seen, self.last_seen]
+
+
+class ProductCatalog:
+    """
+    Canonical product names indexed by exact key, by model signature and by
+    token posting lists. A name resolves to an existing product when the
+    signature (model numbers, capacities and variant words, "+" counting as
+    "plus") is identical, the remaining tokens differ only in brand and
+    descriptor words or by one edit in a token of five or more characters,
+    and no conflicting brand or sub-brand is named (sub-brands count as
+    their parent brand); among those the closest by trigram Dice
+    similarity (at least `min_similarity`) wins. Only products sharing the signature are
+    scored; when the name has no signature or its signature bucket is
+    large, the candidates are the most recent `MAX_CANDIDATES` products of
+    its two rarest tokens instead, so lookups stay in the microsecond range
+    with hundreds of thousands of products.
+
+    The canonical name is the most frequent alias and only changes when
+    another alias overtakes it. The catalog is snapshotted to `path` every
+    `snapshot_seconds` when it has changed; above `max_products` the least
+    recently seen product is evicted, found through a heap on `last_seen`
+    and removed from the indexes in place.
+    """
+
+    MAX_ALIASES = 8
+    MAX_CANDIDATES = 32
+    SNAPSHOT_VERSION = 1
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_products: int = 200000,
+        min_similarity: float = 0.8,
+        snapshot_seconds: float = 300.0
+    ):
+        self.path = path
+        self.max_products = max_products
+        self.min_similarity = min_similarity
+        self.snapshot_seconds = snapshot_seconds
+
+        self._products: List[Optional[CatalogProduct]] = []
+        self._free: List[int] = []
+        self._by_last_seen: List[Tuple[float, int]] = []
+        self._count = 0
+        self._by_key: Dict[str, int] = {}
+        self._by_signature: Dict[str, array] = {}
+        self._postings: Dict[str, array] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.path:
+            self.load()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _add(self, product: CatalogProduct) -> int:
+        if self._free:
+            product_id = self._free.pop()
+            self._products[product_id] = product
+        else:
+            product_id = len(self._products)
+            self._products.append(product)
+        self._count += 1
+
+        self._by_key[product.key] = product_id
+        if product.signature:
+            self._by_signature.setdefault(product.signature, array("I")).append(product_id)
+        for token in set(product.key.split()):
+            self._postings.setdefault(token, array("I")).append(product_id)
+        heapq.heappush(self._by_last_seen, (product.last_seen, product_id))
+        return product_id
+
+    def _remove(self, product_id: int) -> None:
+        product = self._products[product_id]
+        self._products[product_id] = None
+        self._free.append(product_id)
+        self._count -= 1
+
+        del self._by_key[product.key]
+        indexes = [(self._by_signature, product.signature)] if product.signature else []
+        indexes.extend((self._postings, token) for token in set(product.key.split()))
+        for index, name in indexes:
+            ids = index[name]
+            ids.remove(product_id)
+            if not ids:
+                del index[name]
+
+    def _candidates(self, signature: str, tokens: List[str]) -> Iterable[int]:
+        bucket = self._by_signature.get(signature, ()) if signature else None
+        if bucket is not None and len(bucket) <= 4 * self.MAX_CANDIDATES:
+            return bucket
+
+        postings = sorted((self._postings[token] for token in set(tokens) if token in self._postings), key=len)
+        candidates: Set[int] = set()
+        for posting in postings[:2]:
+            candidates.update(posting[-self.MAX_CANDIDATES:])
+        return candidates
+
+    def _same_product(
+        self,
+        brands: FrozenSet[str],
+        sub_brands: FrozenSet[str],
+        core: List[str],
+        product: CatalogProduct
+    ) -> bool:
+        """Whether two names with equal signatures differ only in brand, descriptors or spelling"""
+        if not core or len(core) != len(product.core):
+            return False
+
+        if brands and product.brands and brands != product.brands:
+            return False
+        if sub_brands and product.sub_brands and sub_brands != product.sub_brands:
+            return False
+
+        missing = sorted(t for t in core if t not in product.core)
+        extra = sorted(t for t in product.core if t not in core)
+        return len(missing) == len(extra) and all(
+            min(len(a), len(b)) >= 5 and _one_edit_apart(a, b) for a, b in zip(missing, extra)
+        )
+
+    def _find(self, key: str) -> Optional[int]:
+        product_id = self._by_key.get(key)
+        if product_id is not None:
+            self.exact_hits += 1
+            return product_id
+
+        tokens = key.split()
+        if len(tokens) < 2:
+            return None
+
+        core = _core(tokens)
+        brands, sub_brands = _brands(tokens)
+        grams = _trigrams(" ".join(core))
+        signature = _signature(tokens)
+        best_id, best_score = None, self.min_similarity
+        for candidate_id in self._candidates(signature, tokens):
+            product = self._products[candidate_id]
+            if product.signature != signature or not self._same_product(brands, sub_brands, core, product):
+                continue
+            score = _dice(grams, _trigrams(" ".join(product.core)))
+            if score >= best_score:
+                best_id, best_score = candidate_id, score
+
+        if best_id is not None:
+            self.fuzzy_hits += 1
+        return best_id
+
+    def lookup(self, name: str) -> Optional[CatalogProduct]:
+        """Canonical product for `name`, or None; does not add anything"""
+        key = product_key(name)
+        if not key:
+            return None
+        with self._lock:
+            product_id = self._find(key)
+            return self._products[product_id] if product_id is not None else None
+
+    def resolve(self, name: str, category: str = "", details: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Record one extracted product name
+
+        Args:
+            name: Product name as extracted by the model
+            category: Product category of the request
+            details: Optional metadata (e.g. budget_tier, approximate_price)
+
+        Returns:
+            Canonical name of the matching or newly added product, or None for an empty name
+        """
+        product = self._resolve(name, category, details)
+        return product.name if product is not None else None
+
+    def _resolve(self, name: str, category: str, details: Optional[Dict[str, Any]]) -> Optional[CatalogProduct]:
+        key = product_key(name)
+        if not key:
+            return None
+
+        with self._lock:
+            now = time.time()
+            product_id = self._find(key)
+            if product_id is None:
+                self.misses += 1
+                product = CatalogProduct(name, key, category)
+                product.last_seen = now
+                product_id = self._add(product)
+
+            product = self._products[product_id]
+            product.seen += 1
+            product.last_seen = now
+            if category and not product.category:
+                product.category = category
+            if details:
+                product.details.update({k: v for k, v in details.items() if v and k != "name"})
+
+            if name in product.aliases or len(product.aliases) < self.MAX_ALIASES:
+                product.aliases[name] = product.aliases.get(name, 0) + 1
+                if product.aliases[name] > product.aliases.get(product.name, 0):
+                    product.name = name
+            self._dirty = True
+
+            while self._count > self.max_products:
+                self._evict_oldest()
+
+        return product
+
+    def canonicalize(
+        self,
+        names: Iterable[str],
+        category: str = "",
+        details: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> List[str]:
+        """
+        Resolve a product list to canonical names, dropping variants of the same product
+
+        Args:
+            names: Extracted product names, in ranking order
+            category: Product category of the request
+            details: Optional metadata keyed by extracted name
+
+        Returns:
+            Canonical names in first-seen order, without duplicates
+        """
+        products: List[CatalogProduct] = []
+        for name in names:
+            product = self._resolve(name, category, (details or {}).get(name))
+            if product is not None and product not in products:
+                products.append(product)
+        return [product.name for product in products]
+
+    def _evict_oldest(self) -> None:
+        while self._by_last_seen:
+            last_seen, product_id = heapq.heappop(self._by_last_seen)
+            product = self._products[product_id]
+            if product.last_seen != last_seen:
+                heapq.heappush(self._by_last_seen, (product.last_seen, product_id))
+                continue
+            self._remove(product_id)
+            self.evictions += 1
+            return
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Ürün kataloğu okunamadı ({self.path}): {e}")
+            return
+
+        if data.get("version") != self.SNAPSHOT_VERSION:
+            print(f"⚠️ Ürün kataloğu sürümü uyumsuz, yeniden oluşturulacak ({self.path})")
+            return
+
+        for name, category, aliases, details, seen, last_seen in data.get("products", []):
+            key = product_key(name)
+            if not key or key in self._by_key:
+                continue
+            product = CatalogProduct(name, key, category)
+            product.aliases = aliases
+            product.details = details
+            product.seen = seen
+            product.last_seen = last_seen
+            self._add(product)
+
+    def save(self) -> None:
+        """Write a snapshot if anything changed since the last one"""
+        if not self.path:
+            return
+
+        with self._lock:
+            if not self._dirty:
+                return
+            records = [product.to_record() for product in self._products if product is not None]
+            self._dirty = False
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": self.SNAPSHOT_VERSION, "products": records}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️ Ürün kataloğu yazılamadı ({self.path}): {e}")
+            self._dirty = True
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def start(self) -> None:
+        if self.path and self._task is None:
+            self._task = asyncio.create_task(self._snapshot_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.save)
+
+    async def _snapshot_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_seconds)
+            await asyncio.to_thread(self.save)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "products": self._count,
+            "signatures": len(self._by_signature),
+            "tokens": len(self._postings),
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "path": self.path,
+        }
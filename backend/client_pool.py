@@ -0,0 +1,243 @@
+"""
+Pool of Gemini clients, one per API key, each with its own sized HTTP
+connection pool. Every call goes to the key with the most estimated quota
+headroom and the lowest recent error rate; keys answering 429 are taken out
+of rotation for a cooldown
+"""
+
+import re
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from scheduler import TokenBucket, is_retryable_error
+
+T = TypeVar("T")
+
+DISABLING_STATUS_CODES = frozenset({401, 403})
+_RETRY_DELAY = re.compile(r"^(\d+(?:\.\d+)?)s$")
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def retry_delay(exc: BaseException) -> Optional[float]:
+    """Server-suggested wait from a 429's RetryInfo detail (e.g. "retryDelay": "23s"), if any"""
+    details = getattr(exc, "details", None)
+    if not isinstance(details, dict):
+        return None
+    error = details.get("error", details)
+    for detail in error.get("details", []) if isinstance(error, dict) else []:
+        match = _RETRY_DELAY.match(str(detail.get("retryDelay", ""))) if isinstance(detail, dict) else None
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class KeySlot:
+    """One API key: its client, per-model quota estimate and health"""
+
+    def __init__(self, label: str, client: Any, model_rpm: Dict[str, int], default_rpm: int, burst_seconds: float):
+        self.label = label
+        self.client = client
+        self.model_rpm = model_rpm
+        self.default_rpm = default_rpm
+        self.burst_seconds = burst_seconds
+        self.buckets: Dict[str, TokenBucket] = {}
+
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.error_rate = 0.0
+        self.strikes = 0
+        self.cooldown_until = 0.0
+
+    def bucket(self, model: str) -> TokenBucket:
+        bucket = self.buckets.get(model)
+        if bucket is None:
+            rpm = self.model_rpm.get(model, self.default_rpm)
+            bucket = self.buckets[model] = TokenBucket(rpm, rpm / 60.0 * self.burst_seconds)
+        return bucket
+
+    def headroom(self, model: str) -> float:
+        bucket = self.bucket(model)
+        return bucket.available() / bucket.capacity
+
+    def cooling_down(self, now: float) -> bool:
+        return self.cooldown_until > now
+
+
+class GeminiClientPool:
+    """
+    Balances Gemini calls over several API keys.
+
+    Each key has a token bucket per model refilled at the per-key quota
+    (`model_rpm`), so its remaining quota is estimated from the calls it has
+    actually been given; the key with the highest
+    `headroom * (1 - error_rate) / (1 + in_flight)` wins, ties rotate. A 429
+    puts the key in cooldown for the server's `retryDelay`, or for
+    `cooldown_seconds` doubling on consecutive 429s up to
+    `max_cooldown_seconds`; 401/403 disable it for `max_cooldown_seconds`.
+    If every key is cooling down, the one that recovers first is used.
+    """
+
+    def __init__(
+        self,
+        clients: Sequence[Tuple[str, Any]],
+        model_rpm: Dict[str, int],
+        default_rpm: int,
+        burst_seconds: float = 2.0,
+        cooldown_seconds: float = 30.0,
+        max_cooldown_seconds: float = 300.0,
+        error_decay: float = 0.2
+    ):
+        if not clients:
+            raise ValueError("En az bir Gemini API anahtarı gerekli")
+
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.error_decay = error_decay
+        self.slots: List[KeySlot] = [
+            KeySlot(label, client, dict(model_rpm), default_rpm, burst_seconds)
+            for label, client in clients
+        ]
+        self._next = 0
+        self.exhausted = 0
+
+    @classmethod
+    def from_keys(
+        cls,
+        api_keys: Sequence[str],
+        max_connections: int = 64,
+        max_keepalive_connections: int = 32,
+        **kwargs
+    ) -> "GeminiClientPool":
+        """
+        Build one client per key, each with its own httpx connection pool
+
+        Args:
+            api_keys: Gemini API keys
+            max_connections: Connection limit of each key's pool
+            max_keepalive_connections: Idle connections kept open per key
+            **kwargs: Passed to the constructor (quota and cooldown settings)
+
+        Returns:
+            A pool labelled key-0, key-1, ... (keys themselves are never exposed)
+        """
+        import httpx
+        from google.genai import Client, types
+
+        clients = []
+        for index, api_key in enumerate(api_keys):
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive_connections
+                )
+            )
+            http_options = types.HttpOptions(async_client_args={"transport": transport})
+            clients.append((f"key-{index}", Client(api_key=api_key, http_options=http_options)))
+        return cls(clients, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def acquire(self, model: str) -> KeySlot:
+        """Pick the key for the next `model` call and charge its quota estimate"""
+        now = time.monotonic()
+        count = len(self.slots)
+        best, best_score = None, -1.0
+        for offset in range(count):
+            slot = self.slots[(self._next + offset) % count]
+            if slot.cooling_down(now):
+                continue
+            score = slot.headroom(model) * (1.0 - slot.error_rate) / (1 + slot.in_flight)
+            if score > best_score:
+                best, best_score = slot, score
+
+        if best is None:
+            self.exhausted += 1
+            best = min(self.slots, key=lambda slot: slot.cooldown_until)
+        self._next = (self.slots.index(best) + 1) % count
+
+        best.bucket(model).try_acquire()
+        best.in_flight += 1
+        best.requests += 1
+        return best
+
+    def _succeeded(self, slot: KeySlot) -> None:
+        slot.in_flight -= 1
+        slot.strikes = 0
+        slot.error_rate *= 1.0 - self.error_decay
+
+    def _failed(self, slot: KeySlot, exc: BaseException) -> None:
+        slot.in_flight -= 1
+        code = _status_code(exc)
+        if code not in DISABLING_STATUS_CODES and not is_retryable_error(exc):
+            return
+
+        slot.errors += 1
+        slot.error_rate = slot.error_rate * (1.0 - self.error_decay) + self.error_decay
+        if code == 429:
+            slot.rate_limited += 1
+            slot.strikes += 1
+            cooldown = retry_delay(exc) or self.cooldown_seconds * 2 ** (slot.strikes - 1)
+            self._cool_down(slot, min(cooldown, self.max_cooldown_seconds))
+        elif code in DISABLING_STATUS_CODES:
+            self._cool_down(slot, self.max_cooldown_seconds)
+
+    def _cool_down(self, slot: KeySlot, seconds: float) -> None:
+        slot.cooldown_until = max(slot.cooldown_until, time.monotonic() + seconds)
+        print(f"🔑 {slot.label} {seconds:.0f}s rotasyon dışı")
+
+    async def call(self, model: str, fn: Callable[[Any], Awaitable[T]]) -> T:
+        """Run `fn(client)` on the best key for `model`"""
+        slot = self.acquire(model)
+        try:
+            result = await fn(slot.client)
+        except BaseException as e:
+            self._failed(slot, e)
+            raise
+        self._succeeded(slot)
+        return result
+
+    async def stream(self, model: str, fn: Callable[[Any], Awaitable[AsyncIterator[T]]]) -> AsyncIterator[T]:
+        """Open a stream with `fn(client)` on the best key; the key stays busy until it ends"""
+        slot = self.acquire(model)
+        try:
+            iterator = await fn(slot.client)
+        except BaseException as e:
+            self._failed(slot, e)
+            raise
+        return self._track(slot, iterator)
+
+    async def _track(self, slot: KeySlot, iterator: AsyncIterator[T]) -> AsyncIterator[T]:
+        try:
+            async for chunk in iterator:
+                yield chunk
+        except BaseException as e:
+            self._failed(slot, e)
+            raise
+        self._succeeded(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "keys": len(self.slots),
+            "available": sum(1 for slot in self.slots if not slot.cooling_down(now)),
+            "exhausted": self.exhausted,
+            "clients": {
+                slot.label: {
+                    "in_flight": slot.in_flight,
+                    "requests": slot.requests,
+                    "errors": slot.errors,
+                    "rate_limited": slot.rate_limited,
+                    "error_rate": round(slot.error_rate, 4),
+                    "cooldown_seconds": round(max(0.0, slot.cooldown_until - now), 1),
+                    "headroom": {model: round(slot.headroom(model), 3) for model in slot.buckets},
+                }
+                for slot in self.slots
+            },
+        }
@@ -0,0 +1,171 @@
+"""
+Token-budgeted compaction of the context pasted into downstream prompts:
+duplicate and boilerplate sentences are dropped, and if the text is still
+over budget the sentences (or list lines) carrying prices, ratings and
+product names are kept in their original order
+"""
+
+import math
+import re
+from typing import Any, Dict, List, Tuple
+
+from utils import TextProcessor
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-ZÇĞİÖŞÜ0-9*\"'(\[])")
+_ENUMERATOR = re.compile(r"^\d+[.)]$")
+
+BOILERPLATE_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"fiyatlar\s+(satıcıya|değişebilir|kampanya)",
+    r"daha fazla bilgi (için|almak)",
+    r"(sitesini|sitelerini|sayfasını) ziyaret edin",
+    r"(çerez|cookie)",
+    r"tüm hakları saklıdır",
+    r"(abone ol|bültenimize)",
+    r"bu (yazı|içerik) (sponsorlu|reklam)",
+    r"^(kaynak|kaynaklar)\s*:",
+))
+
+PRICE_PATTERN = re.compile(r"\d[\d.,]*\s*(tl|₺|lira)\b|(₺|\$|€)\s*\d", re.IGNORECASE)
+RATING_PATTERN = re.compile(r"\d[.,]?\d?\s*/\s*(5|10)\b|\b(puan|yıldız|değerlendirme|yorum)", re.IGNORECASE)
+PRODUCT_PATTERN = re.compile(r"\*\*[^*]+\*\*|\b[A-Z][A-Za-z]*[- ]?[A-Z]*\d+[A-Za-z0-9-]*\b")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate Gemini token count without a tokenizer download
+
+    Words are counted as one token per four characters (SentencePiece splits
+    long Turkish words into several pieces) and each punctuation mark as one.
+    """
+    return sum(
+        math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == "_" else 1
+        for piece in _TOKEN_PATTERN.findall(text)
+    )
+
+
+def _sentences(line: str) -> List[str]:
+    sentences: List[str] = []
+    for piece in _SENTENCE_SPLIT.split(line.strip()):
+        if sentences and _ENUMERATOR.match(sentences[-1]):
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+def _fingerprint(text: str) -> str:
+    return " ".join(re.findall(r"\w+", TextProcessor.turkish_casefold(text)))
+
+
+def _is_boilerplate(text: str) -> bool:
+    return any(pattern.search(text) for pattern in BOILERPLATE_PATTERNS)
+
+
+def _sentence_score(sentence: str) -> int:
+    score = 0
+    if PRICE_PATTERN.search(sentence):
+        score += 3
+    if PRODUCT_PATTERN.search(sentence):
+        score += 2
+    if RATING_PATTERN.search(sentence):
+        score += 2
+    return score
+
+
+def compact_text(text: str, max_tokens: float) -> Tuple[str, Dict[str, int]]:
+    """
+    Shrink `text` to at most `max_tokens` (approximate) tokens
+
+    Args:
+        text: Context text, e.g. grounded search results or the buying guide
+        max_tokens: Token budget for this text
+
+    Returns:
+        Compacted text and before/after statistics
+    """
+    stats = {
+        "before_tokens": count_tokens(text),
+        "after_tokens": 0,
+        "duplicates": 0,
+        "boilerplate": 0,
+        "dropped_sentences": 0,
+    }
+
+    seen = set()
+    units: List[Tuple[Tuple[int, int, int], str, int]] = []
+    for p_index, paragraph in enumerate(_PARAGRAPH_SPLIT.split(text.strip())):
+        for l_index, line in enumerate(paragraph.splitlines()):
+            for s_index, sentence in enumerate(_sentences(line)):
+                fingerprint = _fingerprint(sentence)
+                if not fingerprint:
+                    continue
+                if fingerprint in seen:
+                    stats["duplicates"] += 1
+                    continue
+                if _is_boilerplate(sentence):
+                    stats["boilerplate"] += 1
+                    continue
+                seen.add(fingerprint)
+                units.append(((p_index, l_index, s_index), sentence, count_tokens(sentence)))
+
+    if sum(tokens for *_, tokens in units) > max_tokens:
+        ranked = sorted(units, key=lambda unit: (-_sentence_score(unit[1]), unit[0]))
+        kept, used = set(), 0
+        for position, _, tokens in ranked:
+            if used + tokens > max_tokens:
+                continue
+            kept.add(position)
+            used += tokens
+        stats["dropped_sentences"] = len(units) - len(kept)
+        units = [unit for unit in units if unit[0] in kept]
+
+    paragraphs: Dict[int, Dict[int, List[str]]] = {}
+    for (p_index, l_index, _), sentence, _ in units:
+        paragraphs.setdefault(p_index, {}).setdefault(l_index, []).append(sentence)
+    compacted = "\n\n".join(
+        "\n".join(" ".join(sentences) for sentences in lines.values())
+        for lines in paragraphs.values()
+    )
+
+    stats["after_tokens"] = count_tokens(compacted)
+    return compacted, stats
+
+
+def compact_prompt_context(
+    fields: Dict[str, str],
+    template_tokens: int,
+    budget: float,
+    shares: Dict[str, float]
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """
+    Fit the context fields of one prompt into `budget` tokens
+
+    Args:
+        fields: Template field name -> context text (e.g. buying_guide, search_results)
+        template_tokens: Tokens used by the template itself
+        budget: Token budget for the whole prompt
+        shares: Maximum share of the context budget per field; the last field gets whatever is left
+
+    Returns:
+        Compacted fields and before/after statistics
+    """
+    available = max(0, budget - template_tokens)
+    compacted: Dict[str, str] = {}
+    stats: Dict[str, Any] = {"before_tokens": template_tokens, "after_tokens": template_tokens, "fields": {}}
+
+    names = list(fields)
+    for index, name in enumerate(names):
+        if index == len(names) - 1:
+            limit = available
+        else:
+            limit = available * shares.get(name, 1.0 / len(names))
+        text, field_stats = compact_text(fields[name], limit)
+        compacted[name] = text
+        available = max(0, available - field_stats["after_tokens"])
+        stats["before_tokens"] += field_stats["before_tokens"]
+        stats["after_tokens"] += field_stats["after_tokens"]
+        stats["fields"][name] = field_stats
+
+    return compacted, stats
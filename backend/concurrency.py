@@ -0,0 +1,229 @@
+"""
+Concurrency primitives shared by the API layer and the agent
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterator, Optional, TypeVar
+
+from scheduler import SharedPriority, current_call_priority
+
+T = TypeVar("T")
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Raised when the request's remaining budget cannot cover a step"""
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Give the enclosed work an end-to-end deadline of `seconds` from now.
+
+    Nested deadlines never extend an outer one; None or a non-positive value
+    leaves the current deadline unchanged.
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def without_deadline() -> Iterator[None]:
+    """Run the enclosed work (e.g. background refreshes) with no deadline"""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left until the current deadline, or None when there is none"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def step_budget(share: float, min_seconds: float = 0.0) -> Optional[float]:
+    """
+    Time a step may take: `share` of the remaining budget
+
+    Raises DeadlineExceeded when that is below `min_seconds`, so callers
+    skip work that could not finish anyway.
+    """
+    remaining = remaining_budget()
+    if remaining is None:
+        return None
+    budget = remaining * share
+    if budget <= 0 or budget < min_seconds:
+        raise DeadlineExceeded(f"Kalan süre yetersiz ({budget:.2f}s / {remaining:.2f}s)")
+    return budget
+
+
+async def run_with_budget(fn: Callable[[], Awaitable[T]], share: float = 1.0, min_seconds: float = 0.0) -> T:
+    """Await `fn()` within `share` of the remaining request budget"""
+    budget = step_budget(share, min_seconds)
+    if budget is None:
+        return await fn()
+    end = time.monotonic() + budget
+    try:
+        return await asyncio.wait_for(fn(), budget)
+    except asyncio.TimeoutError as e:
+        if isinstance(e, DeadlineExceeded) or time.monotonic() < end:
+            raise
+        raise DeadlineExceeded(f"Adım {budget:.2f}s bütçesini aştı") from e
+
+
+async def iterate_with_budget(
+    iterator: AsyncIterator[T],
+    share: float = 1.0,
+    min_seconds: float = 0.0
+) -> AsyncIterator[T]:
+    """Yield from `iterator` until `share` of the remaining budget is spent"""
+    budget = step_budget(share, min_seconds)
+    if budget is None:
+        async for item in iterator:
+            yield item
+        return
+
+    end = time.monotonic() + budget
+    while True:
+        try:
+            item = await asyncio.wait_for(iterator.__anext__(), max(0.0, end - time.monotonic()))
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError as e:
+            if isinstance(e, DeadlineExceeded) or time.monotonic() < end:
+                raise
+            raise DeadlineExceeded(f"Akış {budget:.2f}s bütçesini aştı") from e
+        yield item
+
+
+async def iterate_in_task(iterator: AsyncIterator[T]) -> AsyncIterator[T]:
+    """
+    Drive `iterator` in its own task and yield its items
+
+    When the consumer is cancelled or closed the task is cancelled with a
+    plain asyncio cancellation. Under a server cancel scope (e.g. Starlette
+    aborting a streaming response on disconnect) cancellation is re-delivered
+    on every await, which would otherwise cut LangGraph's cleanup short and
+    leave running nodes orphaned.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    async def pump() -> None:
+        try:
+            async for item in iterator:
+                await queue.put((False, item))
+        except Exception as e:
+            await queue.put((True, e))
+        else:
+            await queue.put((True, None))
+
+    task = asyncio.ensure_future(pump())
+    try:
+        while True:
+            finished, value = await queue.get()
+            if finished:
+                if value is not None:
+                    raise value
+                return
+            yield value
+    finally:
+        task.cancel()
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away before its result was ready"""
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key.
+
+    The first caller for a key starts the work; callers arriving while it is
+    in flight await the same task and receive the same result or exception.
+
+    Waiters are reference counted: when the last one is cancelled (client
+    disconnect, timeout) the shared task is cancelled too, so nobody keeps
+    paying for a result no one is waiting for.
+
+    With `isolated`, the shared task runs in an empty context instead of the
+    first caller's, so request-scoped context variables do not apply to work
+    done for every waiter; its Gemini calls run at the most urgent priority
+    among the waiters.
+    """
+
+    def __init__(self, isolated: bool = False):
+        self.isolated = isolated
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._priorities: Dict[asyncio.Task, SharedPriority] = {}
+
+        self.leaders = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.abandoned = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            shared = SharedPriority(current_call_priority()) if self.isolated else None
+            task = asyncio.get_running_loop().create_task(fn(), context=shared.context() if shared else None)
+            if shared is not None:
+                self._priorities[task] = shared
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._on_done(k, t))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            if task in self._priorities:
+                self._priorities[task].raise_to(current_call_priority())
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._release(key, task)
+
+    def _release(self, key: Hashable, task: asyncio.Task) -> None:
+        remaining = self._waiters[task] - 1
+        if remaining:
+            self._waiters[task] = remaining
+            return
+        del self._waiters[task]
+        if not task.done():
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            task.cancel()
+            self.abandoned += 1
+
+    def _on_done(self, key: Hashable, task: asyncio.Task) -> None:
+        self._priorities.pop(task, None)
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "abandoned": self.abandoned,
+        }
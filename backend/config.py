@@ -2,6 +2,7 @@
 Configuration settings for Smart Product Recommendation API
 """
 
+import json
 import os
 from dotenv import load_dotenv
 
@@ -11,6 +12,9 @@ class Config:
     """Application configuration"""
     
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    GEMINI_API_KEYS = [
+        key.strip() for key in os.getenv("GEMINI_API_KEYS", GEMINI_API_KEY or "").split(",") if key.strip()
+    ]
     
     APP_TITLE = "Smart Product Recommendation API"
     APP_DESCRIPTION = "LangGraph tabanlı akıllı ürün öneri sistemi"
@@ -21,7 +25,129 @@ class Config:
     
     ALLOWED_ORIGINS = ["*"]
     
-    MAX_WORKERS = 1
+    MAX_CONCURRENT_RECOMMENDATIONS = int(os.getenv("MAX_CONCURRENT_RECOMMENDATIONS", "32"))
+    
+    RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+    RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+    RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+    
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+    JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+    JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", "600"))
+    JOB_MAX_RETAINED = int(os.getenv("JOB_MAX_RETAINED", "10000"))
+    
+    REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "45"))
+    REQUEST_DEADLINE_MAX_SECONDS = float(os.getenv("REQUEST_DEADLINE_MAX_SECONDS", "120"))
+    REQUEST_DEADLINE_GRACE_SECONDS = float(os.getenv("REQUEST_DEADLINE_GRACE_SECONDS", "2"))
+    DEADLINE_MIN_CALL_SECONDS = float(os.getenv("DEADLINE_MIN_CALL_SECONDS", "1"))
+    DEADLINE_CALL_SHARES = json.loads(os.getenv(
+        "DEADLINE_CALL_SHARES",
+        '{"intent": 0.2, "buying_guide": 0.6, "product_search": 0.6, "product_extraction": 0.5, '
+        '"final_recommendation": 0.9, "structured_recommendation": 0.9}'
+    ))
+    
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "2000"))
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    
+    GUIDE_STORE_TTL_SECONDS = int(os.getenv("GUIDE_STORE_TTL_SECONDS", str(7 * 24 * 3600)))
+    GUIDE_STORE_MAX_ENTRIES = int(os.getenv("GUIDE_STORE_MAX_ENTRIES", "5000"))
+    GUIDE_STORE_MAX_BYTES = int(os.getenv("GUIDE_STORE_MAX_BYTES", str(32 * 1024 * 1024)))
+    GUIDE_STORE_PATH = os.getenv("GUIDE_STORE_PATH")
+    GUIDE_STORE_SNAPSHOT_SECONDS = int(os.getenv("GUIDE_STORE_SNAPSHOT_SECONDS", "60"))
+    
+    CATALOG_PATH = os.getenv(
+        "CATALOG_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "catalog.json")
+    )
+    CATALOG_MAX_PRODUCTS = int(os.getenv("CATALOG_MAX_PRODUCTS", "200000"))
+    CATALOG_MIN_SIMILARITY = float(os.getenv("CATALOG_MIN_SIMILARITY", "0.8"))
+    CATALOG_SNAPSHOT_SECONDS = int(os.getenv("CATALOG_SNAPSHOT_SECONDS", "300"))
+    
+    SEARCH_CACHE_FRESH_SECONDS = int(os.getenv("SEARCH_CACHE_FRESH_SECONDS", "900"))
+    SEARCH_CACHE_STALE_SECONDS = int(os.getenv("SEARCH_CACHE_STALE_SECONDS", str(6 * 3600)))
+    SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2000"))
+    SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    
+    LLM_STORE_MODE = os.getenv("LLM_STORE_MODE", "off")
+    LLM_STORE_PATH = os.getenv(
+        "LLM_STORE_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "llm_responses.sqlite3")
+    )
+    LLM_STORE_MAX_BYTES = int(os.getenv("LLM_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+    LLM_STORE_MAX_TEMPERATURE = float(os.getenv("LLM_STORE_MAX_TEMPERATURE", "0.3"))
+    LLM_STORE_DEFAULT_TTL_SECONDS = int(os.getenv("LLM_STORE_DEFAULT_TTL_SECONDS", str(24 * 3600)))
+    LLM_STORE_TTL_SECONDS = json.loads(os.getenv(
+        "LLM_STORE_TTL_SECONDS",
+        '{"intent": 2592000, "buying_guide": 604800, "product_search": 600, "product_extraction": 604800, '
+        '"final_recommendation": 3600, "structured_recommendation": 3600}'
+    ))
+    
+    QUERY_LOG_PATH = os.getenv(
+        "QUERY_LOG_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "query_log.jsonl")
+    )
+    QUERY_LOG_MAX_ENTRIES = int(os.getenv("QUERY_LOG_MAX_ENTRIES", "5000"))
+    QUERY_LOG_FLUSH_SECONDS = float(os.getenv("QUERY_LOG_FLUSH_SECONDS", "30"))
+    PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "true").lower() == "true"
+    PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "20"))
+    PREWARM_INTERVAL_SECONDS = float(os.getenv("PREWARM_INTERVAL_SECONDS", "3600"))
+    PREWARM_RATE_PER_MINUTE = float(os.getenv("PREWARM_RATE_PER_MINUTE", "6"))
+    PREWARM_STARTUP_DELAY_SECONDS = float(os.getenv("PREWARM_STARTUP_DELAY_SECONDS", "5"))
+    
+    SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+    SESSION_DB_PATH = os.getenv(
+        "SESSION_DB_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sessions.sqlite3")
+    )
+    SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+    SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+    
+    STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "false").lower() == "true"
+    
+    CONTEXT_COMPACTION_ENABLED = os.getenv("CONTEXT_COMPACTION_ENABLED", "true").lower() == "true"
+    PROMPT_TOKEN_BUDGETS = json.loads(os.getenv(
+        "PROMPT_TOKEN_BUDGETS",
+        '{"product_extraction": 1500, "final_recommendation": 3000, "structured_recommendation": 3000}'
+    ))
+    CONTEXT_GUIDE_MAX_SHARE = float(os.getenv("CONTEXT_GUIDE_MAX_SHARE", "0.4"))
+    
+    LOCAL_INTENT_CLASSIFIER = os.getenv("LOCAL_INTENT_CLASSIFIER", "true").lower() == "true"
+    LOCAL_INTENT_MIN_CONFIDENCE = float(os.getenv("LOCAL_INTENT_MIN_CONFIDENCE", "0.8"))
+    CATEGORY_LEXICON_PATH = os.getenv(
+        "CATEGORY_LEXICON_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "categories.json")
+    )
+    
+    GEMINI_MODEL_RPM = json.loads(os.getenv(
+        "GEMINI_MODEL_RPM",
+        '{"gemini-2.0-flash": 2000, "gemini-2.5-flash": 1000}'
+    ))
+    GEMINI_DEFAULT_RPM = int(os.getenv("GEMINI_DEFAULT_RPM", "1000"))
+    GEMINI_RATE_BURST_SECONDS = float(os.getenv("GEMINI_RATE_BURST_SECONDS", "2"))
+    GEMINI_MAX_QUEUE = int(os.getenv("GEMINI_MAX_QUEUE", "500"))
+    GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+    GEMINI_BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "0.5"))
+    GEMINI_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", "8"))
+    GEMINI_MAX_CONNECTIONS_PER_KEY = int(os.getenv("GEMINI_MAX_CONNECTIONS_PER_KEY", "64"))
+    GEMINI_MAX_KEEPALIVE_PER_KEY = int(os.getenv("GEMINI_MAX_KEEPALIVE_PER_KEY", "32"))
+    GEMINI_KEY_COOLDOWN_SECONDS = float(os.getenv("GEMINI_KEY_COOLDOWN_SECONDS", "30"))
+    GEMINI_KEY_MAX_COOLDOWN_SECONDS = float(os.getenv("GEMINI_KEY_MAX_COOLDOWN_SECONDS", "300"))
+    GEMINI_KEY_ERROR_DECAY = float(os.getenv("GEMINI_KEY_ERROR_DECAY", "0.2"))
+    
+    MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+    MODEL_ROUTING_POLICY = json.loads(os.getenv("MODEL_ROUTING_POLICY", "{}"))
+    MODEL_LATENCY_WINDOW_SECONDS = float(os.getenv("MODEL_LATENCY_WINDOW_SECONDS", "300"))
+    MODEL_LATENCY_MIN_SAMPLES = int(os.getenv("MODEL_LATENCY_MIN_SAMPLES", "10"))
+    
+    HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+    HEDGE_CALLS = [name.strip() for name in os.getenv("HEDGE_CALLS", "intent,product_extraction").split(",") if name.strip()]
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_WINDOW_SIZE = int(os.getenv("HEDGE_WINDOW_SIZE", "200"))
+    HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.05"))
+    HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.05"))
     
     ECOMMERCE_SITES = {
         "Hepsiburada": "https://www.hepsiburada.com/ara?q=",
@@ -34,8 +160,8 @@ class Config:
     @classmethod
     def validate_config(cls):
         """Validate required configuration"""
-        if not cls.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY environment variable gerekli")
+        if not cls.GEMINI_API_KEYS:
+            raise ValueError("GEMINI_API_KEY veya GEMINI_API_KEYS environment variable gerekli")
         return True
 
 config = Config()
@@ -0,0 +1,153 @@
+"""
+Hedged requests for idempotent Gemini calls: if a call is slower than the
+adaptive latency percentile for its model/template, a duplicate is sent and
+the first successful response wins
+"""
+
+import asyncio
+import math
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LatencyWindow:
+    """Sliding window of recent latencies and hedge counters for one model/template"""
+
+    def __init__(self, size: int):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.counts: Counter = Counter()
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class RequestHedger:
+    """
+    Sends a backup request once the primary has run longer than the `pct`
+    latency percentile observed for the same key. Hedges are paid for from a
+    budget that grows by `max_hedge_ratio` per call, so at most that share of
+    calls is ever duplicated.
+    """
+
+    def __init__(
+        self,
+        pct: float = 95.0,
+        min_samples: int = 20,
+        window_size: int = 200,
+        max_hedge_ratio: float = 0.05,
+        min_delay: float = 0.05,
+        max_budget: float = 10.0
+    ):
+        self.pct = pct
+        self.min_samples = min_samples
+        self.window_size = window_size
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_delay = min_delay
+        self.max_budget = max_budget
+
+        self._windows: Dict[Hashable, LatencyWindow] = {}
+        self._budget = 0.0
+
+    def _window(self, key: Hashable) -> LatencyWindow:
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = LatencyWindow(self.window_size)
+        return window
+
+    def threshold(self, key: Hashable) -> Optional[float]:
+        """Hedge delay for `key`, or None while there are too few samples"""
+        window = self._windows.get(key)
+        if window is None or len(window.samples) < self.min_samples:
+            return None
+        return max(self.min_delay, window.percentile(self.pct))
+
+    def _try_spend(self) -> bool:
+        if self._budget >= 1.0:
+            self._budget -= 1.0
+            return True
+        return False
+
+    async def _timed(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        start = time.monotonic()
+        result = await fn()
+        self._window(key).add(time.monotonic() - start)
+        return result
+
+    async def run(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[T]],
+        allow_hedge: Callable[[], bool] = lambda: True
+    ) -> T:
+        """
+        Run `fn`, hedging it if it is slow
+
+        Args:
+            key: Latency tracking key, e.g. (model, call name)
+            fn: Idempotent call to run (called again for the hedge)
+            allow_hedge: Checked right before hedging, e.g. to skip when queues are backed up
+
+        Returns:
+            Result of whichever request succeeded first
+        """
+        counts = self._window(key).counts
+        counts["calls"] += 1
+        self._budget = min(self.max_budget, self._budget + self.max_hedge_ratio)
+
+        delay = self.threshold(key)
+        if delay is None:
+            return await self._timed(key, fn)
+
+        primary = asyncio.ensure_future(self._timed(key, fn))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not allow_hedge():
+                return await primary
+            if not self._try_spend():
+                counts["rate_limited"] += 1
+                return await primary
+
+            counts["hedged"] += 1
+            hedge = asyncio.ensure_future(self._timed(key, fn))
+            tasks.add(hedge)
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            counts["hedge_wins"] += 1
+                        return task.result()
+                    if task is primary or error is None:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[Hashable, Dict[str, Any]]:
+        """Per-key counters, sample count and current hedge threshold"""
+        result = {}
+        for key, window in self._windows.items():
+            threshold = self.threshold(key)
+            result[key] = {
+                "calls": window.counts["calls"],
+                "hedged": window.counts["hedged"],
+                "hedge_wins": window.counts["hedge_wins"],
+                "rate_limited": window.counts["rate_limited"],
+                "samples": len(window.samples),
+                "threshold_seconds": round(threshold, 4) if threshold is not None else None,
+            }
+        return result
@@ -0,0 +1,231 @@
+"""
+Local category classifier used as a fast path before LLM intent analysis
+"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import TextProcessor
+
+_TERMINAL = "\0"
+
+_VOWELS = frozenset("aeıioöuü")
+
+_SOFTENING = {"p": "b", "ç": "c", "t": "d", "k": "ğ"}
+
+TURKISH_SUFFIXES = frozenset({
+    "lar", "ler",
+    "ı", "i", "u", "ü", "yı", "yi", "yu", "yü", "nı", "ni", "nu", "nü",
+    "a", "e", "ya", "ye", "na", "ne",
+    "da", "de", "ta", "te", "nda", "nde",
+    "dan", "den", "tan", "ten", "ndan", "nden",
+    "ın", "in", "un", "ün", "nın", "nin", "nun", "nün",
+    "la", "le", "yla", "yle",
+    "sı", "si", "su", "sü",
+    "m", "ım", "im", "um", "üm", "n",
+    "mız", "miz", "muz", "müz", "ımız", "imiz", "umuz", "ümüz",
+    "lık", "lik", "luk", "lük",
+    "ki", "dır", "dir", "dur", "dür",
+    "mı", "mi", "mu", "mü",
+})
+
+
+# Words that may follow the product without changing it (telefon önerisi, tv fiyatı, 20000 tl altı)
+REQUEST_WORDS = ("öneri", "tavsiye", "fiyat", "model", "marka", "seçim", "yorum", "karşılaştırma", "hangi", "iyi")
+TRAILING_WORDS = frozenset({
+    "tl", "lira", "altı", "altında", "üstü", "üstünde", "arası", "bütçe", "bütçeli", "ucuz", "uygun", "fiyatlı",
+    "kaliteli", "olsun", "pro", "max", "plus", "mini", "ultra", "lite", "air", "se", "fe",
+})
+
+# Verb forms closing a request (almak, bakıyorum, alacağım, alsam, önerir)
+_VERB = re.compile(r"(?:m[ae]k|yor\w*|[ae]c[ae][kğ]\w*|s[ae][mk]|m[ae]l[ıi]\w*|[ıiuüae]r)$")
+
+_GENITIVE = re.compile(r"n?[ıiuü]n$")
+
+
+@lru_cache(maxsize=4096)
+def is_suffix_chain(rest: str, depth: int = 0) -> bool:
+    """Whether `rest` can be split into a chain of known inflectional suffixes"""
+    if not rest:
+        return True
+    if depth >= 4:
+        return False
+    return any(
+        rest[:size] in TURKISH_SUFFIXES and is_suffix_chain(rest[size:], depth + 1)
+        for size in range(1, min(len(rest), 4) + 1)
+    )
+
+
+class CategoryClassifier:
+    """
+    Resolves a product category from free text with a character trie built
+    from a category lexicon. Terms match at word starts and may be followed
+    by Turkish inflectional suffixes (telefonlar, kulaklığı, halıda). A term
+    followed by another noun it only modifies (telefon kılıfı, tablet için
+    klavye) is not trusted, so the LLM decides.
+    """
+
+    def __init__(self, lexicon_path: str, min_confidence: float = 0.8):
+        self.lexicon_path = lexicon_path
+        self.min_confidence = min_confidence
+        self._root: Dict[str, Any] = {}
+        self.term_count = 0
+
+        self.lookups = 0
+        self.hits = 0
+        self.low_confidence = 0
+        self.misses = 0
+
+        self.load(lexicon_path)
+
+    def load(self, lexicon_path: str) -> None:
+        with open(lexicon_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        for entry in data.get("categories", []):
+            category = entry["category"]
+            for term in {category, *entry.get("synonyms", [])}:
+                self.add_term(term, category)
+
+    def add_term(self, term: str, category: str) -> None:
+        normalized = " ".join(re.findall(r"\w+", TextProcessor.turkish_casefold(term)))
+        if not normalized:
+            return
+
+        self._insert(normalized, category, needs_vowel_suffix=False)
+        if normalized[-1] in _SOFTENING:
+            self._insert(normalized[:-1] + _SOFTENING[normalized[-1]], category, needs_vowel_suffix=True)
+        self.term_count += 1
+
+    def _insert(self, term: str, category: str, needs_vowel_suffix: bool) -> None:
+        node = self._root
+        for char in term:
+            node = node.setdefault(char, {})
+        if _TERMINAL not in node or not needs_vowel_suffix:
+            node[_TERMINAL] = (category, needs_vowel_suffix)
+
+    def _find_matches(self, text: str) -> List[Tuple[int, int, str, bool]]:
+        starts = [0] + [i + 1 for i, char in enumerate(text) if char == " "]
+        matches = []
+
+        for start in starts:
+            node = self._root
+            i = start
+            while i < len(text) and text[i] in node:
+                node = node[text[i]]
+                i += 1
+                if _TERMINAL not in node:
+                    continue
+
+                token_end = text.find(" ", i)
+                token_end = len(text) if token_end == -1 else token_end
+                rest = text[i:token_end]
+                category, needs_vowel_suffix = node[_TERMINAL]
+
+                if needs_vowel_suffix and (not rest or rest[0] not in _VOWELS):
+                    continue
+                if is_suffix_chain(rest):
+                    matches.append((start, token_end, category, not rest))
+
+        return matches
+
+    @staticmethod
+    def _is_trailing_word(token: str) -> bool:
+        return (
+            token in TextProcessor.QUERY_STOP_WORDS
+            or token in TRAILING_WORDS
+            or token.startswith(REQUEST_WORDS)
+            or any(char.isdigit() for char in token)
+            or bool(_VERB.search(token))
+        )
+
+    def _is_modifier(self, text: str, match: Tuple[int, int, str, bool], next_start: int) -> bool:
+        """
+        Whether the matched term only modifies what follows it: a genitive
+        (telefonun şarj kablosu) or any further noun up to the next match
+        (telefon kılıfı, iphone şarj aleti, tablet için klavye)
+        """
+        start, end, _, exact = match
+        following = text[end:next_start].split()
+        if not following:
+            return False
+        if not exact and _GENITIVE.search(text[start:end]):
+            return True
+        return not all(self._is_trailing_word(token) for token in following)
+
+    def _summarize(self, text: str, selected: List[Tuple[int, int, str, bool]], category: str) -> str:
+        """Intent summary in the LLM's shape: category plus the request's remaining constraints"""
+        covered = [(start, end) for start, end, _, _ in selected]
+        constraints, position = [], 0
+        for token in text.split():
+            token_start = text.index(token, position)
+            position = token_start + len(token)
+            if any(start <= token_start < end for start, end in covered):
+                continue
+            if token not in TextProcessor.QUERY_STOP_WORDS and not _VERB.search(token):
+                constraints.append(token)
+        summary = f"{category} satın almak istiyor"
+        return f"{summary} ({' '.join(constraints)})" if constraints else summary
+
+    def classify(self, user_message: str) -> Optional[Dict[str, Any]]:
+        """
+        Classify a user message into a product category
+
+        Args:
+            user_message: Raw user input
+
+        Returns:
+            Dict with product_category, user_intent and confidence, or None when nothing matched
+        """
+        self.lookups += 1
+        text = " ".join(re.findall(r"\w+", TextProcessor.turkish_casefold(user_message)))
+        matches = self._find_matches(text)
+
+        if not matches:
+            self.misses += 1
+            return None
+
+        matches.sort(key=lambda m: m[1] - m[0], reverse=True)
+        selected = []
+        for match in matches:
+            if all(match[1] <= other[0] or match[0] >= other[1] for other in selected):
+                selected.append(match)
+
+        selected.sort()
+        heads = [
+            match for index, match in enumerate(selected)
+            if not self._is_modifier(text, match, selected[index + 1][0] if index + 1 < len(selected) else len(text))
+        ]
+        categories = {match[2] for match in selected}
+        if len(categories) > 1:
+            confidence = 0.5
+        elif not heads:
+            confidence = 0.6
+        else:
+            confidence = 1.0 if any(match[3] for match in heads) else 0.9
+
+        category = (heads or selected)[0][2]
+        result = {
+            "product_category": category,
+            "user_intent": self._summarize(text, selected, category),
+            "confidence": confidence
+        }
+
+        if confidence >= self.min_confidence:
+            self.hits += 1
+        else:
+            self.low_confidence += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "terms": self.term_count,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "low_confidence": self.low_confidence,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+        }
+
@@ -0,0 +1,189 @@
+"""
+Asynchronous recommendation jobs: a bounded FIFO queue drained by a fixed
+worker pool, with finished results kept for a TTL
+"""
+
+import asyncio
+import math
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("İş kuyruğu dolu")
+        self.retry_after = retry_after
+
+
+class Job:
+    """A submitted request and, once finished, its result or error"""
+
+    def __init__(self, job_id: str, payload: Any, seq: int):
+        self.id = job_id
+        self.payload = payload
+        self.seq = seq
+        self.status = JOB_QUEUED
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.expires_at: Optional[float] = None
+
+
+class JobQueue:
+    """
+    Admission-controlled job runner. `submit` never waits: it either enqueues
+    the job or raises `JobQueueFull` with a Retry-After estimate based on the
+    queue depth and the average job duration.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[Dict[str, Any]]],
+        workers: int = 8,
+        max_queue: int = 100,
+        result_ttl_seconds: float = 600.0,
+        max_finished: int = 10000,
+        error_formatter: Callable[[BaseException], str] = str
+    ):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.result_ttl_seconds = result_ttl_seconds
+        self.max_finished = max_finished
+        self.error_formatter = error_formatter
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: Dict[str, Job] = {}
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        self._submitted = 0
+        self._dequeued = 0
+        self._running = 0
+        self._avg_duration: Optional[float] = None
+
+        self.counts: Counter = Counter()
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def retry_after(self) -> int:
+        """Seconds the workers need to drain the current backlog"""
+        average = self._avg_duration or 10.0
+        return max(1, math.ceil(average * self.queue_depth / self.workers))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, payload: Any) -> Job:
+        """
+        Enqueue a job without waiting
+
+        Args:
+            payload: Passed unchanged to the handler
+
+        Returns:
+            The queued job
+
+        Raises:
+            JobQueueFull: The queue is at capacity (or the workers are not started)
+        """
+        self._purge()
+        if self._queue is None or self._queue.full():
+            self.counts["rejected"] += 1
+            raise JobQueueFull(self.retry_after())
+
+        self._submitted += 1
+        job = Job(uuid.uuid4().hex, payload, self._submitted)
+        self._queue.put_nowait(job)
+        self._jobs[job.id] = job
+        self.counts["submitted"] += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._purge()
+        return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> Optional[int]:
+        """1-based place in the queue for a queued job"""
+        if job.status != JOB_QUEUED:
+            return None
+        return max(1, job.seq - self._dequeued)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self._dequeued += 1
+            self._running += 1
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = await self.handler(job.payload)
+                job.status = JOB_DONE
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.error = self.error_formatter(e)
+                job.status = JOB_FAILED
+            finally:
+                self._running -= 1
+                self._finish(job)
+                self._queue.task_done()
+
+    def _finish(self, job: Job) -> None:
+        job.finished_at = time.time()
+        job.expires_at = job.finished_at + self.result_ttl_seconds
+        job.payload = None
+        self.counts[job.status] += 1
+
+        if job.started_at is not None:
+            duration = job.finished_at - job.started_at
+            self._avg_duration = duration if self._avg_duration is None else 0.8 * self._avg_duration + 0.2 * duration
+
+        self._finished[job.id] = job.expires_at
+        self._purge()
+
+    def _purge(self) -> None:
+        now = time.time()
+        while self._finished:
+            job_id, expires_at = next(iter(self._finished.items()))
+            if expires_at > now and len(self._finished) <= self.max_finished:
+                break
+            self._finished.popitem(last=False)
+            self._jobs.pop(job_id, None)
+            self.counts["expired"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "running": self._running,
+            "retained": len(self._jobs),
+            "avg_duration_seconds": round(self._avg_duration, 4) if self._avg_duration is not None else None,
+            "submitted": self.counts["submitted"],
+            "rejected": self.counts["rejected"],
+            "done": self.counts[JOB_DONE],
+            "failed": self.counts[JOB_FAILED],
+            "expired": self.counts["expired"],
+        }
@@ -1,7 +1,11 @@
-from api import create_app
+from startup import startup_phase
+
+with startup_phase("import.api"):
+    from api import create_app
 from config import config
 
-app = create_app()
+with startup_phase("init.app"):
+    app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,240 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition
+"""
+
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += counts[-1]
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+Sample = Tuple[str, str, str, Dict[str, Any], float]
+
+
+class MetricsRegistry:
+    """
+    Holds metrics and scrape-time collectors. Collectors return samples as
+    (name, type, help, labels, value) tuples, which suits stats that already
+    live on other objects (caches, scheduler).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def _register(self, metric: _Metric) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        grouped: Dict[str, Tuple[str, str, List[str]]] = {}
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"⚠️ Metrik toplayıcı hatası: {e}")
+                continue
+            for name, type_name, documentation, labels, value in samples:
+                entry = grouped.setdefault(name, (type_name, documentation, []))
+                entry[2].append(f"{name}{_format_labels(list(labels), list(labels.values()))} {value}")
+
+        for name, (type_name, documentation, samples) in grouped.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {type_name}")
+            lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+NODE_DURATION = metrics.histogram(
+    "agent_node_duration_seconds", "Wall time per graph node", ["node"]
+)
+NODE_FALLBACKS = metrics.counter(
+    "agent_node_fallbacks_total", "Node executions that returned a degraded fallback", ["node"]
+)
+NODE_REUSED = metrics.counter(
+    "agent_node_reused_total", "Session turns that reused a node's previous output", ["node"]
+)
+NODE_CANCELLED = metrics.counter(
+    "agent_node_cancelled_total", "Node executions cancelled because the client went away", ["node"]
+)
+GEMINI_CALL_DURATION = metrics.histogram(
+    "gemini_call_duration_seconds", "Wall time per Gemini call including queueing and retries", ["model", "call"]
+)
+GEMINI_CALL_ERRORS = metrics.counter(
+    "gemini_call_errors_total", "Gemini calls that raised after retries", ["model", "call"]
+)
+GEMINI_CALLS_CANCELLED = metrics.counter(
+    "gemini_calls_cancelled_total", "Gemini calls aborted before completion", ["model", "call"]
+)
+GEMINI_TOKENS = metrics.counter(
+    "gemini_tokens_total", "Tokens reported by usage_metadata", ["model", "call", "kind"]
+)
+PROMPT_CONTEXT_TOKENS = metrics.counter(
+    "prompt_context_tokens_total", "Estimated prompt tokens before and after context compaction", ["call", "stage"]
+)
+DEADLINE_EXCEEDED = metrics.counter(
+    "deadline_exceeded_total", "Gemini calls skipped or cut off by the request deadline", ["call"]
+)
+RECOMMENDATIONS_IN_FLIGHT = metrics.gauge(
+    "recommendations_in_flight", "Recommendation requests currently being served", ["endpoint"]
+)
+RECOMMENDATIONS_TOTAL = metrics.counter(
+    "recommendations_total", "Recommendation requests by outcome", ["endpoint", "outcome"]
+)
+
+
+@contextmanager
+def request_timings() -> Iterator[List[Tuple[str, float]]]:
+    """Collect per-request timings recorded by `record_timing` within the block"""
+    timings: List[Tuple[str, float]] = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def record_timing(name: str, seconds: float) -> None:
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+def summarize_timings(timings: List[Tuple[str, float]]) -> Dict[str, float]:
+    summary: Dict[str, float] = {}
+    for name, seconds in timings:
+        summary[name] = round(summary.get(name, 0.0) + seconds, 4)
+    return summary
+
+
+@contextmanager
+def timed(histogram: Histogram, timing_name: Optional[str] = None, **labels) -> Iterator[None]:
+    """Observe the block's wall time on `histogram` and the current request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        if timing_name:
+            record_timing(timing_name, elapsed)
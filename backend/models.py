@@ -1,9 +1,12 @@
-from pydantic import BaseModel
-from typing import List, Optional, TypedDict, Annotated
-from langgraph.graph import add_messages
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
 
 class RecommendationRequest(BaseModel):
     user_input: str
+    include_timings: bool = False
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
+    session_id: Optional[str] = Field(default=None, min_length=1, max_length=128, pattern=r"^[A-Za-z0-9_.:-]+$")
+    response_format: Literal["markdown", "compact"] = "markdown"
 
 class RecommendationResponse(BaseModel):
     recommendation: str
@@ -11,18 +14,55 @@ class RecommendationResponse(BaseModel):
     recommended_products: List[str]
     ecommerce_links: dict
     sources: List[dict]
+    product_details: List[dict] = []
+    best_value: Optional[str] = None
+    degraded_sections: List[str] = []
+    session_id: Optional[str] = None
+    response_format: Literal["markdown", "compact"] = "markdown"
+    timings: Optional[Dict[str, float]] = None
+    prompt_tokens: Optional[Dict[str, Dict[str, int]]] = None
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    queue_position: Optional[int] = None
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    queue_position: Optional[int] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[RecommendationResponse] = None
+    error: Optional[str] = None
+
+class IntentAnalysis(BaseModel):
+    product_category: str
+    user_intent: str
+
+class RefinementCheck(IntentAnalysis):
+    is_refinement: bool
+
+class RecommendedProduct(BaseModel):
+    name: str
+    budget_tier: str
+    approximate_price: str
+
+class StructuredRecommendation(BaseModel):
+    recommendation: str
+    products: List[RecommendedProduct]
+    best_value: str
 
 class HealthResponse(BaseModel):
     status: str
     message: str
+    details: Optional[Dict[str, Any]] = None
 
-class ProductRecommendationState(TypedDict):
-    messages: Annotated[list, add_messages]
-    user_intent: str
-    product_category: str
-    buying_guide: str
-    search_results: str
-    final_recommendation: str
-    recommended_products: list
-    ecommerce_links: dict
-    sources: list
+def __getattr__(name: str):
+    """LangGraph state tipleri `state` modülünde; langgraph yalnızca ihtiyaç olduğunda import edilir"""
+    if name in ("ProductRecommendationState", "merge_sections"):
+        import state
+        return getattr(state, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
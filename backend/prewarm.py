@@ -0,0 +1,263 @@
+"""
+Cache prewarming: successful queries are counted in a compact on-disk log
+and, on startup and on a schedule, the most popular categories are replayed
+through the agent at background priority so a fresh process starts warm
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from scheduler import PRIORITY_BACKGROUND, call_priority
+from utils import TextProcessor
+
+
+class QueryLog:
+    """
+    Aggregated query counts persisted as JSON lines, one line per normalized
+    query. New observations are buffered in memory and appended on `flush`;
+    the file is rewritten (keeping the `max_entries` most frequent queries)
+    once it has grown to twice that many lines. Appends and rewrites hold an
+    exclusive lock on `<path>.lock`, and a rewrite re-reads the file first,
+    so lines appended by other worker processes are merged rather than lost.
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        try:
+            self._lines = self._read(self._entries)
+        except OSError as e:
+            print(f"⚠️ Sorgu günlüğü okunamadı: {e}")
+
+    def _read(self, entries: Dict[str, Dict[str, Any]]) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        lines = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._merge(entries, entry)
+        return lines
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _merge(entries: Dict[str, Dict[str, Any]], entry: Dict[str, Any]) -> None:
+        current = entries.get(entry["q"])
+        if current is None:
+            entries[entry["q"]] = dict(entry)
+            return
+        current["n"] += entry["n"]
+        if entry["ts"] >= current["ts"]:
+            current.update(t=entry["t"], c=entry["c"], ts=entry["ts"])
+
+    def record(self, user_input: str, product_category: str) -> None:
+        """Count one successful query and the category it resolved to"""
+        normalized = TextProcessor.normalize_query(user_input)
+        if not normalized or not product_category:
+            return
+        entry = {"q": normalized, "t": user_input.strip(), "c": product_category, "n": 1, "ts": int(time.time())}
+        with self._lock:
+            self._merge(self._entries, entry)
+            self._merge(self._pending, entry)
+
+    def flush(self) -> None:
+        """Append buffered counts to disk, compacting the file when it has grown too long"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            try:
+                with self._file_lock():
+                    if self._lines + len(pending) > 2 * self.max_entries:
+                        self._compact(pending)
+                    else:
+                        with open(self.path, "a", encoding="utf-8") as f:
+                            f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in pending.values())
+                        self._lines += len(pending)
+            except OSError as e:
+                print(f"⚠️ Sorgu günlüğü yazılamadı: {e}")
+
+    def _compact(self, pending: Dict[str, Dict[str, Any]]) -> None:
+        entries: Dict[str, Dict[str, Any]] = {}
+        self._read(entries)
+        for entry in pending.values():
+            self._merge(entries, entry)
+        ranked = sorted(entries.values(), key=lambda entry: entry["n"], reverse=True)[:self.max_entries]
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in ranked)
+        os.replace(tmp_path, self.path)
+        self._lines = len(ranked)
+
+        with self._lock:
+            self._entries = {entry["q"]: dict(entry) for entry in ranked}
+            for entry in self._pending.values():
+                self._merge(self._entries, entry)
+
+    def top_categories(self, limit: int) -> List[Tuple[str, str, int]]:
+        """
+        Most requested categories
+
+        Args:
+            limit: Number of categories to return
+
+        Returns:
+            (category, most frequent query for it, total count) tuples, most popular first
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+
+        totals: Dict[str, int] = {}
+        representative: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            category = entry["c"]
+            totals[category] = totals.get(category, 0) + entry["n"]
+            if category not in representative or entry["n"] > representative[category]["n"]:
+                representative[category] = entry
+
+        ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(category, representative[category]["t"], count) for category, count in ranked]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queries": len(self._entries), "pending": len(self._pending), "path": self.path}
+
+
+class Prewarmer:
+    """
+    Replays the top categories of a `QueryLog` through the agent in the
+    background, at most `rate_per_minute` recommendations per minute. When
+    disabled, only the query log is kept (and flushed).
+    """
+
+    def __init__(
+        self,
+        agent,
+        query_log: QueryLog,
+        top_n: int = 20,
+        interval_seconds: float = 3600.0,
+        rate_per_minute: float = 6.0,
+        startup_delay_seconds: float = 5.0,
+        flush_seconds: float = 30.0,
+        enabled: bool = True
+    ):
+        self.agent = agent
+        self.query_log = query_log
+        self.top_n = top_n
+        self.interval_seconds = interval_seconds
+        self.rate_per_minute = rate_per_minute
+        self.startup_delay_seconds = startup_delay_seconds
+        self.flush_seconds = flush_seconds
+        self.enabled = enabled
+
+        self._tasks: List[asyncio.Task] = []
+        self.progress: Dict[str, Any] = {
+            "status": "idle" if enabled else "disabled",
+            "runs": 0,
+            "total": 0,
+            "completed": 0,
+            "failed": 0,
+            "current": None,
+            "last_started_at": None,
+            "last_finished_at": None,
+            "next_run_at": None,
+        }
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._flush_loop())]
+        if self.enabled:
+            self._tasks.append(asyncio.create_task(self._prewarm_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self.query_log.flush)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await asyncio.to_thread(self.query_log.flush)
+
+    async def _prewarm_loop(self) -> None:
+        delay = self.startup_delay_seconds
+        while True:
+            self.progress["next_run_at"] = time.time() + delay
+            await asyncio.sleep(delay)
+            await self.run_once()
+            delay = self.interval_seconds
+
+    async def run_once(self) -> None:
+        """Replay the current top categories once"""
+        targets = self.query_log.top_categories(self.top_n)
+        self.progress.update(
+            status="running",
+            runs=self.progress["runs"] + 1,
+            total=len(targets),
+            completed=0,
+            failed=0,
+            current=None,
+            last_started_at=time.time(),
+            next_run_at=None,
+        )
+        if targets:
+            print(f"🔥 Önbellek ısıtma başladı: {len(targets)} kategori")
+
+        pause = 60.0 / self.rate_per_minute if self.rate_per_minute > 0 else 0.0
+        for index, (category, query, _) in enumerate(targets):
+            if index and pause:
+                await asyncio.sleep(pause)
+            self.progress["current"] = category
+            try:
+                with call_priority(PRIORITY_BACKGROUND):
+                    await self.agent.aget_recommendation(query)
+                self.progress["completed"] += 1
+            except Exception as e:
+                print(f"⚠️ {category} için ısıtma başarısız: {e}")
+                self.progress["failed"] += 1
+
+        self.progress.update(status="done", current=None, last_finished_at=time.time())
+        if targets:
+            print(f"🔥 Önbellek ısıtma tamamlandı: {self.progress['completed']}/{len(targets)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.progress, "query_log": self.query_log.stats()}
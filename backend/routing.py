@@ -0,0 +1,167 @@
+"""
+Per-call model routing: each call has a preferred model and an optional
+fallback that is used when the preferred one is congested, slow, short on
+quota or too slow for the request's remaining deadline
+"""
+
+import math
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+DEFAULT_ROUTING_POLICY: Dict[str, Dict[str, Any]] = {
+    "intent": {"preferred": "gemini-2.0-flash"},
+    "product_search": {"preferred": "gemini-2.0-flash"},
+    "product_extraction": {"preferred": "gemini-2.0-flash"},
+    "buying_guide": {
+        "preferred": "gemini-2.5-flash", "fallback": "gemini-2.0-flash",
+        "max_p95_seconds": 20, "max_queue_depth": 50, "min_headroom": 0.1, "min_remaining_seconds": 8,
+    },
+    "final_recommendation": {
+        "preferred": "gemini-2.5-flash", "fallback": "gemini-2.0-flash",
+        "max_p95_seconds": 30, "max_queue_depth": 50, "min_headroom": 0.1, "min_remaining_seconds": 12,
+    },
+    "structured_recommendation": {
+        "preferred": "gemini-2.5-flash", "fallback": "gemini-2.0-flash",
+        "max_p95_seconds": 30, "max_queue_depth": 50, "min_headroom": 0.1, "min_remaining_seconds": 12,
+    },
+}
+
+
+class RoutePolicy(BaseModel):
+    """Downgrade rules for one call; a None threshold disables that rule"""
+    preferred: str
+    fallback: Optional[str] = None
+    max_p95_seconds: Optional[float] = None
+    max_queue_depth: Optional[int] = None
+    min_headroom: Optional[float] = None
+    min_remaining_seconds: Optional[float] = None
+
+
+class _TimedLatencyWindow:
+    """Latencies observed within the last `max_age` seconds"""
+
+    def __init__(self, max_age: float, max_samples: int = 500):
+        self.max_age = max_age
+        self.samples: Deque[Tuple[float, float]] = deque(maxlen=max_samples)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append((time.monotonic(), seconds))
+
+    def recent(self) -> list:
+        cutoff = time.monotonic() - self.max_age
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return sorted(seconds for _, seconds in self.samples)
+
+    def percentile(self, pct: float, min_samples: int) -> Optional[float]:
+        values = self.recent()
+        if len(values) < min_samples:
+            return None
+        return values[min(len(values) - 1, max(0, math.ceil(pct / 100.0 * len(values)) - 1))]
+
+
+class ModelRouter:
+    """
+    Picks the model for a call from its `RoutePolicy`. The preferred model is
+    used unless one of the policy's rules trips, in which case the fallback
+    is used and the reason is counted.
+    """
+
+    def __init__(
+        self,
+        scheduler,
+        policy: Dict[str, Dict[str, Any]],
+        latency_window_seconds: float = 300.0,
+        min_samples: int = 10,
+        enabled: bool = True
+    ):
+        self.scheduler = scheduler
+        self.enabled = enabled
+        self.latency_window_seconds = latency_window_seconds
+        self.min_samples = min_samples
+        self.policies: Dict[str, RoutePolicy] = {}
+        for call_name in {*DEFAULT_ROUTING_POLICY, *policy}:
+            merged = {**DEFAULT_ROUTING_POLICY.get(call_name, {}), **policy.get(call_name, {})}
+            self.policies[call_name] = RoutePolicy.model_validate(merged)
+
+        self._latency: Dict[Tuple[str, str], _TimedLatencyWindow] = {}
+        self.decisions: Counter = Counter()
+
+    def observe(self, model: str, call_name: str, seconds: float) -> None:
+        """Record the latency of a successful call"""
+        window = self._latency.get((model, call_name))
+        if window is None:
+            window = self._latency[(model, call_name)] = _TimedLatencyWindow(self.latency_window_seconds)
+        window.add(seconds)
+
+    def latency(self, model: str, call_name: str, pct: float) -> Optional[float]:
+        window = self._latency.get((model, call_name))
+        return window.percentile(pct, self.min_samples) if window else None
+
+    def _downgrade_reason(self, call_name: str, policy: RoutePolicy, budget: Optional[float]) -> Optional[str]:
+        model, fallback = policy.preferred, policy.fallback
+
+        if (policy.max_queue_depth is not None
+                and self.scheduler.queue_depth(model) > policy.max_queue_depth
+                and self.scheduler.queue_depth(fallback) < self.scheduler.queue_depth(model)):
+            return "queue"
+
+        if (policy.min_headroom is not None
+                and self.scheduler.headroom(model) < policy.min_headroom
+                and self.scheduler.headroom(fallback) > self.scheduler.headroom(model)):
+            return "headroom"
+
+        if policy.max_p95_seconds is not None:
+            p95 = self.latency(model, call_name, 95)
+            if p95 is not None and p95 > policy.max_p95_seconds:
+                return "latency"
+
+        if budget is not None:
+            expected = self.latency(model, call_name, 50)
+            needed = max(policy.min_remaining_seconds or 0.0, expected or 0.0)
+            if budget < needed:
+                return "deadline"
+
+        return None
+
+    def choose(self, call_name: str, budget: Optional[float] = None) -> str:
+        """
+        Choose the model for `call_name`
+
+        Args:
+            call_name: Call identifier (intent, buying_guide, ...)
+            budget: Seconds this call may take under the request deadline, if any
+
+        Returns:
+            Model name
+        """
+        policy = self.policies[call_name]
+        reason = None
+        if self.enabled and policy.fallback:
+            reason = self._downgrade_reason(call_name, policy, budget)
+
+        model = policy.fallback if reason else policy.preferred
+        self.decisions[(call_name, model, reason or "preferred")] += 1
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for call_name, policy in self.policies.items():
+            result[call_name] = {
+                "preferred": policy.preferred,
+                "fallback": policy.fallback,
+                "decisions": {
+                    f"{model}:{reason}": count
+                    for (name, model, reason), count in self.decisions.items()
+                    if name == call_name
+                },
+                "p95_seconds": {
+                    model: round(p95, 4)
+                    for (model, name) in self._latency
+                    if name == call_name and (p95 := self.latency(model, name, 95)) is not None
+                },
+            }
+        return result
@@ -0,0 +1,316 @@
+"""
+Central scheduler for Gemini calls: per-model rate limiting, priority
+queueing and retry with jittered exponential backoff
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+
+class SharedPriority:
+    """
+    Priority of a call made on behalf of several requests (a coalesced
+    call): the most urgent of theirs. Raising it re-queues the call if it is
+    already waiting for a token.
+    """
+
+    def __init__(self, priority: int):
+        self.value = priority
+        self.listeners: List[Callable[[int], None]] = []
+
+    def raise_to(self, priority: int) -> None:
+        if priority >= self.value:
+            return
+        self.value = priority
+        for listener in list(self.listeners):
+            listener(priority)
+
+    def context(self) -> Context:
+        """Empty context whose Gemini calls run at this priority"""
+        context = Context()
+        context.run(_call_priority.set, self)
+        return context
+
+
+_call_priority: ContextVar[Union[int, SharedPriority]] = ContextVar("gemini_call_priority", default=PRIORITY_INTERACTIVE)
+
+
+def current_call_priority() -> int:
+    priority = _call_priority.get()
+    return priority.value if isinstance(priority, SharedPriority) else priority
+
+
+@contextmanager
+def call_priority(priority: int) -> Iterator[None]:
+    """Run the enclosed Gemini calls (and tasks spawned from them) at `priority`"""
+    token = _call_priority.set(priority)
+    try:
+        yield
+    finally:
+        _call_priority.reset(token)
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """Whether a failed Gemini call is worth retrying"""
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(exc, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+
+class SchedulerQueueFull(Exception):
+    """Raised when the scheduler queue is at capacity"""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute: float, burst: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def release(self) -> None:
+        """Return a token that was acquired but not used"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def time_until_available(self) -> float:
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+
+class _ModelLane:
+    """Priority queue and token bucket for one model"""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.waiters: List[Tuple[int, int, asyncio.Future, float]] = []
+        self.dispatcher: Optional[asyncio.Task] = None
+
+        self.granted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, wait: float) -> None:
+        self.granted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+
+class GeminiScheduler:
+    """
+    Every Gemini call goes through `run`. Calls wait for a token from their
+    model's bucket in priority order (lower value first, FIFO within a
+    priority), and retryable failures are retried with full-jitter backoff.
+    A call under a `SharedPriority` moves up the queue when its priority is
+    raised; a token granted to a caller cancelled in the meantime goes back
+    to the bucket.
+    """
+
+    def __init__(
+        self,
+        model_rpm: Dict[str, int],
+        default_rpm: int,
+        burst_seconds: float = 2.0,
+        max_queue: int = 500,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0
+    ):
+        self.model_rpm = dict(model_rpm)
+        self.default_rpm = default_rpm
+        self.burst_seconds = burst_seconds
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lanes: Dict[str, _ModelLane] = {}
+        self._sequence = itertools.count()
+
+        self.retries = 0
+        self.rejected = 0
+        self.failures = 0
+
+    def _lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            rpm = self.model_rpm.get(model, self.default_rpm)
+            lane = _ModelLane(TokenBucket(rpm, rpm / 60.0 * self.burst_seconds))
+            self._lanes[model] = lane
+        return lane
+
+    @staticmethod
+    def _pending(lane: _ModelLane) -> int:
+        """Callers still waiting; cancelled ones and re-queued duplicates are skipped"""
+        return len({future for _, _, future, _ in lane.waiters if not future.done()})
+
+    def queue_depth(self, model: Optional[str] = None) -> int:
+        if model is not None:
+            lane = self._lanes.get(model)
+            return self._pending(lane) if lane else 0
+        return sum(self._pending(lane) for lane in self._lanes.values())
+
+    def _enqueue(self, lane: _ModelLane, priority: int, future: asyncio.Future, enqueued_at: float) -> None:
+        heapq.heappush(lane.waiters, (priority, next(self._sequence), future, enqueued_at))
+        if lane.dispatcher is None or lane.dispatcher.done():
+            lane.dispatcher = asyncio.create_task(self._dispatch(lane))
+
+    def headroom(self, model: str) -> float:
+        """Share of the model's burst capacity currently available (0-1)"""
+        lane = self._lane(model)
+        if self._pending(lane):
+            return 0.0
+        return lane.bucket.available() / lane.bucket.capacity
+
+    async def acquire(self, model: str, priority: Optional[int] = None) -> None:
+        """Wait until `model` may be called"""
+        lane = self._lane(model)
+        if not lane.waiters and lane.bucket.try_acquire():
+            lane.record_wait(0.0)
+            return
+
+        if self.queue_depth() >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerQueueFull(f"Gemini kuyruğu dolu ({self.max_queue})")
+
+        shared = _call_priority.get() if priority is None else None
+        if not isinstance(shared, SharedPriority):
+            shared = None
+        future = asyncio.get_running_loop().create_future()
+        enqueued_at = time.monotonic()
+        self._enqueue(lane, current_call_priority() if priority is None else priority, future, enqueued_at)
+
+        def requeue(raised: int) -> None:
+            self._enqueue(lane, raised, future, enqueued_at)
+
+        if shared is not None:
+            shared.listeners.append(requeue)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                lane.bucket.release()
+            raise
+        finally:
+            if shared is not None:
+                shared.listeners.remove(requeue)
+
+    async def _dispatch(self, lane: _ModelLane) -> None:
+        while lane.waiters:
+            _, _, future, enqueued_at = lane.waiters[0]
+            if future.done():
+                heapq.heappop(lane.waiters)
+                continue
+
+            if lane.bucket.try_acquire():
+                heapq.heappop(lane.waiters)
+                lane.record_wait(time.monotonic() - enqueued_at)
+                future.set_result(None)
+            else:
+                await asyncio.sleep(lane.bucket.time_until_available())
+
+    async def _backoff(self, model: str, attempt: int, exc: BaseException) -> None:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        self.retries += 1
+        print(f"⏳ {model} çağrısı tekrar denenecek ({attempt + 1}/{self.max_retries}, {delay:.2f}s): {exc}")
+        await asyncio.sleep(delay)
+
+    async def run(self, model: str, fn: Callable[[], Awaitable[T]], priority: Optional[int] = None) -> T:
+        """Run a Gemini call under the model's rate limit with retries"""
+        attempt = 0
+        while True:
+            await self.acquire(model, priority)
+            try:
+                return await fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    self.failures += 1
+                    raise
+                await self._backoff(model, attempt, e)
+                attempt += 1
+
+    async def stream(
+        self,
+        model: str,
+        fn: Callable[[], Awaitable[AsyncIterator[T]]],
+        priority: Optional[int] = None
+    ) -> AsyncIterator[T]:
+        """Stream a Gemini call; retries only if it fails before the first chunk"""
+        attempt = 0
+        while True:
+            await self.acquire(model, priority)
+            started = False
+            try:
+                async for chunk in await fn():
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or attempt >= self.max_retries or not is_retryable_error(e):
+                    self.failures += 1
+                    raise
+                await self._backoff(model, attempt, e)
+                attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_queue": self.max_queue,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "models": {
+                model: {
+                    "queue_depth": self._pending(lane),
+                    "tokens_available": round(lane.bucket.available(), 2),
+                    "rpm": self.model_rpm.get(model, self.default_rpm),
+                    "granted": lane.granted,
+                    "avg_wait_seconds": round(lane.total_wait / lane.granted, 4) if lane.granted else 0.0,
+                    "max_wait_seconds": round(lane.max_wait, 4),
+                }
+                for model, lane in self._lanes.items()
+            },
+        }
@@ -0,0 +1,122 @@
+"""
+Conversation sessions: a LangGraph checkpointer keeps each session's graph
+state between turns, and idle sessions are deleted after a TTL or once the
+session count passes its cap
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+
+class SessionStore:
+    """
+    Lazily created checkpointer ("memory" or "sqlite") plus per-session
+    bookkeeping. Turns of the same session are serialized so two requests
+    never write to one thread's checkpoint at the same time.
+    """
+
+    BACKENDS = ("memory", "sqlite")
+
+    def __init__(
+        self,
+        backend: str = "memory",
+        path: Optional[str] = None,
+        ttl_seconds: float = 1800.0,
+        max_sessions: int = 10000
+    ):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Geçersiz oturum deposu: {backend}")
+        if backend == "sqlite" and not path:
+            raise ValueError("SQLite oturum deposu için SESSION_DB_PATH gerekli")
+
+        self.backend = backend
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+
+        self._checkpointer = None
+        self._init_lock = asyncio.Lock()
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+        self.turns = 0
+        self.evictions = 0
+
+    async def checkpointer(self):
+        """Checkpointer shared by every session, created on first use"""
+        if self._checkpointer is None:
+            async with self._init_lock:
+                if self._checkpointer is None:
+                    self._checkpointer = await self._create_checkpointer()
+        return self._checkpointer
+
+    async def _create_checkpointer(self):
+        if self.backend == "memory":
+            from langgraph.checkpoint.memory import InMemorySaver
+            return InMemorySaver()
+
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError as e:
+            raise RuntimeError(
+                "SQLite oturum deposu için 'langgraph-checkpoint-sqlite' paketi gerekli"
+            ) from e
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        connection = await aiosqlite.connect(self.path)
+        saver = AsyncSqliteSaver(connection)
+        await saver.setup()
+        return saver
+
+    async def _evict(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        checkpointer = await self.checkpointer()
+        for session_id in list(self._last_used):
+            expired = self._last_used[session_id] < cutoff
+            if not expired and len(self._last_used) <= self.max_sessions:
+                break
+            lock = self._locks.get(session_id)
+            if lock is not None and lock.locked():
+                continue
+            del self._last_used[session_id]
+            self._locks.pop(session_id, None)
+            await checkpointer.adelete_thread(session_id)
+            self.evictions += 1
+
+    @asynccontextmanager
+    async def turn(self, session_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run one conversation turn for `session_id`
+
+        Args:
+            session_id: Client supplied conversation id (used as the LangGraph thread id)
+
+        Yields:
+            Graph run config pointing at the session's thread
+        """
+        await self._evict()
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            self._last_used[session_id] = time.monotonic()
+            self._last_used.move_to_end(session_id)
+            self.turns += 1
+            try:
+                yield {"configurable": {"thread_id": session_id}}
+            finally:
+                self._last_used[session_id] = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "active": len(self._last_used),
+            "turns": self.turns,
+            "evictions": self.evictions,
+            "ttl_seconds": self.ttl_seconds,
+            "max_sessions": self.max_sessions,
+        }
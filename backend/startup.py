@@ -0,0 +1,36 @@
+"""
+Startup instrumentation: wall time of module imports and initialization
+phases, and how long the process took to become ready
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+_started = time.perf_counter()
+_phases: Dict[str, float] = {}
+_ready_after: Optional[float] = None
+
+
+@contextmanager
+def startup_phase(name: str) -> Iterator[None]:
+    """Record the duration of one startup phase (e.g. import.agent, init.graph)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases[name] = _phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def mark_ready() -> None:
+    """Note the time from process start (this module's import) until the agent is ready"""
+    global _ready_after
+    _ready_after = time.perf_counter() - _started
+
+
+def startup_report() -> Dict[str, Any]:
+    return {
+        "phases": {name: round(seconds, 4) for name, seconds in _phases.items()},
+        "ready_after_seconds": round(_ready_after, 4) if _ready_after is not None else None,
+        "uptime_seconds": round(time.perf_counter() - _started, 4),
+    }
@@ -0,0 +1,38 @@
+"""
+LangGraph state of the recommendation workflow
+
+Kept apart from the API models so importing `models` does not pull in
+langgraph.
+"""
+
+from typing import Annotated, Optional, TypedDict
+
+from langgraph.graph import add_messages
+
+def merge_sections(left: list, right: Optional[list]) -> list:
+    """Paralel node'lardan gelen bozulmuş bölüm listelerini sırayı koruyarak birleştir
+
+    None gelirse liste sıfırlanır (oturumda yeni tur başlarken).
+    """
+    if right is None:
+        return []
+    return left + [section for section in right if section not in left]
+
+class ProductRecommendationState(TypedDict):
+    messages: Annotated[list, add_messages]
+    user_intent: str
+    product_category: str
+    buying_guide: str
+    search_results: str
+    final_recommendation: str
+    recommended_products: list
+    product_details: list
+    best_value: str
+    ecommerce_links: dict
+    sources: list
+    degraded_sections: Annotated[list, merge_sections]
+    refinements: list
+    guide_category: str
+    search_key: str
+    prompt_context: dict
+    context_stats: dict
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from cache import PersistentTTLCache, TTLCache
+from utils import TextProcessor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(time, "time", fake)
+    monkeypatch.setattr(time, "monotonic", fake)
+    return fake
+
+
+def test_normalize_query_casefolds_and_strips_stop_words():
+    assert TextProcessor.normalize_query("Bana İYİ bir Laptop öner!") == "laptop"
+    assert TextProcessor.normalize_query("  ısıtıcı   IŞIK ") == "ısıtıcı ışık"
+
+
+def test_normalize_query_keeps_word_order():
+    first = TextProcessor.normalize_query("iphone değil samsung")
+    second = TextProcessor.normalize_query("samsung değil iphone")
+    assert first == "iphone değil samsung"
+    assert first != second
+
+
+def test_normalize_query_falls_back_when_only_stop_words():
+    assert TextProcessor.normalize_query("bir öneri") == "bir öneri"
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(max_entries=10, max_bytes=10_000, ttl_seconds=60)
+    cache.set("a", {"x": 1})
+    cache.set("b", {"x": 2}, ttl_seconds=300)
+
+    clock.now += 61
+    assert cache.get("a") is None
+    assert cache.get("b") == {"x": 2}
+    assert "a" not in cache
+    assert cache.stats()["expirations"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used_by_count(clock):
+    cache = TTLCache(max_entries=2, max_bytes=10_000, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_ttl_cache_evicts_by_byte_budget(clock):
+    cache = TTLCache(max_entries=100, max_bytes=25, ttl_seconds=60, sizer=len)
+    cache.set("a", "x" * 10)
+    cache.set("b", "y" * 10)
+    cache.set("c", "z" * 10)
+
+    assert len(cache) == 2
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 20
+
+
+def test_ttl_cache_skips_values_over_budget(clock):
+    cache = TTLCache(max_entries=10, max_bytes=5, ttl_seconds=60, sizer=len)
+    cache.set("a", "x" * 6)
+    assert len(cache) == 0
+
+
+def test_persistent_cache_writes_snapshot_only_on_flush(tmp_path, clock):
+    path = str(tmp_path / "guides.json")
+    cache = PersistentTTLCache(max_entries=10, max_bytes=10_000, ttl_seconds=60, path=path)
+    cache.set("laptop", "rehber")
+    assert not os.path.exists(path)
+
+    asyncio.run(cache.flush())
+    assert os.path.exists(path)
+
+    clock.now += 30
+    restored = PersistentTTLCache(max_entries=10, max_bytes=10_000, ttl_seconds=60, path=path)
+    assert restored.get("laptop") == "rehber"
+
+    clock.now += 31
+    expired = PersistentTTLCache(max_entries=10, max_bytes=10_000, ttl_seconds=60, path=path)
+    assert len(expired) == 0
+
+
+def test_persistent_cache_flushes_on_stop(tmp_path):
+    path = str(tmp_path / "guides.json")
+
+    async def run():
+        cache = PersistentTTLCache(
+            max_entries=10, max_bytes=10_000, ttl_seconds=60, path=path, snapshot_seconds=3600
+        )
+        await cache.start()
+        cache.set("telefon", "rehber")
+        await cache.stop()
+
+    asyncio.run(run())
+    assert PersistentTTLCache(max_entries=10, max_bytes=10_000, ttl_seconds=60, path=path).get("telefon") == "rehber"
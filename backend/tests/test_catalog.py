@@ -0,0 +1,93 @@
+import itertools
+import time
+
+import pytest
+
+from catalog import ProductCatalog, product_key
+
+
+@pytest.mark.parametrize("known, variant", [
+    ("iPhone 15 Pro 128GB", "Apple iPhone 15 Pro 128 GB Siyah"),
+    ("Sony WF-1000XM5", "Sony WF1000XM5 Kablosuz Kulaklık"),
+    ("Samsung Galaxy S24", "Galaxy S24"),
+    ("Roborock Qrevo Master", "Roborock Qrevo Mastr"),
+    ("Roborock S8+", "Roborock S8 Plus"),
+    ("Anker Soundcore Life Q30", "Soundcore Life Q30"),
+    ("Xiaomi Redmi Note 13", "Redmi Note 13"),
+])
+def test_naming_variants_resolve_to_the_same_product(known, variant):
+    catalog = ProductCatalog()
+    assert catalog.resolve(known) == catalog.resolve(variant)
+    assert len(catalog) == 1
+
+
+@pytest.mark.parametrize("known, other", [
+    ("iPhone 15 Pro 256GB", "iPhone 15 Pro 1TB"),
+    ("iPhone 15 Pro", "iPhone 15 Pro 128GB"),
+    ("iPhone 15 Pro", "iPhone 15 Pro Max"),
+    ("Roborock S8", "Roborock S8+"),
+    ("Galaxy S24", "Galaxy S24 Ultra"),
+    ("Philips Airfryer XXL", "Philips Airfryer XL"),
+    ("Samsung Galaxy S24", "Samsung Galaxy S24 Kılıf"),
+    ("Dyson V15 Detect", "Dyson V15 Detect Absolute"),
+    ("Apple Watch", "Samsung Watch"),
+    ("Redmi X6", "Poco X6"),
+])
+def test_distinct_products_are_not_merged(known, other):
+    catalog = ProductCatalog()
+    catalog.resolve(known)
+    assert catalog.lookup(other) is None
+
+
+def test_product_key_normalizes_capacity_and_plus():
+    assert product_key("Galaxy S24 256 GB Siyah") == "galaxy s24 256gb"
+    assert product_key("Roborock S8+") == "roborock s8 plus"
+
+
+def test_canonical_name_changes_only_when_overtaken():
+    catalog = ProductCatalog()
+    catalog.resolve("Galaxy S24")
+    catalog.resolve("Samsung Galaxy S24")
+    assert catalog.lookup("Galaxy S24").name == "Galaxy S24"
+
+    catalog.resolve("Samsung Galaxy S24")
+    assert catalog.lookup("Galaxy S24").name == "Samsung Galaxy S24"
+
+
+def test_canonicalize_drops_duplicate_variants():
+    catalog = ProductCatalog()
+    names = catalog.canonicalize(["Apple AirPods Max", "AirPods Max", "Sony WH-1000XM5"])
+    assert names == ["Apple AirPods Max", "Sony WH-1000XM5"]
+
+
+def test_least_recently_seen_product_is_evicted(monkeypatch):
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(time, "time", lambda: float(next(ticks)))
+
+    catalog = ProductCatalog(max_products=2)
+    catalog.resolve("Galaxy S24")
+    catalog.resolve("iPhone 15")
+    catalog.resolve("Galaxy S24")
+    catalog.resolve("Pixel 8")
+
+    assert len(catalog) == 2
+    assert catalog.lookup("iPhone 15") is None
+    assert catalog.stats()["evictions"] == 1
+
+    catalog.resolve("iPhone 15")
+    assert catalog.lookup("Galaxy S24") is None
+    assert catalog.lookup("Pixel 8") is not None
+    assert catalog.lookup("iPhone 15") is not None
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "catalog.json")
+    catalog = ProductCatalog(path=path)
+    catalog.resolve("Samsung Galaxy S24", "telefon", {"budget_tier": "premium"})
+    catalog.save()
+
+    restored = ProductCatalog(path=path)
+    product = restored.lookup("Galaxy S24")
+    assert product.name == "Samsung Galaxy S24"
+    assert product.category == "telefon"
+    assert product.details == {"budget_tier": "premium"}
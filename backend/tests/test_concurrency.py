@@ -0,0 +1,106 @@
+import asyncio
+from contextvars import ContextVar
+
+import pytest
+
+from concurrency import SingleFlight
+
+request_id: ContextVar[str] = ContextVar("request_id", default="")
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert calls == 1
+    assert flight.stats()["leaders"] == 1
+    assert flight.stats()["coalesced"] == 4
+
+
+def test_single_flight_leader_failure_reaches_every_waiter_and_is_not_cached():
+    flight = SingleFlight()
+    attempts = 0
+
+    async def failing():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        results = await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        with pytest.raises(ValueError):
+            await flight.do("key", failing)
+
+    asyncio.run(run())
+    assert attempts == 2
+    assert flight.stats()["failures"] == 2
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_single_flight_cancelled_waiter_does_not_cancel_shared_task():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.create_task(flight.do("key", work))
+        second = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
+    assert flight.stats()["abandoned"] == 0
+
+
+def test_single_flight_cancels_shared_task_when_every_waiter_leaves():
+    flight = SingleFlight()
+    finished = False
+
+    async def work():
+        nonlocal finished
+        await asyncio.sleep(0.05)
+        finished = True
+
+    async def run():
+        waiters = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.06)
+
+    asyncio.run(run())
+    assert not finished
+    assert flight.stats()["abandoned"] == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_isolated_single_flight_does_not_inherit_leader_context():
+    flight = SingleFlight(isolated=True)
+
+    async def work():
+        await asyncio.sleep(0)
+        return request_id.get()
+
+    async def run():
+        request_id.set("leader")
+        return await flight.do("key", work)
+
+    assert asyncio.run(run()) == ""
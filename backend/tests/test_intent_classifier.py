@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from intent_classifier import CategoryClassifier
+
+LEXICON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "categories.json")
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return CategoryClassifier(LEXICON)
+
+
+@pytest.mark.parametrize("message, category", [
+    ("Bana iyi bir laptop öner", "dizüstü bilgisayar"),
+    ("5000 TL altı kulaklık önerir misin", "kulaklık"),
+    ("hava fritözü lazım", "airfryer"),
+    ("fritöz önerir misin", "fritöz"),
+    ("bavul", "valiz"),
+    ("scooter almak istiyorum", "elektrikli scooter"),
+])
+def test_confident_categories(classifier, message, category):
+    result = classifier.classify(message)
+    assert result["product_category"] == category
+    assert result["confidence"] >= 0.8
+
+
+def test_inflected_term_matches(classifier):
+    result = classifier.classify("kulaklıklar")
+    assert result["product_category"] == "kulaklık"
+    assert result["confidence"] == 0.9
+
+
+@pytest.mark.parametrize("message", [
+    "iphone şarj aleti",
+    "tablet için klavye",
+    "halı yıkama makinesi",
+    "telefon kılıfı",
+])
+def test_modified_terms_are_left_to_the_llm(classifier, message):
+    assert classifier.classify(message)["confidence"] < 0.8
+
+
+def test_several_categories_are_left_to_the_llm(classifier):
+    assert classifier.classify("laptop ve tablet")["confidence"] < 0.8
+
+
+def test_user_intent_is_a_summary(classifier):
+    result = classifier.classify("Samsung telefon 20000 TL altında olsun")
+    assert result["user_intent"].startswith("telefon satın almak istiyor")
+    assert "20000 tl" in result["user_intent"]
+
+
+def test_unknown_product_is_a_miss(classifier):
+    before = classifier.misses
+    assert classifier.classify("uzay gemisi") is None
+    assert classifier.misses == before + 1
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+
+from concurrency import SingleFlight
+from scheduler import PRIORITY_BACKGROUND, GeminiScheduler, call_priority
+
+
+class RetryableError(Exception):
+    code = 503
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+def make_scheduler(**kwargs) -> GeminiScheduler:
+    # 600 rpm with a burst of one: one token every 0.1s
+    return GeminiScheduler({"model": 600}, 600, burst_seconds=0.1, backoff_base=0.001, **kwargs)
+
+
+def test_waiters_are_served_in_priority_order():
+    scheduler = make_scheduler()
+    order = []
+
+    async def call(name, priority):
+        await scheduler.acquire("model", priority)
+        order.append(name)
+
+    async def run():
+        await scheduler.acquire("model")
+        tasks = [asyncio.create_task(call("background", PRIORITY_BACKGROUND))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call("interactive", 0)))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["interactive", "background"]
+
+
+def test_retryable_errors_are_retried_with_backoff():
+    scheduler = make_scheduler(max_retries=3)
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise RetryableError("unavailable")
+        return "ok"
+
+    assert asyncio.run(scheduler.run("model", flaky)) == "ok"
+    assert attempts == 3
+    assert scheduler.retries == 2
+
+
+def test_retries_stop_after_max_retries():
+    scheduler = make_scheduler(max_retries=1)
+
+    async def failing():
+        raise RetryableError("unavailable")
+
+    with pytest.raises(RetryableError):
+        asyncio.run(scheduler.run("model", failing))
+    assert scheduler.retries == 1
+    assert scheduler.failures == 1
+
+
+def test_non_retryable_errors_fail_immediately():
+    scheduler = make_scheduler()
+    attempts = 0
+
+    async def bad_request():
+        nonlocal attempts
+        attempts += 1
+        raise BadRequest("invalid")
+
+    with pytest.raises(BadRequest):
+        asyncio.run(scheduler.run("model", bad_request))
+    assert attempts == 1
+    assert scheduler.retries == 0
+
+
+def test_queue_depth_skips_cancelled_waiters():
+    scheduler = make_scheduler()
+
+    async def run():
+        await scheduler.acquire("model")
+        waiter = asyncio.create_task(scheduler.acquire("model"))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth("model") == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler.queue_depth("model") == 0
+        assert scheduler.queue_depth() == 0
+
+    asyncio.run(run())
+
+
+def test_token_granted_to_cancelled_waiter_is_returned():
+    scheduler = GeminiScheduler({"model": 6}, 6, burst_seconds=10)
+
+    async def run():
+        await scheduler.acquire("model")
+        lane = scheduler._lane("model")
+        waiter = asyncio.create_task(scheduler.acquire("model"))
+        await asyncio.sleep(0)
+        future = lane.waiters[0][2]
+        lane.bucket.tokens = 1.0
+        assert lane.bucket.try_acquire()
+        future.set_result(None)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return lane.bucket.available()
+
+    assert asyncio.run(run()) >= 1.0
+
+
+def test_coalesced_call_runs_at_most_urgent_waiter_priority():
+    scheduler = make_scheduler()
+    flight = SingleFlight(isolated=True)
+    order = []
+
+    async def shared():
+        await scheduler.acquire("model")
+        order.append("shared")
+
+    async def other():
+        await scheduler.acquire("model", 5)
+        order.append("other")
+
+    async def background():
+        with call_priority(PRIORITY_BACKGROUND):
+            await flight.do("key", shared)
+
+    async def run():
+        await scheduler.acquire("model")
+        tasks = [asyncio.create_task(background())]
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(other()))
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(flight.do("key", shared)))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["shared", "other"]
@@ -5,6 +5,64 @@ from urllib.parse import quote_plus
 
 class TextProcessor:
     
+    QUERY_STOP_WORDS = frozenset({
+        "acaba", "al", "alayım", "alınır", "almak", "almalıyım", "arıyorum", "bana",
+        "beni", "benim", "bi", "bir", "biraz", "bu", "bul", "bulur", "da", "de",
+        "eder", "edebilir", "edermisin", "en", "gibi", "güzel", "hangi", "hangisi",
+        "için", "ile", "istiyorum", "iyi", "ki", "lazım", "lütfen", "mi", "mı", "mu",
+        "mü", "misin", "mısın", "musun", "müsün", "misiniz", "mısınız", "ne", "nedir",
+        "o", "öner", "önerebilir", "önerin", "önerir", "önerirmisin", "öneri",
+        "önerisi", "önerileri", "peki", "şey", "şu", "tavsiye", "tavsiyesi", "ve",
+        "var", "ya", "yardım",
+    })
+    
+    @staticmethod
+    def turkish_casefold(text: str) -> str:
+        """Lowercase text with Turkish dotted/dotless i rules"""
+        return text.replace("I", "ı").replace("İ", "i").lower()
+    
+    @staticmethod
+    def normalize_query(text: str) -> str:
+        """
+        Normalize a user query into a cache key
+        
+        Casefolds with Turkish rules and strips punctuation and stop words.
+        Word order is kept: "iphone değil samsung" and "samsung değil iphone"
+        are different requests.
+        
+        Args:
+            text: Raw user input
+            
+        Returns:
+            Normalized key; falls back to the casefolded text if every token is a stop word
+        """
+        folded = TextProcessor.turkish_casefold(text)
+        tokens = re.findall(r"\w+", folded)
+        kept = [t for t in tokens if t not in TextProcessor.QUERY_STOP_WORDS]
+        return " ".join(kept) if kept else " ".join(tokens)
+    
+    INTENT_BUCKET_KEYWORDS = {
+        "budget": ("ucuz", "uygun", "ekonomik", "bütçe", "hesaplı", "fiyat performans", "giriş seviye"),
+        "premium": ("premium", "pahalı", "amiral", "üst seviye", "profesyonel", "lüks", "en iyisi"),
+    }
+    
+    @staticmethod
+    def intent_bucket(user_intent: str) -> str:
+        """
+        Map a free-form user intent to a coarse budget bucket
+        
+        Args:
+            user_intent: Intent summary or raw user input
+            
+        Returns:
+            One of "budget", "premium" or "standard"
+        """
+        folded = TextProcessor.turkish_casefold(user_intent)
+        for bucket, keywords in TextProcessor.INTENT_BUCKET_KEYWORDS.items():
+            if any(keyword in folded for keyword in keywords):
+                return bucket
+        return "standard"
+    
     @staticmethod
     def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
 
@@ -24,18 +82,59 @@ class TextProcessor:
         cleaned = re.sub(r'^[-•]\s*', '', name.strip())
         return cleaned if len(cleaned) > 3 else name
     
+    LIST_MARKER_PATTERN = re.compile(r'^(?:[-•*+]|\d+[.)])\s*')
+    TRAILING_NOTE_PATTERN = re.compile(r'\s+(?:[-–—:]\s.*|\(.*\))$')
+    NON_PRODUCT_PATTERN = re.compile(
+        r'^(?:işte|not|örnek|sadece|aşağıda|yukarıda|ürün(?:ler)?|önerilen|kaynak|fiyat|bu |bunlar)\b|\. [A-ZÇĞİÖŞÜ]',
+        re.IGNORECASE
+    )
+    
     @staticmethod
     def parse_product_list(text: str) -> List[str]:
+        """
+        Parse a one-product-per-line model answer
+
+        List markers, numbering and bold markup are stripped; trailing
+        explanations (" - bütçe dostu", "(orta segment)") are cut off.
+        Headings, intro lines ("İşte ürünler:"), sentences and exact
+        duplicates are dropped.
+
+        Args:
+            text: Model output
 
+        Returns:
+            Product names in their original order
+        """
         products = []
-        if text:
-            for line in text.strip().split('\n'):
-                line = line.strip()
-                if line and not line.startswith('#') and not line.startswith('*'):
-                    cleaned = TextProcessor.clean_product_name(line)
-                    if cleaned:
-                        products.append(cleaned)
+        seen = set()
+        if not text:
+            return products
+
+        for line in text.strip().split('\n'):
+            line = line.strip()
+            if not line or line.startswith('#') or line.endswith(':'):
+                continue
+
+            line = TextProcessor.LIST_MARKER_PATTERN.sub('', line).replace('**', '').replace('__', '')
+            line = TextProcessor.TRAILING_NOTE_PATTERN.sub('', line).strip(' .,;')
+            if not TextProcessor.is_product_name(line):
+                continue
+
+            cleaned = TextProcessor.clean_product_name(line)
+            key = TextProcessor.turkish_casefold(cleaned)
+            if key not in seen:
+                seen.add(key)
+                products.append(cleaned)
         return products
+    
+    @staticmethod
+    def is_product_name(line: str) -> bool:
+        """Heuristic filter for lines that cannot be a product name"""
+        if len(line) < 2 or len(line) > 80 or len(line.split()) > 10:
+            return False
+        if not re.search(r'\w', line):
+            return False
+        return not TextProcessor.NON_PRODUCT_PATTERN.search(line)
 
 
 class URLGenerator:
@@ -81,8 +180,8 @@ class ResponseFormatter:
         """
         if not sources:
             return text
-            
-        text += "\n\n---\n\n## 📚 Kaynaklar:\n\n"
+        
+        parts = [text, "\n\n---\n\n## 📚 Kaynaklar:\n\n"]
         for i, source in enumerate(sources, 1):
             title = source.get('title', 'Başlık Yok')
             url = source.get('url', '')
@@ -90,9 +189,9 @@ class ResponseFormatter:
             if '.' in title and len(title.split('.')) > 1:
                 title = title.split('.')[0]
             
-            text += f"{i}. [{title}]({url})\n"
+            parts.append(f"{i}. [{title}]({url})\n")
             
-        return text
+        return "".join(parts)
     
     @staticmethod
     def add_ecommerce_links_to_text(text: str, ecommerce_links: Dict[str, Dict[str, str]]) -> str:
@@ -108,17 +207,74 @@ class ResponseFormatter:
         """
         if not ecommerce_links:
             return text
-            
-        text += "\n\n---\n\n## 🛒 E-Ticaret Siteleri:\n\n"
-        text += "*Önerilen ürünleri aşağıdaki sitelerde bulabilirsiniz:*\n\n"
         
+        parts = [
+            text,
+            "\n\n---\n\n## 🛒 E-Ticaret Siteleri:\n\n",
+            "*Önerilen ürünleri aşağıdaki sitelerde bulabilirsiniz:*\n\n"
+        ]
         for product, links in ecommerce_links.items():
-            text += f"### 📦 {product}\n\n"
-            for site_name, link in links.items():
-                text += f"- **[{site_name}]({link})**\n"
-            text += "\n"
+            parts.append(f"### 📦 {product}\n\n")
+            parts.extend(f"- **[{site_name}]({link})**\n" for site_name, link in links.items())
+            parts.append("\n")
         
+        return "".join(parts)
+    
+    @staticmethod
+    def build_markdown(narrative: str, sources: List[Dict[str, str]], ecommerce_links: Dict[str, Dict[str, str]]) -> str:
+        """
+        Render the full markdown response from its structured sections
+        
+        Args:
+            narrative: Recommendation text produced by the model
+            sources: List of source dictionaries
+            ecommerce_links: Dictionary of products and their e-commerce links
+            
+        Returns:
+            Narrative followed by the sources and e-commerce link sections
+        """
+        return ResponseFormatter.add_ecommerce_links_to_text(
+            ResponseFormatter.add_sources_to_text(narrative, sources),
+            ecommerce_links
+        )
+    
+    @staticmethod
+    def build_partial_recommendation(product_category: str, buying_guide: str, partial_text: str = "") -> str:
+        """
+        Build a degraded recommendation when the final narrative could not be completed
+        
+        Args:
+            product_category: Resolved product category
+            buying_guide: Buying guide text, if any
+            partial_text: Narrative streamed before the deadline, if any
+            
+        Returns:
+            Markdown text combining whatever is available
+        """
+        notice = "> ⏱️ Süre sınırı nedeniyle ayrıntılı öneri tamamlanamadı; mevcut bilgiler aşağıda."
+        
+        if partial_text.strip():
+            return f"{partial_text.rstrip()}\n\n{notice}"
+        
+        text = f"# 🛍️ {product_category.title()} Satın Alma Rehberi\n\n{notice}"
+        if buying_guide.strip():
+            text += f"\n\n## 📋 Dikkat Edilmesi Gerekenler\n\n{buying_guide.strip()}"
         return text
+    
+    @staticmethod
+    def format_sse_event(event: str, data: Any) -> str:
+        """
+        Format a Server-Sent Events message
+        
+        Args:
+            event: Event name
+            data: JSON serializable payload
+            
+        Returns:
+            SSE message block terminated by a blank line
+        """
+        payload = json.dumps(data, ensure_ascii=False)
+        return f"event: {event}\ndata: {payload}\n\n"
 
 
 class PromptTemplates:
@@ -139,6 +295,24 @@ class PromptTemplates:
     }}
     """
     
+    REFINEMENT_CHECK_TEMPLATE = """
+    Kullanıcı daha önce şu ürünü arıyordu:
+    Ürün Kategorisi: {product_category}
+    Kullanıcı İsteği: {user_intent}
+
+    Kullanıcının yeni mesajı: "{user_message}"
+
+    Yeni mesaj önceki aramayı daraltıyor mu (fiyat, marka, özellik, renk gibi bir kısıt ekliyor mu),
+    yoksa farklı bir ürün mü istiyor?
+
+    Cevabını şu JSON formatında ver:
+    {{
+        "is_refinement": true veya false,
+        "product_category": "daraltmaysa önceki kategori, değilse yeni ürün kategorisi",
+        "user_intent": "yeni mesajla birlikte kullanıcının niyetinin özeti"
+    }}
+    """
+    
     BUYING_GUIDE_TEMPLATE = """
     {product_category} satın almak isteyen kullanıcılar için kısa ve pratik bir satın alma rehberi oluştur.
 
@@ -220,3 +394,16 @@ class PromptTemplates:
     
     Türkçe, net ve kullanışlı bir öneri hazırla.
     """
+    
+    REFINEMENT_TEMPLATE = """
+    Kullanıcının takip istekleri (öneriyi bunlara göre güncelle):
+    {refinements}
+    """
+    
+    STRUCTURED_RECOMMENDATION_TEMPLATE = FINAL_RECOMMENDATION_TEMPLATE + """
+    Cevabını verilen JSON şemasına uygun ver:
+    - recommendation: yukarıdaki formatta hazırlanmış markdown öneri metni
+    - products: önerdiğin her ürün için name (yalnızca ürün adı), budget_tier
+      ("bütçe dostu", "orta segment" veya "premium") ve approximate_price (ör. "25.000 TL")
+    - best_value: "En İyi Değer" olarak seçtiğin ürünün adı (products içindeki name ile aynı)
+    """
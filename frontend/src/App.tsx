@@ -1,12 +1,13 @@
-import { useState } from 'react';
-import axios from 'axios';
-import { Search, BrainCircuit } from 'lucide-react';
+import { useEffect, useRef, useState } from 'react';
+import { Search, BrainCircuit, RotateCcw } from 'lucide-react';
 
 import SearchForm from './components/SearchForm';
 import LoadingSpinner  from './components/LoadingSpinner';
 import RecommendationDisplay  from './components/RecommendationDisplay';
+import StreamingProgress from './components/StreamingProgress';
+import { streamRecommendation } from './services/recommendationStream';
 
-import type { RecommendationResponse } from './types';
+import type { RecommendationResponse, StreamEvent, StreamProgress } from './types';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8801';
 
@@ -15,6 +16,40 @@ function App() {
   const [recommendation, setRecommendation] = useState<RecommendationResponse | null>(null);
   const [isLoading, setIsLoading] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
+  const [progress, setProgress] = useState<StreamProgress | null>(null);
+  const [sessionId, setSessionId] = useState<string | null>(null);
+  const [lastQuery, setLastQuery] = useState<string | null>(null);
+  const [refine, setRefine] = useState<boolean>(false);
+  const abortRef = useRef<AbortController | null>(null);
+
+  useEffect(() => () => abortRef.current?.abort(), []);
+
+  const handleStreamEvent = (streamEvent: StreamEvent) => {
+    switch (streamEvent.event) {
+      case 'node':
+        setProgress((prev) => {
+          const base: StreamProgress = prev ?? { completedNodes: [], streamingText: '' };
+          return {
+            ...base,
+            ...streamEvent.data.data,
+            completedNodes: [...base.completedNodes, streamEvent.data.node],
+          };
+        });
+        break;
+      case 'token':
+        setProgress((prev) => {
+          const base: StreamProgress = prev ?? { completedNodes: [], streamingText: '' };
+          return { ...base, streamingText: base.streamingText + streamEvent.data.text };
+        });
+        break;
+      case 'done':
+        setRecommendation(streamEvent.data);
+        break;
+      case 'error':
+        setError(`Bir hata oluştu: ${streamEvent.data.detail}`);
+        break;
+    }
+  };
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
@@ -23,28 +58,71 @@ function App() {
       return;
     }
 
+    // Oturum yalnızca kullanıcı mevcut sonucu daraltırken kullanılır; yeni aramalar
+    // oturumsuz gider ve sonuç önbelleği, istek birleştirme ve sorgu günlüğünden yararlanır.
+    const refining = refine && lastQuery !== null && (recommendation !== null || sessionId !== null);
+    let activeSessionId: string | null = null;
+    let input = userInput;
+    if (refining) {
+      activeSessionId = sessionId ?? crypto.randomUUID();
+      if (!sessionId) {
+        input = `${lastQuery}. ${userInput}`;
+      }
+    } else {
+      setLastQuery(userInput);
+    }
+    setSessionId(activeSessionId);
+
+    abortRef.current?.abort();
+    const controller = new AbortController();
+    abortRef.current = controller;
+
     setIsLoading(true);
     setError(null);
     setRecommendation(null);
+    setProgress(null);
 
     try {
-      const response = await axios.post(
-        `${API_BASE_URL}/recommend`,
-        { user_input: userInput }
+      await streamRecommendation(
+        `${API_BASE_URL}/recommend/stream`,
+        {
+          user_input: input,
+          response_format: 'compact',
+          ...(activeSessionId ? { session_id: activeSessionId } : {}),
+        },
+        handleStreamEvent,
+        controller.signal,
       );
-      setRecommendation(response.data);
     } catch (err) {
+      if (controller.signal.aborted) return;
       console.error(err);
-      if (axios.isAxiosError(err) && err.response) {
-        setError(`Bir hata oluştu: ${err.response.data.detail || err.message}`);
-      } else {
+      if (err instanceof TypeError) {
         setError('Sunucuya bağlanılamadı. Backend uygulamasının çalıştığından emin olun.');
+      } else {
+        setError(`Bir hata oluştu: ${err instanceof Error ? err.message : String(err)}`);
       }
     } finally {
-      setIsLoading(false);
+      if (abortRef.current === controller) {
+        abortRef.current = null;
+        setIsLoading(false);
+        setProgress(null);
+      }
     }
   };
 
+  const handleNewConversation = () => {
+    abortRef.current?.abort();
+    abortRef.current = null;
+    setIsLoading(false);
+    setProgress(null);
+    setSessionId(null);
+    setLastQuery(null);
+    setRefine(false);
+    setRecommendation(null);
+    setUserInput('');
+    setError(null);
+  };
+
   return (
     <div className="min-h-screen bg-gray-900 text-gray-100 font-sans p-4 sm:p-6 lg:p-8">
       <main className="max-w-4xl mx-auto">
@@ -67,9 +145,33 @@ function App() {
           isLoading={isLoading}
         />
 
+        {(recommendation || sessionId) && !isLoading && (
+          <div className="flex items-center justify-between mt-3 text-sm text-gray-400">
+            <label className="flex items-center gap-2 cursor-pointer">
+              <input
+                type="checkbox"
+                checked={refine}
+                onChange={(e) => setRefine(e.target.checked)}
+                className="accent-cyan-500"
+              />
+              Bu sonucu daralt (ör. "daha ucuz olanlar")
+            </label>
+            {sessionId && (
+              <button
+                type="button"
+                onClick={handleNewConversation}
+                className="flex items-center gap-1 text-cyan-400 hover:text-cyan-300"
+              >
+                <RotateCcw className="h-4 w-4" />
+                Yeni sohbet
+              </button>
+            )}
+          </div>
+        )}
+
         {/* Results Area */}
         <div className="mt-8">
-          {isLoading && <LoadingSpinner />}
+          {isLoading && !recommendation && (progress ? <StreamingProgress progress={progress} /> : <LoadingSpinner />)}
           {error && (
             <div className="bg-red-900/50 border border-red-700 text-red-300 px-4 py-3 rounded-md text-center">
               <p>{error}</p>
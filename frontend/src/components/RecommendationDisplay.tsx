@@ -6,9 +6,30 @@ interface Props {
   data: RecommendationResponse;
 }
 
+const DEGRADED_SECTION_LABELS: Record<string, string> = {
+  intent: 'niyet analizi',
+  buying_guide: 'satın alma rehberi',
+  search: 'ürün araştırması',
+  product_list: 'ürün listesi',
+  recommendation: 'detaylı öneri',
+};
+
+// Kaynak başlıklarını sunucudaki markdown biçimiyle aynı kısalt (ör. "site.com" -> "site")
+const sourceTitle = (title: string) => (title.includes('.') ? title.split('.')[0] : title) || 'Başlık Yok';
+
 const RecommendationDisplay: React.FC<Props> = ({ data }) => {
+  const degraded = data.degraded_sections ?? [];
+  const compact = data.response_format === 'compact';
+  const sources = data.sources ?? [];
+  const ecommerceLinks = Object.entries(data.ecommerce_links ?? {});
+
   return (
     <div className="bg-gray-800/50 border border-gray-700 rounded-lg p-6 animate-fade-in">
+      {degraded.length > 0 && (
+        <div className="bg-yellow-900/40 border border-yellow-700 text-yellow-200 text-sm px-4 py-2 rounded-md mb-4">
+          Bazı bölümler eksik olabilir: {degraded.map((section) => DEGRADED_SECTION_LABELS[section] ?? section).join(', ')}
+        </div>
+      )}
       <ReactMarkdown
         remarkPlugins={[remarkGfm]}
         components={{
@@ -25,6 +46,42 @@ const RecommendationDisplay: React.FC<Props> = ({ data }) => {
       >
         {data.recommendation}
       </ReactMarkdown>
+
+      {compact && sources.length > 0 && (
+        <section className="border-t border-gray-600 mt-6 pt-6">
+          <h2 className="text-2xl font-semibold text-cyan-300 mb-3">📚 Kaynaklar</h2>
+          <ol className="list-decimal list-inside space-y-2 mb-4 pl-4">
+            {sources.map((source, index) => (
+              <li key={`${source.url}-${index}`} className="text-gray-300">
+                <a className="text-cyan-400 hover:text-cyan-300 underline transition" href={source.url} target="_blank" rel="noopener noreferrer">
+                  {sourceTitle(source.title)}
+                </a>
+              </li>
+            ))}
+          </ol>
+        </section>
+      )}
+
+      {compact && ecommerceLinks.length > 0 && (
+        <section className="border-t border-gray-600 mt-6 pt-6">
+          <h2 className="text-2xl font-semibold text-cyan-300 mb-3">🛒 E-Ticaret Siteleri</h2>
+          <p className="text-gray-300 italic mb-4">Önerilen ürünleri aşağıdaki sitelerde bulabilirsiniz:</p>
+          {ecommerceLinks.map(([product, links]) => (
+            <div key={product} className="mb-4">
+              <h3 className="text-xl font-semibold mt-4 mb-2 text-gray-200">📦 {product}</h3>
+              <ul className="list-disc list-inside space-y-2 pl-4">
+                {Object.entries(links).map(([siteName, url]) => (
+                  <li key={siteName} className="text-gray-300">
+                    <a className="font-bold text-cyan-400 hover:text-cyan-300 underline transition" href={url} target="_blank" rel="noopener noreferrer">
+                      {siteName}
+                    </a>
+                  </li>
+                ))}
+              </ul>
+            </div>
+          ))}
+        </section>
+      )}
     </div>
   );
 };
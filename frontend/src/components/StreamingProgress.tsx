@@ -0,0 +1,63 @@
+import ReactMarkdown from 'react-markdown';
+import remarkGfm from 'remark-gfm';
+import { CheckCircle2, Loader2 } from 'lucide-react';
+import type { StreamNodeName, StreamProgress } from '../types';
+
+interface Props {
+  progress: StreamProgress;
+}
+
+const STEPS: { node: StreamNodeName; label: string }[] = [
+  { node: 'analyze_intent', label: 'Ürün kategorisi belirleniyor' },
+  { node: 'generate_buying_guide', label: 'Satın alma rehberi hazırlanıyor' },
+  { node: 'search_products', label: 'Güncel ürünler araştırılıyor' },
+  { node: 'generate_recommendation', label: 'Öneri yazılıyor' },
+  { node: 'search_ecommerce_links', label: 'E-ticaret linkleri ekleniyor' },
+];
+
+const StreamingProgress: React.FC<Props> = ({ progress }) => {
+  return (
+    <div className="bg-gray-800/50 border border-gray-700 rounded-lg p-6 space-y-6">
+      <ul className="space-y-2">
+        {STEPS.map(({ node, label }) => {
+          const done = progress.completedNodes.includes(node);
+          return (
+            <li key={node} className={`flex items-center gap-2 ${done ? 'text-gray-300' : 'text-gray-500'}`}>
+              {done ? (
+                <CheckCircle2 className="h-5 w-5 text-cyan-400" />
+              ) : (
+                <Loader2 className="h-5 w-5 animate-spin" />
+              )}
+              <span>{label}</span>
+            </li>
+          );
+        })}
+      </ul>
+
+      {progress.product_category && (
+        <p className="text-gray-300">
+          Kategori: <span className="font-bold text-cyan-400">{progress.product_category}</span>
+        </p>
+      )}
+
+      {progress.streamingText ? (
+        <div className="text-gray-300 leading-relaxed space-y-2">
+          <ReactMarkdown remarkPlugins={[remarkGfm]}>{progress.streamingText}</ReactMarkdown>
+        </div>
+      ) : (
+        progress.buying_guide && (
+          <div className="text-gray-300 leading-relaxed space-y-2">
+            <h2 className="text-2xl font-semibold text-cyan-300 mb-3">📋 Satın Alma Rehberi</h2>
+            <ReactMarkdown remarkPlugins={[remarkGfm]}>{progress.buying_guide}</ReactMarkdown>
+          </div>
+        )
+      )}
+
+      {progress.sources && progress.sources.length > 0 && (
+        <p className="text-sm text-gray-500">{progress.sources.length} kaynak incelendi</p>
+      )}
+    </div>
+  );
+};
+
+export default StreamingProgress;
@@ -9,10 +9,45 @@ export interface EcommerceLinks {
   };
 }
 
+export interface ProductDetail {
+  name: string;
+  budget_tier: string;
+  approximate_price: string;
+}
+
 export interface RecommendationResponse {
   recommendation: string;
   product_category: string;
   recommended_products: string[];
   ecommerce_links: EcommerceLinks;
   sources: Source[];
+  product_details?: ProductDetail[];
+  best_value?: string | null;
+  degraded_sections?: string[];
+  session_id?: string | null;
+  response_format?: 'markdown' | 'compact';
+}
+
+export type StreamNodeName =
+  | 'analyze_intent'
+  | 'generate_buying_guide'
+  | 'search_products'
+  | 'compact_context'
+  | 'generate_recommendation'
+  | 'search_ecommerce_links';
+
+export interface StreamProgress {
+  completedNodes: StreamNodeName[];
+  product_category?: string;
+  buying_guide?: string;
+  sources?: Source[];
+  recommended_products?: string[];
+  ecommerce_links?: EcommerceLinks;
+  streamingText: string;
 }
+
+export type StreamEvent =
+  | { event: 'node'; data: { node: StreamNodeName; data: Partial<RecommendationResponse> & { buying_guide?: string } } }
+  | { event: 'token'; data: { text: string } }
+  | { event: 'done'; data: RecommendationResponse }
+  | { event: 'error'; data: { detail: string } };